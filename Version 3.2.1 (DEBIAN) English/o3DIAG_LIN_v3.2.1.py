@@ -193,6 +193,10 @@ def extract_dtcs_from_response(resp: str):
     return dtcs
 
 class o3DIAGCommunicator(threading.Thread):
+    # Reads and writes block on the port / tx_queue and wake immediately.
+    # IO_TIMEOUT only bounds how long it takes to notice stop_event.
+    IO_TIMEOUT = 0.05
+
     def __init__(self, port, baudrate, rx_queue, tx_queue, stop_event):
         super().__init__(daemon=True)
         self.port = port
@@ -201,6 +205,7 @@ class o3DIAGCommunicator(threading.Thread):
         self.tx_queue = tx_queue
         self.stop_event = stop_event
         self.ser = None
+        self.writer = None
         self.elm327_initialized = False
 
     def open(self):
@@ -208,7 +213,7 @@ class o3DIAGCommunicator(threading.Thread):
             self.ser = serial.Serial(
                 port=self.port,
                 baudrate=self.baudrate,
-                timeout=1,
+                timeout=self.IO_TIMEOUT,
                 bytesize=serial.EIGHTBITS,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE,
@@ -262,6 +267,20 @@ class o3DIAGCommunicator(threading.Thread):
         self.elm327_initialized = True
         return True
 
+    def write_loop(self):
+        # Send commands as soon as they are queued
+        while not self.stop_event.is_set():
+            try:
+                cmd = self.tx_queue.get(timeout=self.IO_TIMEOUT)
+            except queue.Empty:
+                continue
+            if cmd:
+                try:
+                    self.ser.write((cmd + "\r").encode())
+                    self.rx_queue.put(("__SENT__", cmd))
+                except Exception as e:
+                    self.rx_queue.put(("__ERROR__", f"Write failed: {e}"))
+
     def run(self):
         ok, err = self.open()
         if not ok:
@@ -276,46 +295,39 @@ class o3DIAGCommunicator(threading.Thread):
             
         self.rx_queue.put(("__INFO__", "ELM327 adapter initialized successfully"))
         
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
         read_buffer = ""
         try:
             while not self.stop_event.is_set():
-                # Send commands
+                # Read responses (blocks until data arrives or IO_TIMEOUT expires)
                 try:
-                    cmd = self.tx_queue.get_nowait()
-                    if cmd:
-                        try:
-                            self.ser.write((cmd + "\r").encode())
-                            self.rx_queue.put(("__SENT__", cmd))
-                        except Exception as e:
-                            self.rx_queue.put(("__ERROR__", f"Write failed: {e}"))
-                except queue.Empty:
-                    pass
-
-                # Read responses
-                try:
-                    if self.ser.in_waiting:
-                        raw = self.ser.read(self.ser.in_waiting).decode('ascii', errors='ignore')
-                        read_buffer += raw
-                        
-                        # Process complete lines
-                        while '\r' in read_buffer or '>' in read_buffer:
-                            if '\r' in read_buffer:
-                                line, read_buffer = read_buffer.split('\r', 1)
-                            elif '>' in read_buffer:
-                                line, read_buffer = read_buffer.split('>', 1)
-                            else:
-                                break
-                                
-                            line = line.strip()
-                            if line and line not in ['', 'OK']:
-                                self.rx_queue.put(("__DATA__", line))
-                                
+                    raw = self.ser.read(self.ser.in_waiting or 1)
                 except Exception as e:
                     self.rx_queue.put(("__ERROR__", f"Read failed: {e}"))
-                    
-                time.sleep(0.1)
-                
+                    self.stop_event.wait(self.IO_TIMEOUT)
+                    continue
+                if not raw:
+                    continue
+                read_buffer += raw.decode('ascii', errors='ignore')
+
+                # Process complete lines
+                while '\r' in read_buffer or '>' in read_buffer:
+                    if '\r' in read_buffer:
+                        line, read_buffer = read_buffer.split('\r', 1)
+                    elif '>' in read_buffer:
+                        line, read_buffer = read_buffer.split('>', 1)
+                    else:
+                        break
+
+                    line = line.strip()
+                    if line and line not in ['', 'OK']:
+                        self.rx_queue.put(("__DATA__", line))
+
         finally:
+            self.stop_event.set()
+            self.writer.join(timeout=1.0)
             self.close()
             self.rx_queue.put(("__CLOSED__", "Serial connection closed"))
 
@@ -22,36 +22,70 @@
 # *************************************************
 # Required Files:
 # o3DIAG_Pcodes_list_english.o3script 
-# log_export/o3DIAG_Log_Export_Manager.exe 
-# COBOL requires the runtime libraries.
+# o3diag/ (headless core, also: python -m o3diag)
+# Log export is built in (o3diag/export.py), the COBOL
+# Log Export Manager in /log_export is no longer needed.
 # -------------------------------------------------
 # Required Folders:
-# /log_export (o3DIAG Log Export Manager, COBOL)
 # C:\Users\USER\.o3DIAG\logs (Auto create)
+# C:\Users\USER\.o3DIAG\history (Auto create, long sessions)
 # -------------------------------------------------
 
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox, PhotoImage
+from tkinter import ttk, messagebox, PhotoImage
+from tkinter import font as tkfont
 import serial
 import serial.tools.list_ports
 import threading
 import queue
-import time
-import re
 import sys
 import os
 import webbrowser
 import subprocess
 
+from o3diag import (
+    CAN_PROTOCOLS,
+    DIRECTION_RX,
+    DIRECTION_TX,
+    DTC_SERVICES,
+    FALLBACK_LANGUAGE,
+    INIT_ADVANCED_COMMANDS,
+    INIT_BASE_COMMANDS,
+    INIT_TEST_COMMANDS,
+    LOCAL_DIR,
+    POLL_RATES,
+    build_pid_requests,
+    clean_response,
+    decode_pid,
+    detect_protocol,
+    extract_dtcs_by_ecu,
+    format_pid_value,
+    load_dtc_layers,
+    o3DIAGCommunicator,
+    o3DIAGDTCCatalog,
+    o3DIAGLogFormatter,
+    o3DIAGLogStore,
+    o3DIAGPoller,
+    o3DIAGTimeoutCalibrator,
+    o3DIAGValue,
+    next_log_path,
+    parse_line,
+    split_multi_pid_response,
+    split_pid_request,
+    write_log_export,
+)
+
 def check_o3DIAG_directories():
     # Benutzer-Home-Verzeichnis für Logs
     user_home = os.path.expanduser("~")
     o3diag_base = os.path.join(user_home, ".o3DIAG")
     logs_dir = os.path.join(o3diag_base, "logs")
-    temp_dir = os.path.join(o3diag_base, "temp_files")
+    history_dir = os.path.join(o3diag_base, "history") # session log records beyond what is kept in memory
+    cache_dir = os.path.join(o3diag_base, "cache") # compiled P-code lists
+    o3script_dir = os.path.join(o3diag_base, "o3script") # own / OEM P-code lists, override the bundled ones
     
     # Erstellen der Verzeichnisse in /User
-    required_dirs = [o3diag_base, logs_dir, temp_dir]
+    required_dirs = [o3diag_base, logs_dir, history_dir, cache_dir, o3script_dir]
     
     for dir_path in required_dirs:
         if not os.path.exists(dir_path):
@@ -60,13 +94,6 @@ def check_o3DIAG_directories():
         else:
             print(f"\n[ OK ] o3DIAG Directory already exists:\n{dir_path}")
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    export_file = os.path.join(script_dir, "log_export", "o3DIAG_Log_Export_Manager.exe")
-    if os.path.exists(export_file):
-        print(f"\n[ OK ] Required o3DIAG Log Export Manager exists:\n{export_file}")
-    else:
-        print(f"\n[ PANIC ] Required o3DIAG Log Export Manager is missing:\n{export_file}")
-
 check_o3DIAG_directories()
 
 def resource_path(relative_path: str) -> str:
@@ -79,134 +106,100 @@ def resource_path(relative_path: str) -> str:
 def get_asset_path(filename: str) -> str:
     return resource_path(os.path.join("o3assets", filename))
 
-def clean_response(raw: str) -> str:
-    if raw is None:
-        return ""
-    s = raw.replace('>', ' ').replace('\r', ' ').replace('\n', ' ')
-    s = re.sub(r'\s+', ' ', s).strip()
-    return s
-def parse_pid_response(resp: str, pid_hex: str):
-    if not resp:
-        return None
-    parts = resp.split(' ')
-    parts = [p for p in parts if re.fullmatch(r'[0-9A-Fa-f]{2}', p)]
-    for i in range(len(parts) - 1):
-        if parts[i].upper() == '41' and parts[i+1].upper() == pid_hex.upper():
-            data = parts[i+2:]
-            return data
-    return None
-def calc_rpm(data):
-    if data and len(data) >= 2:
-        A = int(data[0], 16)
-        B = int(data[1], 16)
-        return ((A * 256) + B) / 4.0
-    return None
-def calc_speed(data):
-    if data and len(data) >= 1:
-        return int(data[0], 16)
-    return None
-
-def calc_temp(data):
-    if data and len(data) >= 1:
-        return int(data[0], 16) - 40
-    return None
-
-def calc_engine_load(data):
-    if data and len(data) >= 1:
-        return (int(data[0], 16) * 100.0) / 255.0
-    return None
-
-DTC_GROUPS = ['P', 'C', 'B', 'U']
-
-def dtc_from_bytes(a: int, b: int) -> str:
-    grp = (a & 0xC0) >> 6
-    d1 = (a & 0x30) >> 4
-    d2 = (a & 0x0F)
-    d3 = (b & 0xF0) >> 4
-    d4 = (b & 0x0F)
-    return f"{DTC_GROUPS[grp]}{d1}{d2:X}{d3:X}{d4:X}"
-
-def extract_dtcs_from_response(resp: str):
-    tokens = re.findall(r'[0-9A-Fa-f]{2}', resp)
-    dtcs = []
-    if not tokens:
-        return dtcs
-    try:
-        idx = [i for i, t in enumerate(tokens) if t.upper() == '43'][0]
-    except IndexError:
-        return dtcs
-    i = idx + 1
-    while i + 1 < len(tokens):
-        A = int(tokens[i], 16)
-        B = int(tokens[i+1], 16)
-        if A == 0 and B == 0:
-            break
-        code = dtc_from_bytes(A, B)
-        dtcs.append(code)
-        i += 2
-    return dtcs
-
-class o3DIAGCommunicator(threading.Thread):
-    def __init__(self, port, baudrate, rx_queue, tx_queue, stop_event):
-        super().__init__(daemon=True)
-        self.port = port
-        self.baudrate = baudrate
-        self.rx_queue = rx_queue
-        self.tx_queue = tx_queue
-        self.stop_event = stop_event
-        self.ser = None
-
-    def open(self):
-        try:
-            self.ser = serial.Serial(self.port, self.baudrate, timeout=1)
-            time.sleep(0.2)
-            return True, ""
-        except Exception as e:
-            return False, str(e)
-
-    def close(self):
-        try:
-            if self.ser and self.ser.is_open:
-                self.ser.close()
-        except:
-            pass
-
-    def run(self):
-        ok, err = self.open()
-        if not ok:
-            self.rx_queue.put(("__ERROR__", err))
+class o3DIAGLogView:
+    # Log window for all-day sessions: the last MAX_LINES lines are kept in
+    # a list, the Text widget only ever holds the lines that fit on screen
+    # and is redrawn from the list when the user scrolls, or at most every
+    # FLUSH_MS while lines come in (a DTC answer logs 5+ lines, fast polling
+    # hundreds per second: one redraw for all of them). Follows the end only
+    # while the last line is visible.
+    MAX_LINES = 20000
+    TRIM = 2000 # lines dropped at once when MAX_LINES is exceeded
+    FLUSH_MS = 50
+
+    def __init__(self, master, height: int = 20):
+        self.lines = []
+        self.pending = [] # appended since the last flush
+        self.flush_job = None
+        self.first = 0 # index of the top visible line
+        self.follow = True
+        self.frame = ttk.Frame(master)
+        self.text = tk.Text(self.frame, height=height, state="disabled", wrap="none")
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.text.pack(side="left", expand=True, fill="both")
+        self.line_height = tkfont.Font(font=self.text.cget("font")).metrics("linespace")
+        self.text.bind("<Configure>", lambda e: self.render())
+        # The widget holds no more than fits, scrolling is done on the list
+        self.text.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units") or "break")
+        self.text.bind("<Button-4>", lambda e: self.scroll(-1, "units") or "break")
+        self.text.bind("<Button-5>", lambda e: self.scroll(1, "units") or "break")
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    def configure(self, **kw):
+        self.text.configure(**kw)
+
+    def rows(self) -> int:
+        return max(1, self.text.winfo_height() // self.line_height) if self.text.winfo_ismapped() \
+            else int(self.text.cget("height"))
+
+    def append(self, text: str):
+        self.pending.append(text)
+        if self.flush_job is None:
+            self.flush_job = self.text.after(self.FLUSH_MS, self.flush)
+
+    def flush(self):
+        self.flush_job = None
+        if not self.pending:
             return
-        read_buffer = ""
-        try:
-            while not self.stop_event.is_set():
-                try:
-                    cmd = self.tx_queue.get_nowait()
-                except queue.Empty:
-                    cmd = None
-                if cmd:
-                    try:
-                        if self.ser and self.ser.is_open:
-                            self.ser.write((cmd + "\r").encode())
-                    except Exception as e:
-                        self.rx_queue.put(("__ERROR__", f"Write failed: {e}"))
-                try:
-                    if self.ser and self.ser.in_waiting:
-                        raw = self.ser.read(self.ser.in_waiting).decode(errors='ignore')
-                        read_buffer += raw
-                        if '>' in read_buffer or '\n' in read_buffer:
-                            parts = re.split(r'>|\r\n|\n', read_buffer)
-                            for p in parts[:-1]:
-                                pclean = p.strip()
-                                if pclean:
-                                    self.rx_queue.put(("__DATA__", pclean))
-                            read_buffer = parts[-1]
-                except Exception as e:
-                    self.rx_queue.put(("__ERROR__", f"Read failed: {e}"))
-                time.sleep(0.05)
-        finally:
-            self.close()
-            self.rx_queue.put(("__CLOSED__", "Serial closed"))
-            
+        self.lines.extend("\n".join(self.pending).split("\n"))
+        self.pending = []
+        if len(self.lines) > self.MAX_LINES + self.TRIM:
+            drop = len(self.lines) - self.MAX_LINES
+            del self.lines[:drop]
+            self.first = max(0, self.first - drop)
+        self.render()
+
+    def clear(self):
+        self.pending = []
+        self.lines = []
+        self.first = 0
+        self.follow = True
+        self.render()
+
+    def scroll(self, amount: int, what: str):
+        step = amount * (self.rows() if what == "pages" else 3)
+        self.show(self.first + step)
+
+    def on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.show(int(float(args[0]) * len(self.lines)))
+        elif action == "scroll":
+            self.scroll(int(args[0]), args[1])
+
+    def show(self, first: int):
+        rows = self.rows()
+        self.first = max(0, min(first, len(self.lines) - rows))
+        self.follow = self.first + rows >= len(self.lines)
+        self.render()
+
+    def render(self):
+        rows = self.rows()
+        total = len(self.lines)
+        if self.follow:
+            self.first = max(0, total - rows)
+        visible = self.lines[self.first:self.first + rows]
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("end", "\n".join(visible))
+        self.text.configure(state="disabled")
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
 class o3DIAG: #v6.0.1 <-----
     @staticmethod
     def show_splash():
@@ -396,12 +389,20 @@ Log:
             ("Clear DTCs", self.clear_dtcs),
             ("Clear Log", self.clear_log),
             ("Reload P-Code List", self.load_dtc_map),
-            ("Export Log (.txt)", self.export_log_COBOL)
+            ("Export Log (.txt)", self.export_log)
         ]
 
         for i, (text, cmd) in enumerate(btn_options, start=1):
             b = ttk.Button(frm_ctrl, text=text, command=cmd)
             b.grid(row=0, column=i, padx=2, pady=2, sticky="ew")
+
+#P-code language, switching does not reload the lists
+        self.dtc_language = FALLBACK_LANGUAGE
+        self.cmb_language = ttk.Combobox(frm_ctrl, width=10, state="readonly", values=[self.dtc_language],
+                                         postcommand=self.update_dtc_languages)
+        self.cmb_language.set(self.dtc_language)
+        self.cmb_language.bind("<<ComboboxSelected>>", lambda e: self.set_dtc_language(self.cmb_language.get()))
+        self.cmb_language.grid(row=0, column=len(btn_options) + 1, padx=2, pady=2, sticky="ew")
             
 #reading actions / get data with request codes
         ttk.Label(frm_ctrl, text="Actions:").grid(row=1, column=0, padx=4, pady=2, sticky="w")
@@ -411,21 +412,27 @@ Log:
             ("Get Speed", lambda: self.request_pid("010D")),
             ("Get Temp", lambda: self.request_pid("0105")),
             ("Get Load", lambda: self.request_pid("0104")),
-            ("Get Voltage", lambda: self.request_pid("0142"))
+            ("Get Voltage", lambda: self.request_pid("0142")),
+            ("Get All", lambda: self.request_pid_batch(["0C", "0D", "05", "04", "42"]))
         ]
 
         for i, (text, cmd) in enumerate(btn_reading, start=1):
             b = ttk.Button(frm_ctrl, text=text, command=cmd)
             b.grid(row=1, column=i, padx=2, pady=2, sticky="ew")
 
+        self.btn_poll = ttk.Button(frm_ctrl, text="Start Live Data", command=self.toggle_polling)
+        self.btn_poll.grid(row=1, column=len(btn_reading) + 1, padx=2, pady=2, sticky="ew")
+
  
         frm_log = ttk.Frame(root, padding=8)
         frm_log.grid(row=2, column=0, sticky="nsew")
         root.grid_rowconfigure(2, weight=1)
         root.grid_columnconfigure(0, weight=1)
 
-        self.log_text = scrolledtext.ScrolledText(frm_log, height=20, state="disabled", wrap="none")
+        self.log_store = o3DIAGLogStore() # every record since the last Clear Log, older ones in ~/.o3DIAG/history
+        self.log_text = o3DIAGLogView(frm_log, height=20) # shows the last MAX_LINES only
         self.log_text.pack(expand=True, fill="both")
+        self.log_store.listeners.append(lambda record, fmt=o3DIAGLogFormatter(): self.log_text.append(fmt(record)))
         self.make_text_colors()
         self.show_o3_INVENT_ascii_art()
 
@@ -452,6 +459,9 @@ Log:
         self.lbl_voltage = ttk.Label(frm_data, text="-")
         self.lbl_voltage.grid(row=0, column=9, sticky="w", padx=6)
 
+        self.pid_labels = {"0C": self.lbl_rpm, "0D": self.lbl_speed, "05": self.lbl_temp,
+                           "04": self.lbl_load, "42": self.lbl_voltage}
+
         frm_data.grid_columnconfigure(11, weight=1)
 
         self.btn_website = ttk.Button(
@@ -466,9 +476,14 @@ Log:
         self.tx_queue = queue.Queue()
         self.stop_event = threading.Event()
         self.thread = None
+        self.poller = None
+        self.calibrator = None
         self.connected = False
-        self.dtc_map = {}
+        self.can_protocol = None # None until ATDPN answered
+        # loads in the background: generic list, OEM lists next to it, then ~/.o3DIAG/o3script
+        self.dtc_catalog = o3DIAGDTCCatalog(on_loaded=self.dtc_map_loaded, loader=self.load_dtc_layers)
         self.o3script_filename = "o3DIAG_Pcodes_list_english.o3script"#load o3Script PcodesList 
+        self.o3script_folders = [os.path.dirname(resource_path(self.o3script_filename)), LOCAL_DIR]
         self.load_dtc_map()
         self.root.after(100, self.process_rx)
 
@@ -553,85 +568,46 @@ Log:
             "****************************************************************\n")
 
 #DATE TIME for LOG
-    def log(self, text: str):
-        ts_date = time.strftime("%Y/%m/%d")#date
-        ts = time.strftime("%H:%M:%S")#time
-        self.log_text.configure(state='normal')
-        self.log_text.insert('end', f"[{ts_date} {ts}] {text}\n")#date/time in log. text is log output
-        self.log_text.see('end')
-        self.log_text.configure(state='disabled')
+    def log(self, text: str, direction: str = "", raw: bytes = None, values=None):
+        # date/time is added when the record is shown or exported
+        self.log_store.add(text, direction=direction, raw=raw, values=values)
 
     def clear_log(self):
-        self.log_text.configure(state='normal')
-        self.log_text.delete('1.0', tk.END)
-        self.log_text.configure(state='disabled')
+        self.log_store.clear()
+        self.log_text.clear()
         self.show_o3_INVENT_ascii_art()
 
-    def export_log_COBOL(self): 
-#see https://o3diag.openw3rk.de/help/develop/cobol
-
+    def export_log(self):
+        # Written by o3diag.export on a worker thread from the log store:
+        # no temp file, no Log Export Manager .exe, the UI keeps running
+        path = next_log_path()
+        count = len(self.log_store)
+        lines = self.log_store.lines(0, count) # records added from now on are not exported
+        threading.Thread(target=self.export_worker, args=(lines, path), daemon=True).start()
+        self.log(f"[EXPORT INFO] Exporting {count} log entries ...")
+        if self.log_store.dropped:
+            self.log(f"[ WARN ] The oldest {self.log_store.dropped} entries are not in the export "
+                     f"(~/.o3DIAG/history could not be written)")
+
+    def export_worker(self, lines, path: str):
         try:
-            log_text = self.log_text.get("1.0", "end-1c")
-
-            # Pfade im User-Home-Verzeichnis
-            user_home = os.path.expanduser("~")
-            o3diag_base = os.path.join(user_home, ".o3DIAG")
-            temp_dir = os.path.join(o3diag_base, "temp_files")
-            logs_dir = os.path.join(o3diag_base, "logs")
-            
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            input_file = os.path.join(temp_dir, "o3DIAG_INPUT_LOG.TXT")
-            
-            # Output-Log
-            base_name = "o3DIAG_OUTPUT_LOG"
-            ext = ".TXT"
-            output_log_txt = os.path.join(logs_dir, base_name + ext)
-            counter = 1
-            while os.path.exists(output_log_txt):
-                counter += 1
-                output_log_txt = os.path.join(logs_dir, f"{base_name}_{counter:02d}{ext}")
-                
-            with open(input_file, "w", encoding="utf-8") as f:
-                f.write(log_text)
-
-            # Export-Manager
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            export_manager = os.path.join(script_dir, "log_export", "o3DIAG_Log_Export_Manager.exe")
-            
-            result = subprocess.run(
-                [export_manager, input_file, output_log_txt],
-                capture_output=True,
-                text=True
-            )
-
-            if result.returncode != 0:
-                self.log(f"[PANIC] Log export failed: {result.stderr}")
-                return
-                
-            try:
-                os.remove(input_file)
-            except Exception as e:
-                self.log(f"[WARN] temp file could not be deleted: {e}")
-
-            # Öffne nach Erstellung
-            if os.path.exists(output_log_txt):
-                if os.name == "nt":
-                    os.startfile(output_log_txt)
-                else:
-                    subprocess.run(["xdg-open", output_log_txt])
-                self.log(f"[EXPORT INFO] Log export completed successfully ({os.path.basename(output_log_txt)}).")
-                self.log(f"[EXPORT PATH] {output_log_txt}")
+            write_log_export(lines, path)
+        except Exception as e:
+            self.rx_queue.put(("__INFO__", f"[PANIC] Export failed: {e}"))
+            return
+        self.rx_queue.put(("__INFO__", f"[EXPORT INFO] Log export completed successfully ({os.path.basename(path)})."))
+        self.rx_queue.put(("__INFO__", f"[EXPORT PATH] {path}"))
+        # Öffne nach Erstellung
+        try:
+            if os.name == "nt":
+                os.startfile(path)
             else:
-                self.log(f"[PANIC] Output file not found: {output_log_txt}")
-
+                subprocess.run(["xdg-open", path])
         except Exception as e:
-            self.log(f"[PANIC] Export failed: {e}")
+            self.rx_queue.put(("__INFO__", f"[WARN] Export could not be opened: {e}"))
 
     def show_o3_INVENT_ascii_art(self):
-        self.log_text.configure(state='normal')
-        self.log_text.insert('end', self.ASCII_ART + "\n")
-        self.log_text.configure(state='disabled')
+        self.log_store.add(self.ASCII_ART, stamp=False)
 
     def toggle_connect(self):#ELM adapter
         if self.connected:
@@ -667,40 +643,40 @@ Log:
 
 
     def send_and_wait(self, cmd: str, timeout: float = 1.0) -> bool:
-        self.send_command(cmd)
-        start_time = time.time()
-        
-        while time.time() - start_time < timeout:
-            try:
-                kind, payload = self.rx_queue.get_nowait()
-            except queue.Empty:
-                time.sleep(0.05)
-                continue
-                
-            if kind == "__DATA__" and payload.strip():
-                clean = payload.replace("SEARCHING...", "").strip()
-                if clean and clean not in ["OK", ">"]:
-                    self.log(f"Response: {clean}")
-                return True
-            elif kind == "__ERROR__":
-                self.log(f"[ WARN ] {payload}")
-                return True
-                
-        return False
+        if not self.connected:
+            self.log("[PANIC] Not connected – command not sent.")
+            return False
+        self.log(f"Request >>> {cmd}", DIRECTION_TX, cmd.encode("ascii")) #OUT
+        try:
+            response = self.thread.request(cmd, timeout).result()
+        except TimeoutError:
+            return False
+        except Exception as e:
+            self.log(f"[ WARN ] {e}")
+            return True
+
+        for line in response.lines:
+            clean = line.replace("SEARCHING...", "").strip()
+            if clean and clean not in ["OK", ">"]:
+                self.log(f"Response: {clean}", DIRECTION_RX, clean.encode("ascii", "ignore"))
+        return True
 
     def disconnect(self):
+        self.stop_polling()
         self.stop_event.set()
         self.connected = False
         self.btn_connect.config(text="Connect")
         self.lbl_status.config(text="Status: disconnected")
         self.log("Disconnected")
 
-    def send_command(self, cmd: str):
+    def send_command(self, cmd: str, timeout: float = None):
         if not self.connected:
             self.log("[PANIC] Not connected – command not sent.")
-            return
-        self.tx_queue.put(cmd)
-        self.log(f"Request >>> {cmd}") #OUT 
+            return None
+        # The response is handed back to the Tk thread through rx_queue
+        future = self.thread.request(cmd, timeout, lambda f: self.rx_queue.put(("__RESPONSE__", (cmd, f))))
+        self.log(f"Request >>> {cmd}", DIRECTION_TX, cmd.encode("ascii")) #OUT 
+        return future
 
     def init_adapter(self):
         if not self.connected:
@@ -714,57 +690,87 @@ Log:
             self.log("[PANIC] Not connected: please connect first.")
             return
 
-        base_commands = [
-            "ATZ",          # Reset
-            "ATE0",         # Echo OFF
-            "ATL0",         # Linefeeds OFF  
-            "ATH0",         # Headers OFF
-        ]
-        
-        advanced_commands = [
-            "ATSP0",        # Auto-Protokoll
-            "ATAT1",        # Adaptive Timing
-            "ATSTFF",       # Max Timeout
-            "ATAL",         # Long Messages
-        ]
-        
-        test_commands = [
-            "ATI",          # Adapter Info
-            "0100"          # PID Support test
-        ]
-
         self.log("Initializing Adapter (Adaptive Mode) ...")
 
         # Phase 1
-        for cmd in base_commands:
+        for cmd in INIT_BASE_COMMANDS:
             if self.send_and_wait(cmd, timeout=2.0):
                 self.log(f"[ OK ] {cmd}")
             else:
                 self.log(f"[ WARN ] {cmd} failed or no response")
 
         # Phase 2
-        for cmd in advanced_commands:
+        for cmd in INIT_ADVANCED_COMMANDS:
             if self.send_and_wait(cmd, timeout=1.5):
                 self.log(f"[ OK ] {cmd}")
             else:
                 self.log(f"[ INFO ] {cmd} not supported")
 
         # Funktionalität testen
-        for cmd in test_commands:
+        for cmd in INIT_TEST_COMMANDS:
             if self.send_and_wait(cmd, timeout=2.0):
                 self.log(f"[ OK ] {cmd} functional")
             else:
                 self.log(f"[ WARN ] {cmd} not working")
 
+        self.detect_protocol()
+        self.calibrate_timeout()
         self.log("[ OK ] Adaptive initialization completed.")
 
+    def calibrate_timeout(self):
+        if self.calibrator and self.calibrator.observe in self.thread.response_listeners:
+            self.thread.response_listeners.remove(self.calibrator.observe)
+        self.calibrator = o3DIAGTimeoutCalibrator(self.thread, lambda text: self.rx_queue.put(("__INFO__", text)))
+        self.log("Calibrating ECU timeout (ATST) ...")
+        if self.calibrator.calibrate() is not None:
+            self.thread.response_listeners.append(self.calibrator.observe)
+
+    def detect_protocol(self):
+        try:
+            protocol = detect_protocol(self.thread)
+        except Exception as e:
+            self.log(f"[ INFO ] ATDPN failed: {e}")
+            return
+        self.can_protocol = protocol in CAN_PROTOCOLS if protocol else None
+        self.log(f"[ OK ] Protocol {protocol or '?'} ({'CAN, multi-PID requests enabled' if self.can_protocol else 'no CAN, single PID requests'})")
+
     def request_pid(self, pidcmd: str):
         self.send_command(pidcmd)
-        time.sleep(0.15) 
+
+    def request_pid_batch(self, pids):
+        # One Mode 01 request for up to 6 PIDs on CAN, single requests otherwise
+        for command in build_pid_requests(pids, batch=self.can_protocol):
+            self.request_pid(command)
+
+    def toggle_polling(self):
+        if self.poller:
+            self.stop_polling()
+            return
+        if not self.connected:
+            self.log("[PANIC] Not connected: please connect first.")
+            return
+        # Samples are handed to the Tk thread through rx_queue
+        self.poller = o3DIAGPoller(self.thread, POLL_RATES,
+                                   lambda pid, d, ts: self.rx_queue.put(("__SAMPLE__", (pid, d))),
+                                   batch=self.can_protocol)
+        self.poller.start()
+        self.btn_poll.config(text="Stop Live Data")
+        rates = ", ".join(f"{pid} @ {hz:g} Hz" for pid, hz in POLL_RATES.items())
+        self.log(f"Live data started: {rates}")
+
+    def stop_polling(self):
+        if not self.poller:
+            return
+        self.poller.stop()
+        self.poller.join(timeout=2.0)
+        self.log("Live data stopped. Achieved rates:")
+        for pid, (target, achieved, misses) in self.poller.achieved_rates().items():
+            self.log(f"  01{pid}: {achieved:.2f} Hz of {target:g} Hz ({misses} missed)")
+        self.poller = None
+        self.btn_poll.config(text="Start Live Data")
 
     def request_dtcs(self):
-        self.send_command("03")
-        time.sleep(0.15) 
+        self.send_command("03", timeout=5.0)
         
     def clear_dtcs(self):#not compatible with o3DIAG E/EE 5.0 or earlier
         if messagebox.askyesno("WARNING", "Really clear stored trouble codes? (OBD-II Mode 04)"):
@@ -776,10 +782,17 @@ Log:
                 kind, payload = self.rx_queue.get_nowait()
                 if kind == "__DATA__":
                     self.process_response(payload)
+                elif kind == "__RESPONSE__":
+                    self.process_request_result(*payload)
+                elif kind == "__INFO__":
+                    self.log(payload)
+                elif kind == "__SAMPLE__":
+                    self.show_pid_value(*payload, log=False)
                 elif kind == "__ERROR__":
                     self.log(f"[ERROR] {payload}")
                     self.lbl_status.config(text="Status: error")
                 elif kind == "__CLOSED__":
+                    self.stop_polling()
                     self.log("Serial closed")
                     self.lbl_status.config(text="Status: disconnected")
                     self.connected = False
@@ -788,15 +801,34 @@ Log:
             pass
         self.root.after(100, self.process_rx)
 
+    def process_request_result(self, cmd: str, future):
+        try:
+            response = future.result()
+        except TimeoutError:
+            self.log(f"[ WARN ] {cmd}: no response (timeout)")
+            return
+        except Exception as e:
+            self.log(f"[ WARN ] {cmd}: {e}")
+            return
+        if cmd in DTC_SERVICES:
+            self.process_dtc_response(cmd, response.lines)
+            return
+        if len(split_pid_request(cmd)) > 1:
+            self.process_batch_response(cmd, response.lines)
+            return
+        for line in response.lines:
+            self.process_response(line)
+
     def process_response(self, data: str):
         clean = clean_response(data).replace("SEARCHING...", "").strip()
         if not clean:
             return
 
-        self.log(f"Response <<< {clean}")
+        message = parse_line(clean)
+        self.log(f"Response <<< {clean}", DIRECTION_RX, clean.encode("ascii", "ignore"), message.values)
 
-        if "43" in clean:
-            dtcs = extract_dtcs_from_response(clean)
+        if message.service == 0x43:
+            dtcs = list(message.dtcs)
 
             if not dtcs:
                 dtcs = ["P0000"]#no dtc P0000 or 0000
@@ -806,95 +838,95 @@ Log:
                 desc = self.lookup_dtc(code) or "(no description found)"
                 self.log(f"  {code} – {desc}")
 
-        d = parse_pid_response(clean, "0C")
-        if d:
-            rpm = calc_rpm(d)
-            if rpm is not None:
-                self.lbl_rpm.config(text=f"{rpm:.0f} |")
-                self.log(f"RPM: {rpm:.0f} rpm")
-
-        d = parse_pid_response(clean, "42")
-        if d:
-            try:
-                A = int(d[0], 16)
-                B = int(d[1], 16) if len(d) > 1 else 0
-                voltage = (A * 256 + B) / 1000.0
-                self.lbl_voltage.config(text=f"{voltage:.2f} V")
-                self.log(f"BatteryVoltage: {voltage:.2f} V")
-            except Exception as e:
-                self.log(f"[PANIC] Voltage parse failed: {e}")
-
-        d = parse_pid_response(clean, "0D")
-        if d:
-            sp = calc_speed(d)
-            if sp is not None:
-                self.lbl_speed.config(text=f"{sp:.0f} |")
-                self.log(f"Speed: {sp:.0f} km/h")
-
-        d = parse_pid_response(clean, "05")
-        if d:
-            t = calc_temp(d)
-            if t is not None:
-                self.lbl_temp.config(text=f"{t:.0f} |")
-                self.log(f"CoolantTemp: {t:.0f} °C")
-
-        d = parse_pid_response(clean, "04")
-        if d:
-            l = calc_engine_load(d)
-            if l is not None:
-                self.lbl_load.config(text=f"{l:.0f} |")
-                self.log(f"EngineLoad: {l:.0f} %")
-
-        if "NO DATA" in clean.upper():
+        for value in message.values:
+            self.show_value(value)
+
+        if "NO DATA" in message.text.upper():
             self.log("[PANIC] NO DATA – PID/Mode not supported or no current values.")
 
-            
-    def load_dtc_map(self):
-        path = resource_path(self.o3script_filename)
-        new_map = {}
-        try:
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                reading = False
-                for line in f:
-                    s = line.strip()
-                    if not s:
-                        continue #o3Script syntax, see https://o3diag.openw3rk.de/help/develop/o3script
-                    if s.startswith("<") and "START;READ" in s:
-                        reading = True
-                        continue
-                    if s.startswith("<") and "END;READ" in s:
-                        reading = False
-                        continue
-                    if not reading:
-                        continue
-                    if s.startswith("<") or s.startswith("-"):
-                        continue
-                    s = s.split("<")[0].strip()
-                    if "\t" in s:
-                        code, desc = s.split("\t", 1)
-                    else:
-                        parts = s.split(None, 1)
-                        if len(parts) != 2:
-                            continue
-                        code, desc = parts
-                    code = code.strip().upper()
-                    desc = desc.strip()
-                    if re.fullmatch(r'[PCBU]\d{4}', code):
-                        new_map[code] = desc
-        except FileNotFoundError:
-            self.log(f"P-Code list not found: {self.o3script_filename}")
-            self.dtc_map = {}
-            return
-        except Exception as e:
-            self.log(f"P-Code list could not be read, o3Script syntax error?: {e}")
-            self.dtc_map = {}
+
+    def show_pid_value(self, pid: str, d, log: bool = True):
+        decoded = decode_pid(pid, d)
+        if decoded:
+            self.show_value(o3DIAGValue(pid, *decoded), log)
+
+    def show_value(self, value, log: bool = True):
+        text = format_pid_value(value.pid, value.value)
+        label = self.pid_labels.get(value.pid)
+        if label:
+            label.config(text=f"{text} {value.unit}" if value.pid == "42" else f"{text} |")
+        if log:
+            self.log(f"{value.name}: {text} {value.unit}", values=(value,))
+
+    def process_batch_response(self, cmd: str, lines):
+        for line in lines:
+            clean = clean_response(line).replace("SEARCHING...", "").strip()
+            if clean:
+                self.log(f"Response <<< {clean}", DIRECTION_RX, clean.encode("ascii", "ignore"))
+        values = split_multi_pid_response(lines)
+        for pid, d in values.items():
+            self.show_pid_value(pid, d)
+        missing = [pid for pid in split_pid_request(cmd) if pid not in values]
+        if missing:
+            # ECU left PIDs out of the combined answer, ask for them one by one
+            self.log(f"[ INFO ] Batch answer incomplete, requesting {' '.join(missing)} separately")
+            for command in build_pid_requests(missing, batch=False):
+                self.request_pid(command)
+
+    def process_dtc_response(self, cmd: str, lines):
+        # Mode 03/07/0A: ISO-TP frames joined, one list per answering ECU
+        for line in lines:
+            clean = clean_response(line).replace("SEARCHING...", "").strip()
+            if clean:
+                self.log(f"Response <<< {clean}", DIRECTION_RX, clean.encode("ascii", "ignore"))
+        by_ecu = extract_dtcs_by_ecu(lines, DTC_SERVICES[cmd], self.can_protocol)
+        if not by_ecu:
+            if any("NO DATA" in line.upper() for line in lines):
+                self.log("[PANIC] NO DATA – PID/Mode not supported or no current values.")
             return
+        for ecu, dtcs in by_ecu.items():
+            self.log(f"Error codes ({ecu}):" if len(by_ecu) > 1 else "Error codes:")
+            for code in dtcs or ["P0000"]:#no dtc P0000 or 0000
+                desc = self.lookup_dtc(code) or "(no description found)"
+                self.log(f"  {code} – {desc}")
 
-        self.dtc_map = new_map
-        self.log(f"P-Code list (English) loaded: {len(self.dtc_map)} lines\n")
+    def load_dtc_map(self):
+        # Returns at once, dtc_map_loaded reports when the list is ready.
+        # Edits to the .o3script while o3DIAG runs are picked up by the watcher.
+        self.dtc_catalog.load(self.o3script_folders)
+        self.dtc_catalog.watch()
+
+    def load_dtc_layers(self, folders, cache_dir):
+        return load_dtc_layers(folders, cache_dir, self.dtc_language)
+
+    def update_dtc_languages(self):
+        languages = getattr(self.dtc_catalog.map, "languages", None)
+        if languages:
+            self.cmb_language["values"] = languages()
+
+    def set_dtc_language(self, language: str):
+        self.dtc_language = language
+        if hasattr(self.dtc_catalog.map, "set_language"):
+            self.dtc_catalog.map.set_language(language)
+        self.log(f"P-Code language: {language.capitalize()}")
+
+    def dtc_map_loaded(self, catalog):
+        # Worker thread: hand the message to the UI thread
+        if catalog.changes:
+            added, changed, removed = catalog.changes
+            text = f"P-Code list updated: {len(added)} added, {len(changed)} changed, {len(removed)} removed"
+        elif isinstance(catalog.error, FileNotFoundError):
+            text = f"P-Code list not found: {catalog.error}"
+        elif catalog.error:
+            text = f"P-Code list could not be read, o3Script syntax error?: {catalog.error}"
+        else:
+            text = (f"P-Code list ({catalog.map.language.capitalize()}) loaded: {len(catalog)} lines, "
+                    f"{len(catalog.map.paths)} file(s)\n")
+        self.rx_queue.put(("__INFO__", text))
 
     def lookup_dtc(self, code: str) -> str:
-        return self.dtc_map.get(code.upper(), "")
+        # Waits for the first load if a DTC answer is faster than the list
+        return self.dtc_catalog.get(code)
 
 if __name__ == "__main__":
     o3DIAG.show_splash()
@@ -902,3 +934,4 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = o3DIAG(root)
     root.mainloop()
+    app.log_store.close() # session history file
@@ -0,0 +1,396 @@
+# o3DIAG - serial, parse and decode pipeline benchmark
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# End to end: o3DIAGCommunicator against the ELM327 simulator (started as
+# "python -m o3diag simulate" in its own process, so the CPU time measured
+# here is o3DIAG's only) or a real adapter. Reports PIDs per second, p50/p99
+# round trip and CPU per sample, one PID per request and batched, plus
+# frames per second and CPU per frame in ATMA monitor mode.
+# Micro: clean_response, parse_pid_response, parse_line,
+# extract_dtcs_from_response, extract_dtcs_by_ecu, dtc_from_bytes,
+# decode_dtcs (NumPy too, if installed), parse_o3script, the cached
+# load_dtc_map and the mapped load_dtc_index with dict / index lookups on
+# the recorded corpus (corpus_elm327.txt) and on synthetic data.
+# Results are written as JSON; --compare prints the change against the
+# results of an older version.
+#
+# Usage:
+#   python o3bench/bench_pipeline.py [--duration 5] [--output bench_6.0.1.json]
+#   python o3bench/bench_pipeline.py --port /dev/ttyUSB0 --skip-micro
+#   python o3bench/bench_pipeline.py --compare bench_6.0.1.json
+# -------------------------------------------------
+
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from o3diag import (
+    INIT_ADVANCED_COMMANDS,
+    INIT_BASE_COMMANDS,
+    INIT_TEST_COMMANDS,
+    PID_DATA_LENGTHS,
+    __version__,
+    build_pid_requests,
+    clean_response,
+    decode_dtcs,
+    detect_protocol,
+    dtc_from_bytes,
+    extract_dtcs_by_ecu,
+    extract_dtcs_from_response,
+    load_dtc_index,
+    load_dtc_map,
+    o3DIAGCommunicator,
+    o3DIAGTimeoutCalibrator,
+    parse_line,
+    parse_o3script,
+    parse_pid_response,
+    split_adapter_bytes,
+    split_adapter_output,
+    split_multi_pid_response,
+)
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_elm327.txt")
+O3SCRIPT = os.path.join(ROOT, "o3DIAG_Pcodes_list_english.o3script")
+LIVE_PIDS = ["0C", "0D", "05", "04", "42"]
+
+
+# -- corpora -----------------------------------------------------------
+
+def load_corpus(path: str = CORPUS):
+    # -> [(command, raw adapter output)]
+    records = []
+    cmd, raw = None, []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("#"):
+                continue
+            if line.startswith("@ "):
+                cmd, raw = line[2:].strip(), []
+            elif cmd is not None:
+                raw.append(line)
+                if line.startswith(">"):
+                    records.append((cmd, "\r".join(raw)))
+                    cmd = None
+    return records
+
+
+def synthetic_corpus(count: int = 2000, seed: int = 3):
+    # Answers as a CAN vehicle with two ECUs would give them, same mix as polling
+    rng = random.Random(seed)
+    hexline = lambda values: " ".join(f"{v:02X}" for v in values) + " "
+    records = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.6:
+            pid = rng.choice(LIVE_PIDS)
+            data = [rng.randrange(256) for _ in range(PID_DATA_LENGTHS[pid])]
+            lines = [hexline([0x41, int(pid, 16)] + data)] * rng.choice((1, 1, 2))
+            records.append(("01" + pid, "\r".join(lines) + "\r\r>"))
+        elif kind < 0.9:
+            pids = rng.sample(LIVE_PIDS, 3)
+            payload = [0x41]
+            for pid in pids:
+                payload += [int(pid, 16)] + [rng.randrange(256) for _ in range(PID_DATA_LENGTHS[pid])]
+            if len(payload) <= 7:
+                lines = [hexline(payload)]
+            else:
+                chunks = [payload[:6]] + [payload[i:i + 7] for i in range(6, len(payload), 7)]
+                lines = [f"{len(payload):03X} "] + [f"{n}: " + hexline(c) for n, c in enumerate(chunks)]
+            records.append(("01" + "".join(pids), "\r".join(lines) + "\r\r>"))
+        else:
+            codes = [rng.randrange(1, 0x10000) for _ in range(rng.randrange(0, 7))]
+            values = [b for code in codes for b in (code >> 8, code & 0xFF)]
+            values += [0] * (-len(values) % 6 if values else 6)
+            lines = [hexline([0x43] + values[i:i + 6]) for i in range(0, len(values), 6)]
+            records.append(("03", "\r".join(lines) + "\r\r>"))
+    return records
+
+
+def synthetic_o3script(path: str, count: int = 20000, seed: int = 3):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("-* synthetic o3script for o3bench *-\n\n<o3script.START;READ>\n")
+        for n in range(count):
+            code = f"{'PCBU'[n % 4]}{rng.randrange(10000):04d}"
+            f.write(f"{code}\tSynthetic description number {n} for {code}\n")
+        f.write("<o3script.END;READ>\n")
+
+
+# -- micro benchmarks ----------------------------------------------------
+
+def bench(name: str, corpus: str, func, items, repeat: int = 5):
+    # Best of repeat runs over all items -> result dict, times per call
+    def run():
+        for item in items:
+            func(*item)
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    per_op = best / len(items)
+    return {"name": name, "corpus": corpus, "items": len(items),
+            "ns_per_op": per_op * 1e9, "ops_per_s": 1.0 / per_op}
+
+
+def micro_benchmarks(log):
+    results = []
+    corpora = {"recorded": load_corpus(), "synthetic": synthetic_corpus()}
+    for corpus, records in corpora.items():
+        raws = [(raw,) for _, raw in records]
+        raw_bytes = [(raw.encode(),) for _, raw in records]
+        lines = [(line,) for _, raw in records for line in raw.split("\r") if line.strip(" >")]
+        cleaned = [(cmd, clean_response(raw)) for cmd, raw in records]
+        pid_items = [(resp, cmd[2:4]) for cmd, resp in cleaned if cmd.startswith("01") and len(cmd) == 4]
+        dtc_items = [(resp,) for cmd, resp in cleaned if cmd == "03"]
+        dtc_answers = [(raw.split("\r"),) for cmd, raw in records if cmd == "03"]
+        dtc_bytes = [int(t, 16) for (resp,) in dtc_items for t in resp.split()
+                     if len(t) == 2 and t != "43" and all(c in "0123456789ABCDEF" for c in t)]
+        pairs = list(zip(dtc_bytes[0::2], dtc_bytes[1::2]))
+        for name, func, items in (
+            ("split_adapter_output", split_adapter_output, raws),
+            ("split_adapter_bytes", split_adapter_bytes, raw_bytes),
+            ("clean_response", clean_response, raws),
+            ("parse_pid_response", parse_pid_response, pid_items),
+            ("parse_line", parse_line, lines),
+            ("parse_line bytes", parse_line, [(line.encode(),) for (line,) in lines]),
+            ("extract_dtcs_from_response", extract_dtcs_from_response, dtc_items),
+            ("extract_dtcs_by_ecu", extract_dtcs_by_ecu, dtc_answers),
+            ("dtc_from_bytes", dtc_from_bytes, pairs),
+        ):
+            if items:
+                results.append(bench(name, corpus, func, items))
+                log(results[-1])
+    results.append(bench("dtc_from_bytes", "all 65536", dtc_from_bytes,
+                         [(a, b) for a in range(256) for b in range(256)], repeat=3))
+    log(results[-1])
+
+    # Bulk re-decoding of archived Mode 03 data: 100000 words per call
+    rng = random.Random(3)
+    archive = bytes(rng.randrange(256) for _ in range(200000))
+    results.append(bench("decode_dtcs", "bytes 100000 words", decode_dtcs, [(archive,)], repeat=3))
+    log(results[-1])
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is not None:
+        words = np.frombuffer(archive, dtype=">u2").astype(np.uint16)
+        results.append(bench("decode_dtcs", "numpy 100000 words", decode_dtcs, [(words,)], repeat=3))
+        log(results[-1])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.o3script")
+        synthetic_o3script(path)
+        for corpus, source in (("o3script", O3SCRIPT), ("synthetic 20000", path)):
+            # parse_o3script: every startup before the cache; load_dtc_map: from the cache
+            results.append(bench("parse_o3script", corpus, parse_o3script, [(source,)], repeat=3))
+            results[-1]["entries"] = len(parse_o3script(source))
+            log(results[-1])
+            load_dtc_map(source, cache_dir=tmp)
+            results.append(bench("load_dtc_map", corpus, load_dtc_map, [(source, tmp)], repeat=3))
+            log(results[-1])
+            # Mapped index: opening costs no parse, every lookup a binary search
+            index = load_dtc_index(source, cache_dir=tmp)
+            results.append(bench("load_dtc_index", corpus, load_dtc_index, [(source, tmp)], repeat=3))
+            log(results[-1])
+            dtc_map = load_dtc_map(source, cache_dir=tmp)
+            codes = [(code,) for code in random.Random(5).sample(sorted(dtc_map), min(1000, len(dtc_map)))]
+            results.append(bench("dtc lookup dict", corpus, dtc_map.get, codes))
+            log(results[-1])
+            results.append(bench("dtc lookup o3idx", corpus, index.get, codes))
+            log(results[-1])
+            index.close()
+    return results
+
+
+# -- end to end ------------------------------------------------------------
+
+def start_simulator(args):
+    # The simulator runs in its own process, so CPU time below is o3DIAG's only
+    cmd = [sys.executable, "-m", "o3diag", "simulate", "--latency", str(args.latency),
+           "--search-delay", "0", "--seed", "3", "--monitor-rate", str(args.monitor_rate)]
+    cmd += ["--tcp", "0"] if args.transport == "tcp" else []
+    for error in args.error or []:
+        cmd += ["--error", error]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    port = proc.stdout.readline().strip()
+    if not port:
+        proc.kill()
+        sys.exit("The simulator did not start (no pty? try --transport tcp)")
+    return proc, port
+
+
+def connect(port: str, baudrate: int):
+    comm = o3DIAGCommunicator(port, baudrate, queue.Queue(), queue.Queue(), threading.Event())
+    comm.start()
+    for cmd in INIT_BASE_COMMANDS + INIT_ADVANCED_COMMANDS + INIT_TEST_COMMANDS:
+        try:
+            comm.request(cmd, 2.0).result()
+        except TimeoutError:
+            pass
+    protocol = detect_protocol(comm)
+    o3DIAGTimeoutCalibrator(comm, log=lambda text: None).calibrate()
+    return comm, protocol
+
+
+def end_to_end(comm, name: str, batch: bool, duration: float):
+    commands = build_pid_requests(LIVE_PIDS, batch=batch)
+    latencies = []
+    samples = errors = 0
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    while time.perf_counter() - wall0 < duration:
+        for cmd in commands:
+            try:
+                response = comm.request(cmd, 1.0).result()
+            except TimeoutError:
+                errors += 1
+                continue
+            latencies.append(response.elapsed)
+            samples += len(split_multi_pid_response(response.lines))
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+    latencies.sort()
+    return {
+        "name": name, "requests": len(latencies), "timeouts": errors, "samples": samples,
+        "pids_per_s": samples / wall,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else None,
+        "cpu_us_per_sample": cpu / samples * 1e6 if samples else None,
+    }
+
+
+def monitor_throughput(comm, duration: float):
+    # ATMA with the bytes fast path: every frame is parsed, nothing else
+    frames = [0]
+
+    def on_frame(line, stamp):
+        frames[0] += 1
+        parse_line(line)
+
+    comm.frame_listeners.append(on_frame)
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    comm.tx_queue.put("ATMA")
+    time.sleep(duration)
+    comm.interrupt()
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+    time.sleep(0.2) # STOPPED and the prompt
+    comm.frame_listeners.remove(on_frame)
+    return {
+        "name": "ATMA monitor", "requests": 1, "timeouts": 0, "samples": frames[0],
+        "pids_per_s": frames[0] / wall, "p50_ms": None, "p99_ms": None,
+        "cpu_us_per_sample": cpu / frames[0] * 1e6 if frames[0] else None,
+    }
+
+
+def end_to_end_benchmarks(args, log):
+    proc = None
+    port = args.port
+    if not port:
+        proc, port = start_simulator(args)
+    comm = None
+    try:
+        comm, protocol = connect(port, args.baud)
+        log(f"[ INFO ] {port}, protocol {protocol}")
+        results = []
+        for name, batch in (("single PID", False), ("batched PIDs", True)):
+            results.append(end_to_end(comm, name, batch, args.duration))
+            log(results[-1])
+        results.append(monitor_throughput(comm, args.duration))
+        log(results[-1])
+        return results
+    finally:
+        if comm:
+            comm.stop_event.set()
+            comm.join(timeout=2.0)
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=5.0)
+
+
+# -- output ------------------------------------------------------------------
+
+def key(result):
+    return f"{result['name']} [{result.get('corpus', 'end to end')}]"
+
+
+def print_results(results):
+    print(f"\no3DIAG {results['o3diag']} pipeline benchmark, Python {results['python']}")
+    print("-" * 80)
+    for r in results["end_to_end"]:
+        p50 = f"{r['p50_ms']:7.2f}" if r["p50_ms"] is not None else "    n/a"
+        p99 = f"{r['p99_ms']:7.2f}" if r["p99_ms"] is not None else "    n/a"
+        cpu = f"{r['cpu_us_per_sample']:7.1f}" if r["cpu_us_per_sample"] is not None else "    n/a"
+        print(f"{r['name']:<34} {r['pids_per_s']:8.1f} PIDs/s | p50 {p50} ms | p99 {p99} ms | "
+              f"{cpu} us CPU/sample")
+    for r in results["micro"]:
+        print(f"{key(r):<48} {r['ns_per_op']:12.0f} ns/op | {r['ops_per_s']:12.0f} ops/s")
+
+
+def print_comparison(results, path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    print(f"\nChange against {os.path.basename(path)} (o3DIAG {old.get('o3diag', '?')})")
+    print("-" * 80)
+    before = {key(r): r for r in old.get("end_to_end", [])}
+    for r in results["end_to_end"]:
+        o = before.get(key(r))
+        if o and o.get("pids_per_s"):
+            print(f"{key(r):<48} PIDs/s x{r['pids_per_s'] / o['pids_per_s']:6.2f}")
+    before = {key(r): r for r in old.get("micro", [])}
+    for r in results["micro"]:
+        o = before.get(key(r))
+        if o:
+            print(f"{key(r):<48} speedup x{o['ns_per_op'] / r['ns_per_op']:6.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="o3DIAG serial, parse and decode pipeline benchmark")
+    ap.add_argument("--port", help="real adapter instead of the simulator, e.g. /dev/ttyUSB0")
+    ap.add_argument("--baud", type=int, default=115200, help="baud rate for --port (default 115200)")
+    ap.add_argument("--transport", choices=("tcp", "pty"), default="tcp", help="simulator transport (default tcp)")
+    ap.add_argument("--latency", type=float, default=5.0, help="simulated ms per ECU answer (default 5)")
+    ap.add_argument("--monitor-rate", type=float, default=20000.0, help="simulated ATMA frames/s (default 20000)")
+    ap.add_argument("--error", action="append", metavar="TEXT=P", help="simulator error injection, see simulate")
+    ap.add_argument("--duration", type=float, default=5.0, help="seconds per end to end run (default 5)")
+    ap.add_argument("--skip-e2e", action="store_true", help="micro benchmarks only")
+    ap.add_argument("--skip-micro", action="store_true", help="end to end only")
+    ap.add_argument("--output", default=f"bench_{__version__}.json", help="JSON results (default bench_<version>.json)")
+    ap.add_argument("--compare", help="older JSON results to compare with")
+    args = ap.parse_args()
+
+    log = lambda item: print(item if isinstance(item, str) else f"  {key(item)}", file=sys.stderr, flush=True)
+    results = {
+        "o3diag": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"latency_ms": args.latency, "duration_s": args.duration, "monitor_rate": args.monitor_rate,
+                     "transport": "adapter" if args.port else args.transport},
+        "end_to_end": [] if args.skip_e2e else end_to_end_benchmarks(args, log),
+        "micro": [] if args.skip_micro else micro_benchmarks(log),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_results(results)
+    print(f"\n[ OK ] Results written to {args.output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# o3DIAG - serial round trip latency benchmark
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# Measures the time from queuing a PID request on tx_queue until the
+# response line arrives on rx_queue, for the sleep-poll reader used up to
+# 6.0.1 and the event-driven reader. A pty stands in for the ELM327, so
+# this runs on Linux only and needs no adapter.
+#
+# Usage:
+#   python o3bench/bench_serial_latency.py [--count 200] [--ecu-delay 0.005]
+# -------------------------------------------------
+
+import argparse
+import os
+import queue
+import re
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from o3diag import o3DIAGCommunicator
+
+
+class LegacyCommunicator(o3DIAGCommunicator):
+    # Reader loop as shipped up to 6.0.1: poll tx_queue and in_waiting, then sleep.
+    def __init__(self, *args, poll_sleep=0.05, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.poll_sleep = poll_sleep
+
+    def run(self):
+        ok, err = self.open()
+        if not ok:
+            self.rx_queue.put(("__ERROR__", err))
+            return
+        read_buffer = ""
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    cmd = self.tx_queue.get_nowait()
+                except queue.Empty:
+                    cmd = None
+                if cmd:
+                    self.ser.write((cmd + "\r").encode())
+                if self.ser.in_waiting:
+                    read_buffer += self.ser.read(self.ser.in_waiting).decode(errors='ignore')
+                    if '>' in read_buffer or '\n' in read_buffer:
+                        parts = re.split(r'>|\r\n|\n', read_buffer)
+                        for p in parts[:-1]:
+                            if p.strip():
+                                self.rx_queue.put(("__DATA__", p.strip()))
+                        read_buffer = parts[-1]
+                time.sleep(self.poll_sleep)
+        finally:
+            self.close()
+            self.rx_queue.put(("__CLOSED__", "Serial closed"))
+
+
+def fake_elm327(master_fd, stop_event, ecu_delay):
+    # Answers every request with a fixed RPM frame and the '>' prompt.
+    buf = b""
+    while not stop_event.is_set():
+        try:
+            data = os.read(master_fd, 256)
+        except OSError:
+            return
+        buf += data
+        while b"\r" in buf:
+            _, buf = buf.split(b"\r", 1)
+            if ecu_delay:
+                time.sleep(ecu_delay)
+            os.write(master_fd, b"41 0C 1A F8 \r\r>")
+
+
+def measure(comm_cls, count, ecu_delay, **kwargs):
+    master_fd, slave_fd = os.openpty()
+    port = os.ttyname(slave_fd)
+    rx_queue = queue.Queue()
+    tx_queue = queue.Queue()
+    stop_event = threading.Event()
+    adapter = threading.Thread(target=fake_elm327, args=(master_fd, stop_event, ecu_delay), daemon=True)
+    adapter.start()
+    comm = comm_cls(port, 115200, rx_queue, tx_queue, stop_event, **kwargs)
+    comm.start()
+    time.sleep(0.3)
+
+    samples = []
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            tx_queue.put("010C")
+            while True:
+                kind, payload = rx_queue.get(timeout=5.0)
+                if kind == "__DATA__":
+                    break
+                if kind == "__ERROR__":
+                    raise RuntimeError(payload)
+            samples.append(time.perf_counter() - start)
+    finally:
+        stop_event.set()
+        comm.join(timeout=2.0)
+        os.close(master_fd)
+        os.close(slave_fd)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    rate = len(samples) / sum(samples)
+    print(f"{name:<26} mean {statistics.mean(samples) * 1000:7.2f} ms | "
+          f"p50 {p50:7.2f} ms | p99 {p99:7.2f} ms | {rate:7.1f} req/s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="o3DIAG serial round trip latency benchmark")
+    ap.add_argument("--count", type=int, default=200, help="requests per reader (default 200)")
+    ap.add_argument("--ecu-delay", type=float, default=0.0, help="simulated ECU answer time in seconds")
+    args = ap.parse_args()
+
+    if not hasattr(os, "openpty"):
+        sys.exit("This benchmark needs a pty (Linux).")
+
+    print(f"\no3DIAG serial latency, {args.count} x 010C, ECU delay {args.ecu_delay * 1000:.1f} ms")
+    print("-" * 80)
+    report("sleep-poll 100 ms (3.2.1)", measure(LegacyCommunicator, args.count, args.ecu_delay, poll_sleep=0.1))
+    report("sleep-poll 50 ms (6.0.1)", measure(LegacyCommunicator, args.count, args.ecu_delay, poll_sleep=0.05))
+    report("event-driven", measure(o3DIAGCommunicator, args.count, args.ecu_delay))
+
+
+if __name__ == "__main__":
+    main()
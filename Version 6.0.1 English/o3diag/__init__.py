@@ -0,0 +1,97 @@
+# o3DIAG - headless core
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# Everything o3DIAG needs to talk to an ELM327 and decode the answers,
+# without tkinter. Used by the GUI (o3DIAG_6.0.1_ENG.py), by the CLI
+# (python -m o3diag) and by scripts.
+# -------------------------------------------------
+
+from .obd import (
+    CAN_PROTOCOLS,
+    DTC_GROUPS,
+    DTC_SERVICES,
+    DTC_TABLE,
+    MAX_PIDS_PER_REQUEST,
+    PID_DATA_LENGTHS,
+    PROMPT,
+    SERVICE_DECODERS,
+    build_pid_requests,
+    calc_engine_load,
+    calc_rpm,
+    calc_speed,
+    calc_temp,
+    calc_voltage,
+    clean_response,
+    decode_dtc_bytes,
+    decode_dtcs,
+    decode_pid,
+    decode_pid_bytes,
+    decode_supported_pids,
+    decode_vin,
+    dtc_from_bytes,
+    extract_dtcs_by_ecu,
+    extract_dtcs_from_lines,
+    extract_dtcs_from_response,
+    format_pid_value,
+    hex_payload,
+    o3DIAGMessage,
+    o3DIAGValue,
+    parse_line,
+    parse_pid_response,
+    response_tokens,
+    split_adapter_bytes,
+    split_adapter_output,
+    split_multi_pid_response,
+    split_pid_request,
+    tokenize_line,
+)
+from .isotp import assemble_messages, o3DIAGFrameAssembler
+from .pids import PIDS, PIDS_BY_BYTE, o3DIAGPid
+from .dtc_map import CACHE_DIR, diff_dtc_maps, load_dtc_map, o3DIAGDTCCatalog, parse_o3script
+from .dtc_watch import o3DIAGFileWatcher
+from .export import EXPORT_FOOTER, LOGS_DIR, next_log_path, write_log_export
+from .logstore import (
+    DIRECTION_RX,
+    DIRECTION_TX,
+    LEVELS,
+    detect_level,
+    format_record,
+    o3DIAGLogFormatter,
+    o3DIAGLogRecord,
+    o3DIAGLogStore,
+    raw_bytes,
+)
+from .dtc_layers import (
+    FALLBACK_LANGUAGE,
+    LANGUAGES,
+    LOCAL_DIR,
+    find_o3script_layers,
+    load_dtc_layers,
+    o3DIAGDTCLayers,
+)
+from .dtc_index import build_dtc_index, load_dtc_index, o3DIAGDTCIndex, pack_dtc_tables, write_dtc_index
+from .communicator import (
+    ATST_MIN,
+    ATST_STEP,
+    INIT_ADVANCED_COMMANDS,
+    INIT_BASE_COMMANDS,
+    INIT_TEST_COMMANDS,
+    POLL_RATES,
+    detect_protocol,
+    o3DIAGCommunicator,
+    o3DIAGPoller,
+    o3DIAGSchedule,
+    o3DIAGRequest,
+    o3DIAGResponse,
+    o3DIAGTimeoutCalibrator,
+)
+from .sessions import o3DIAGSession, o3DIAGSessionManager
+from .aio import o3DIAGAsyncClient, o3DIAGSample
+from .simulator import o3DIAGSimulatedECU, o3DIAGSimulator
+
+__version__ = "6.0.1"
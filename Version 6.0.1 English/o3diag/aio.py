@@ -0,0 +1,206 @@
+# o3DIAG - asyncio client
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# Same protocol handling as o3DIAGCommunicator, but without a thread per
+# adapter: one event loop can drive several adapters next to other asyncio
+# services.
+#
+#   async with o3DIAGAsyncClient("/dev/ttyUSB0") as client:
+#       await client.initialize()
+#       print(await client.query("010C"))
+#       print(await client.read_dtcs())
+#       async for sample in client.stream({"0C": 10, "05": 0.5}):
+#           print(sample)
+# -------------------------------------------------
+
+import asyncio
+import time
+from collections import namedtuple
+
+import serial
+
+from .communicator import (
+    INIT_ADVANCED_COMMANDS,
+    INIT_BASE_COMMANDS,
+    INIT_TEST_COMMANDS,
+    o3DIAGResponse,
+    o3DIAGSchedule,
+)
+from .obd import (
+    CAN_PROTOCOLS,
+    MAX_PIDS_PER_REQUEST,
+    PROMPT,
+    build_pid_requests,
+    decode_pid,
+    extract_dtcs_from_lines,
+    split_adapter_bytes,
+    split_multi_pid_response,
+)
+
+o3DIAGSample = namedtuple("o3DIAGSample", "timestamp pid data value unit")
+
+class o3DIAGAsyncClient:
+    DEFAULT_TIMEOUT = 2.0
+    PROMPT_GRACE = 0.5 # wait for a late '>' after a timeout before the next command
+    IO_TIMEOUT = 0.05 # only used where the port can't be watched by the event loop
+    UNSOLICITED_MAX = 1000 # lines kept for nobody reading them, oldest dropped first
+
+    def __init__(self, port: str, baudrate: int = 115200):
+        self.port = port
+        self.baudrate = baudrate
+        self.ser = None
+        self.lock = None
+        self.loop = None
+        self.reader_task = None
+        self.read_buffer = b""
+        self.lines = []
+        self.waiter = None
+        self.unsolicited = None # lines outside of any query, e.g. ATMA
+        self.error = None # ConnectionError once the port failed
+        self.can_protocol = None # None until ATDPN answered
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+        self.lock = asyncio.Lock()
+        self.unsolicited = asyncio.Queue(self.UNSOLICITED_MAX)
+        self.ser = serial.serial_for_url(self.port, self.baudrate, timeout=0)
+        try:
+            # Non-blocking: the event loop calls us when the fd is readable
+            self.loop.add_reader(self.ser.fileno(), self.on_readable)
+        except (AttributeError, NotImplementedError):
+            # No fd (Windows, loop://) or no add_reader (Proactor loop)
+            self.ser.timeout = self.IO_TIMEOUT
+            self.reader_task = self.loop.create_task(self.read_in_executor())
+
+    async def close(self):
+        if self.reader_task:
+            self.reader_task.cancel()
+            self.reader_task = None
+        elif self.ser:
+            self.loop.remove_reader(self.ser.fileno())
+        if self.waiter and not self.waiter.done():
+            self.waiter.set_exception(ConnectionError("Serial closed"))
+        if self.ser and self.ser.is_open:
+            self.ser.close()
+
+    def on_readable(self):
+        try:
+            self.feed(self.ser.read(self.ser.in_waiting or 1))
+        except Exception as e:
+            self.loop.remove_reader(self.ser.fileno())
+            self.fail(e)
+
+    async def read_in_executor(self):
+        try:
+            while self.ser.is_open:
+                raw = await self.loop.run_in_executor(None, lambda: self.ser.read(self.ser.in_waiting or 1))
+                self.feed(raw)
+        except Exception as e:
+            self.fail(e)
+
+    def fail(self, e):
+        # Like o3DIAGCommunicator: the query in flight and every later one
+        # get ConnectionError instead of running into their timeout
+        self.error = ConnectionError(f"Read failed: {e}")
+        if self.waiter and not self.waiter.done():
+            self.waiter.set_exception(self.error)
+
+    def feed(self, raw: bytes):
+        if not raw:
+            return
+        items, self.read_buffer = split_adapter_bytes(self.read_buffer + raw)
+        for item in items:
+            if item is PROMPT:
+                if self.waiter and not self.waiter.done():
+                    self.waiter.set_result(self.lines)
+                self.lines = []
+            elif self.waiter:
+                self.lines.append(item.decode("ascii", "ignore"))
+            else:
+                if self.unsolicited.full():
+                    self.unsolicited.get_nowait()
+                self.unsolicited.put_nowait(item.decode("ascii", "ignore"))
+
+    async def query(self, cmd: str, timeout: float = None) -> o3DIAGResponse:
+        # One command at a time, answered when the '>' prompt arrives
+        timeout = timeout or self.DEFAULT_TIMEOUT
+        async with self.lock:
+            if self.error:
+                raise self.error
+            self.lines = []
+            self.waiter = self.loop.create_future()
+            sent_at = time.perf_counter()
+            try:
+                self.ser.write((cmd + "\r").encode())
+                lines = await asyncio.wait_for(asyncio.shield(self.waiter), timeout)
+            except asyncio.TimeoutError:
+                # Late lines are dropped, the next command waits for the prompt first
+                try:
+                    await asyncio.wait_for(asyncio.shield(self.waiter), self.PROMPT_GRACE)
+                except asyncio.TimeoutError:
+                    pass
+                raise TimeoutError(f"{cmd}: no prompt after {timeout:.1f} s") from None
+            finally:
+                self.waiter = None
+            return o3DIAGResponse(cmd, lines, time.perf_counter() - sent_at)
+
+    async def initialize(self):
+        for cmd in INIT_BASE_COMMANDS + INIT_ADVANCED_COMMANDS + INIT_TEST_COMMANDS:
+            try:
+                await self.query(cmd, 2.0)
+            except TimeoutError:
+                pass
+        response = await self.query("ATDPN", 1.5)
+        protocol = "".join(response.lines).strip().upper()[-1:]
+        self.can_protocol = protocol in CAN_PROTOCOLS if protocol else None
+
+    async def read_dtcs(self):
+        response = await self.query("03", 5.0)
+        return extract_dtcs_from_lines(response.lines, can=self.can_protocol)
+
+    async def read_pids(self, pids):
+        # One snapshot of the given Mode 01 PIDs -> {pid: data bytes}
+        values = {}
+        for cmd in build_pid_requests(pids, batch=self.can_protocol):
+            response = await self.query(cmd)
+            values.update(split_multi_pid_response(response.lines))
+        return values
+
+    async def stream(self, rates, rate: float = 1.0):
+        # rates: {pid: Hz} or a list of PIDs that all use rate. Earliest
+        # deadline first like o3DIAGPoller; yields o3DIAGSample.
+        if not isinstance(rates, dict):
+            rates = {pid: rate for pid in rates}
+        rates = {pid.upper(): float(hz) for pid, hz in rates.items() if hz > 0}
+        schedule = o3DIAGSchedule(rates, MAX_PIDS_PER_REQUEST if self.can_protocol else 1)
+        while schedule:
+            now = time.monotonic()
+            wait = schedule.wait_time(now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            pids = schedule.due(now)
+            try:
+                response = await self.query(build_pid_requests(pids)[0])
+                values = split_multi_pid_response(response.lines)
+            except TimeoutError:
+                values = {}
+            schedule.reschedule(time.monotonic())
+            for pid in pids:
+                if pid in values:
+                    decoded = decode_pid(pid, values[pid])
+                    value, unit = (decoded[1], decoded[2]) if decoded else (None, "")
+                    yield o3DIAGSample(time.time(), pid, values[pid], value, unit)
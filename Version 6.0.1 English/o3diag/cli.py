@@ -0,0 +1,317 @@
+# o3DIAG - headless command line
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# Usage (from the o3DIAG folder):
+#   python -m o3diag read-dtc --port /dev/ttyUSB0
+#   python -m o3diag poll --port /dev/ttyUSB0 --pid 0C=10 --pid 05=0.5 --duration 60
+#   python -m o3diag monitor --port /dev/ttyUSB0 --duration 10
+#   python -m o3diag export --port /dev/ttyUSB0
+#   python -m o3diag bay --port /dev/ttyUSB0 --port /dev/ttyUSB1 --duration 60
+#   python -m o3diag index --output all.o3idx generic.o3script oem_vw.o3script
+#   python -m o3diag simulate --tcp 35000   (then --port socket://127.0.0.1:35000)
+# Status messages go to stderr, data to stdout.
+# -------------------------------------------------
+
+import argparse
+import os
+import queue
+import sys
+import time
+
+from .communicator import POLL_RATES
+from .dtc_index import build_dtc_index, load_dtc_index
+from .dtc_map import o3DIAGDTCCatalog
+from .export import EXPORT_FOOTER, next_log_path
+from .obd import decode_pid, format_pid_value, parse_line
+from .pids import PIDS
+from .sessions import o3DIAGSession, o3DIAGSessionManager
+from .simulator import o3DIAGSimulator
+
+O3SCRIPT_DEFAULT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "o3DIAG_Pcodes_list_english.o3script")
+SNAPSHOT_PIDS = ("0C", "0D", "05", "04", "42") # RPM, speed, coolant, load, voltage: export and bay view
+
+def log(text: str):
+    print(text, file=sys.stderr, flush=True)
+
+def load_descriptions(path: str):
+    # Loads while the adapter initializes, .get() waits for it if needed.
+    # Lookups go to the mapped index, the descriptions stay on disk.
+    def loaded(catalog):
+        if catalog.changes:
+            added, changed, removed = catalog.changes
+            log(f"P-Code list updated: {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+        elif catalog.error:
+            log(f"P-Code list could not be read: {catalog.error}")
+    return o3DIAGDTCCatalog(on_loaded=loaded, loader=load_dtc_index).load(path)
+
+def format_value(pid: str, data) -> str:
+    decoded = decode_pid(pid, data)
+    if not decoded:
+        return " ".join(data)
+    name, value, unit = decoded
+    return f"{format_pid_value(pid, value)} {unit}".rstrip()
+
+def cmd_read_dtc(args):
+    dtc_map = load_descriptions(args.o3script)
+    with o3DIAGSession(args.port, args.baud, log) as session:
+        session.initialize(calibrate=False)
+        dtcs = session.read_dtcs()
+    if not dtcs:
+        print("P0000 – " + dtc_map.get("P0000", "No Fault Detected"))
+    for code in dtcs:
+        print(f"{code} – {dtc_map.get(code, '(no description found)')}")
+    return 0
+
+def parse_rates(items):
+    if not items:
+        return dict(POLL_RATES)
+    rates = {}
+    for item in items:
+        pid, _, hz = item.partition("=")
+        pid = pid.strip().upper()
+        if len(pid) == 4 and pid.startswith("01"):
+            pid = pid[2:]
+        rates[pid] = float(hz or 1.0)
+    return rates
+
+def cmd_poll(args):
+    rates = parse_rates(args.pid)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    samples = queue.Queue()
+    try:
+        with o3DIAGSession(args.port, args.baud, log) as session:
+            session.initialize()
+            session.start_polling(rates, lambda session, pid, d, ts: samples.put((time.time(), pid, d)))
+            poller = session.poller
+            print("timestamp,pid,name,value,unit", file=out)
+            end = time.monotonic() + args.duration if args.duration else None
+            try:
+                while poller.is_alive() and (end is None or time.monotonic() < end):
+                    try:
+                        ts, pid, d = samples.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    decoded = decode_pid(pid, d)
+                    name, value, unit = decoded if decoded else ("", " ".join(d), "")
+                    print(f"{ts:.3f},{pid},{name},{value},{unit}", file=out)
+            except KeyboardInterrupt:
+                pass
+            poller.stop()
+            poller.join(timeout=2.0)
+        for pid, (target, achieved, misses) in poller.achieved_rates().items():
+            log(f"01{pid}: {achieved:.2f} Hz of {target:g} Hz ({misses} missed)")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+def cmd_monitor(args):
+    out = sys.stdout.buffer
+    frames = [0]
+
+    def on_frame(line: bytes, stamp: float):
+        # Reader thread. Raw lines are written as they came, strings are
+        # only built for --decode.
+        frames[0] += 1
+        if args.decode:
+            for value in parse_line(line).values:
+                text = f"{stamp:.3f} {value.pid} {value.name} {format_pid_value(value.pid, value.value)} {value.unit}"
+                out.write(text.rstrip().encode() + b"\n")
+        else:
+            out.write(b"%.3f %s\n" % (stamp, line))
+
+    with o3DIAGSession(args.port, args.baud, log) as session:
+        session.initialize(calibrate=False)
+        session.comm.frame_listeners.append(on_frame)
+        # Plain tx_queue command: every line is handed out as soon as it arrives
+        session.tx_queue.put(args.command)
+        started = time.monotonic()
+        end = started + args.duration if args.duration else None
+        try:
+            while end is None or time.monotonic() < end:
+                try:
+                    kind, payload = session.rx_queue.get(timeout=0.1)
+                except queue.Empty:
+                    out.flush()
+                    continue
+                if kind in ("__ERROR__", "__CLOSED__"):
+                    log(payload)
+                    break
+        except KeyboardInterrupt:
+            pass
+        session.comm.interrupt()
+        session.comm.frame_listeners.remove(on_frame)
+        out.flush()
+        log(f"[ INFO ] {frames[0]} frames, {frames[0] / max(time.monotonic() - started, 1e-6):.0f} frames/s")
+    return 0
+
+def cmd_export(args):
+    dtc_map = load_descriptions(args.o3script)
+    with o3DIAGSession(args.port, args.baud, log) as session:
+        session.initialize(calibrate=False)
+        dtcs = session.read_dtcs() or ["P0000"]
+        values = session.snapshot(list(SNAPSHOT_PIDS))
+    path = args.output or next_log_path()
+    ts = time.strftime("%Y/%m/%d %H:%M:%S")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"[{ts}] o3DIAG {args.port} @ {args.baud}\n")
+        f.write(f"[{ts}] Error codes:\n")
+        for code in dtcs:
+            f.write(f"[{ts}]   {code} – {dtc_map.get(code, '(no description found)')}\n")
+        for pid in SNAPSHOT_PIDS:
+            if pid in values:
+                f.write(f"[{ts}] {PIDS[pid].name}: {format_value(pid, values[pid])}\n")
+        f.write(f"\n{EXPORT_FOOTER}\n")
+    log(f"[EXPORT PATH] {path}")
+    print(path)
+    return 0
+
+def cmd_bay(args):
+    dtc_map = load_descriptions(args.o3script).watch() # runs for hours, take list edits
+    rates = parse_rates(args.pid)
+    with o3DIAGSessionManager(log) as manager:
+        for port in args.port:
+            manager.add(port, args.baud)
+        manager.start_all()
+        manager.read_dtcs_all()
+        manager.start_polling_all(rates)
+        end = time.monotonic() + args.duration if args.duration else None
+        try:
+            while True:
+                print_bay(manager, dtc_map)
+                if end is not None and time.monotonic() >= end:
+                    break
+                time.sleep(args.interval if end is None else max(0.0, min(args.interval, end - time.monotonic())))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+def print_bay(manager, dtc_map):
+    print(f"\n[{time.strftime('%H:%M:%S')}] o3DIAG bay")
+    print("-" * 80)
+    for row in manager.view():
+        print(f"{row['port']:<16} {row['vin'] or '(no VIN)':<17} {row['status']:<8} "
+              f"{row['rate']:6.1f} resp/s {row['timeouts']} timeouts")
+        if row["error"]:
+            print(f"    [ERROR] {row['error']}")
+        for code in row["dtcs"]:
+            print(f"    {code} – {dtc_map.get(code, '(no description found)')}")
+        values = [f"{PIDS[pid].name} {format_value(pid, data)}" for pid, (_, data) in row["values"].items()
+                  if pid in PIDS]
+        if values:
+            print("    " + " | ".join(values))
+    totals = manager.totals()
+    print("-" * 80)
+    print(f"{totals['ready']}/{totals['sessions']} adapters ready, {totals['rate']:.1f} resp/s total, "
+          f"{totals['responses']} responses, {totals['timeouts']} timeouts", flush=True)
+
+def parse_errors(items):
+    # ["NO DATA=0.05", "CAN ERROR=0.01"] -> {"NO DATA": 0.05, "CAN ERROR": 0.01}
+    errors = {}
+    for item in items or []:
+        text, _, probability = item.rpartition("=")
+        try:
+            errors[text.strip().upper()] = float(probability)
+        except ValueError:
+            raise SystemExit(f"invalid --error {item!r}, expected TEXT=PROBABILITY") from None
+    return errors
+
+def cmd_index(args):
+    count = build_dtc_index(args.source, args.output)
+    log(f"{count} codes from {len(args.source)} list(s) -> {args.output}")
+    return 0
+
+def cmd_simulate(args):
+    sim = o3DIAGSimulator(latency=args.latency / 1000.0, search_delay=args.search_delay,
+                          protocol=args.protocol, errors=parse_errors(args.error),
+                          monitor_rate=args.monitor_rate, seed=args.seed)
+    if args.tcp is not None:
+        port = sim.start_tcp(args.host, args.tcp)
+    else:
+        try:
+            port = sim.start_pty()
+        except (AttributeError, OSError) as e:
+            log(f"[ERROR] No pseudo terminal ({e}), use --tcp")
+            return 1
+    log(f"[SIMULATOR] Listening on {port} – Ctrl+C to stop")
+    print(port, flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+        log(f"[SIMULATOR] {sim.requests} OBD requests served")
+    return 0
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog="o3diag", description="o3DIAG for OBD-II / ELM327 without GUI")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    def add(name, func, help_text):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--port", required=True, help="serial port, e.g. /dev/ttyUSB0 or COM3")
+        p.add_argument("--baud", type=int, default=115200, help="baud rate (default 115200)")
+        p.set_defaults(func=func)
+        return p
+
+    p = add("read-dtc", cmd_read_dtc, "read stored trouble codes (Mode 03)")
+    p.add_argument("--o3script", default=O3SCRIPT_DEFAULT, help="P-code list (.o3script or .o3idx)")
+
+    p = add("poll", cmd_poll, "poll live data as CSV")
+    p.add_argument("--pid", action="append", metavar="PID=HZ",
+                   help="Mode 01 PID and rate, e.g. 0C=10 (repeatable, default: RPM/speed/load/voltage/coolant)")
+    p.add_argument("--duration", type=float, default=0, help="seconds to poll (default: until Ctrl+C)")
+    p.add_argument("--output", help="CSV file (default: stdout)")
+
+    p = add("monitor", cmd_monitor, "print raw adapter output, e.g. CAN monitor mode")
+    p.add_argument("--command", default="ATMA", help="command to start monitoring (default ATMA)")
+    p.add_argument("--decode", action="store_true", help="print decoded Mode 01 values instead of raw frames")
+    p.add_argument("--duration", type=float, default=0, help="seconds to monitor (default: until Ctrl+C)")
+
+    p = sub.add_parser("bay", help="several adapters at once: VIN, DTCs and live data per vehicle")
+    p.add_argument("--port", action="append", required=True, help="serial port (repeat for every adapter)")
+    p.add_argument("--baud", type=int, default=115200, help="baud rate (default 115200)")
+    p.add_argument("--o3script", default=O3SCRIPT_DEFAULT, help="P-code list (.o3script or .o3idx)")
+    p.add_argument("--pid", action="append", metavar="PID=HZ", help="Mode 01 PID and rate, like poll")
+    p.add_argument("--interval", type=float, default=5.0, help="seconds between views (default 5)")
+    p.add_argument("--duration", type=float, default=0, help="seconds to run (default: until Ctrl+C)")
+    p.set_defaults(func=cmd_bay)
+
+    p = add("export", cmd_export, "write trouble codes and a live data snapshot to a log file")
+    p.add_argument("--o3script", default=O3SCRIPT_DEFAULT, help="P-code list (.o3script or .o3idx)")
+    p.add_argument("--output", help="log file (default: ~/.o3DIAG/logs/o3DIAG_OUTPUT_LOG*.TXT)")
+
+    p = sub.add_parser("index", help="compile P-code lists into one .o3idx file for --o3script")
+    p.add_argument("source", nargs="+", help=".o3script or .o3idx files, later ones override earlier codes")
+    p.add_argument("--output", required=True, help="index file to write (.o3idx)")
+    p.set_defaults(func=cmd_index)
+
+    p = sub.add_parser("simulate", help="simulated ELM327 and vehicle for testing without a car")
+    p.add_argument("--tcp", type=int, metavar="PORT", help="listen on TCP like a WiFi adapter (default: pty)")
+    p.add_argument("--host", default="127.0.0.1", help="address for --tcp (default 127.0.0.1)")
+    p.add_argument("--latency", type=float, default=5.0, help="ms per ECU answer (default 5)")
+    p.add_argument("--search-delay", type=float, default=1.0, help="seconds of SEARCHING... (default 1)")
+    p.add_argument("--monitor-rate", type=float, default=1000.0, help="ATMA frames per second (default 1000)")
+    p.add_argument("--protocol", default="6", help="ATDPN protocol number (default 6, CAN 11/500)")
+    p.add_argument("--error", action="append", metavar="TEXT=P",
+                   help="inject an error with probability P, e.g. \"NO DATA=0.05\" or \"NO PROMPT=0.01\"")
+    p.add_argument("--seed", type=int, help="random seed for reproducible errors")
+    p.set_defaults(func=cmd_simulate)
+    return ap
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (ConnectionError, TimeoutError, OSError) as e:
+        # Adapter gone, silent (no ATDPN answer) or port not there
+        log(f"[PANIC] {e}")
+        return 1
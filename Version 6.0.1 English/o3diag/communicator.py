@@ -0,0 +1,458 @@
+# o3DIAG - ELM327 serial communication
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# o3DIAGCommunicator owns one ELM327 on its own thread: commands go out
+# one at a time from tx_queue, the lines up to the '>' prompt resolve the
+# request's Future, other lines go to frame_listeners (monitor) or
+# rx_queue. Also here: the init command sets, detect_protocol(),
+# o3DIAGTimeoutCalibrator (ATST from measured ECU latency) and
+# o3DIAGPoller / o3DIAGSchedule (live data at per-PID rates).
+# -------------------------------------------------
+
+import heapq
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+import serial
+
+from .obd import (
+    MAX_PIDS_PER_REQUEST,
+    PROMPT,
+    build_pid_requests,
+    decode_supported_pids,
+    response_tokens,
+    split_adapter_bytes,
+    split_multi_pid_response,
+    split_pid_request,
+)
+
+# Adapter initialization used by the GUI and the CLI
+INIT_BASE_COMMANDS = [
+    "ATZ",          # Reset
+    "ATE0",         # Echo OFF
+    "ATL0",         # Linefeeds OFF  
+    "ATH0",         # Headers OFF
+]
+
+INIT_ADVANCED_COMMANDS = [
+    "ATSP0",        # Auto-Protokoll
+    "ATAT1",        # Adaptive Timing
+    "ATSTFF",       # Max Timeout
+    "ATAL",         # Long Messages
+]
+
+INIT_TEST_COMMANDS = [
+    "ATI",          # Adapter Info
+    "0100"          # PID Support test
+]
+
+o3DIAGResponse = namedtuple("o3DIAGResponse", "cmd lines elapsed")
+
+class o3DIAGRequest:
+    # One command on the wire. Lines received until the next '>' prompt belong to it.
+    def __init__(self, cmd, timeout, future=None):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.future = future
+        self.lines = []
+        self.sent_at = 0.0
+        self.wire = cmd # what was actually written, may carry a response count
+        self.retry = False
+
+class o3DIAGCommunicator(threading.Thread):
+    # Reads block on the serial port (select() on Linux, overlapped I/O on Windows)
+    # and wake as soon as bytes arrive. IO_TIMEOUT only bounds how long it takes
+    # to notice stop_event, it is never added to a round trip.
+    IO_TIMEOUT = 0.05
+    DEFAULT_TIMEOUT = 2.0
+    PROMPT_GRACE = 0.5 # wait for a late '>' after a timeout before the next command
+
+    def __init__(self, port, baudrate, rx_queue, tx_queue, stop_event):
+        super().__init__(daemon=True)
+        self.port = port
+        self.baudrate = baudrate
+        self.rx_queue = rx_queue
+        self.tx_queue = tx_queue
+        self.stop_event = stop_event
+        self.ser = None
+        self.writer = None
+        self.lock = threading.Lock()
+        self.prompt_event = threading.Event()
+        self.pending = None
+        self.closed = False
+        self.response_listeners = [] # called with every o3DIAGResponse (reader thread)
+        self.frame_listeners = [] # called with (bytes, time) for lines outside a request, e.g. ATMA
+        self.count_suffix = True # False once the firmware rejected "010C1"
+        self.single_ecu = set() # PID requests answered by exactly one ECU
+        self.responses = 0 # throughput counters, see o3DIAGSessionManager
+        self.timeouts = 0
+
+    def open(self):
+        try:
+            # Device path or pyserial URL, e.g. socket://host:35000 for WiFi adapters
+            self.ser = serial.serial_for_url(self.port, self.baudrate, timeout=self.IO_TIMEOUT)
+            time.sleep(0.2)
+            return True, ""
+        except Exception as e:
+            return False, str(e)
+
+    def close(self):
+        try:
+            if self.ser and self.ser.is_open:
+                self.ser.close()
+        except:
+            pass
+
+    def request(self, cmd: str, timeout: float = None, callback=None) -> Future:
+        # Queue cmd and return a Future that resolves to an o3DIAGResponse once the
+        # adapter prompt ('>') arrives, or fails with TimeoutError after timeout.
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        self.tx_queue.put(o3DIAGRequest(cmd, timeout or self.DEFAULT_TIMEOUT, future))
+        if self.closed:
+            self.fail_queued()
+        return future
+
+    def interrupt(self):
+        # Any byte stops a running ATMA / long request. On an idle adapter a
+        # bare CR repeats the last command, so only use this while it is busy.
+        try:
+            if self.ser and self.ser.is_open:
+                self.ser.write(b"\r")
+        except Exception as e:
+            self.rx_queue.put(("__ERROR__", f"Write failed: {e}"))
+
+    def fail_queued(self):
+        while True:
+            try:
+                item = self.tx_queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, o3DIAGRequest) and item.future and item.future.set_running_or_notify_cancel():
+                item.future.set_exception(ConnectionError("Serial closed"))
+
+    def on_line(self, line: bytes):
+        with self.lock:
+            req = self.pending
+            if req and req.future:
+                req.lines.append(line.decode("ascii", "ignore"))
+                return
+        if self.frame_listeners:
+            # Monitor fast path: raw bytes, no str is built unless a listener wants one
+            stamp = time.time()
+            for listener in self.frame_listeners:
+                listener(line, stamp)
+            return
+        self.rx_queue.put(("__DATA__", line.decode("ascii", "ignore")))
+
+    def wire_command(self, cmd: str) -> str:
+        # "010C" -> "010C1" once we know a single ECU answers it: the adapter
+        # then returns on the first answer instead of waiting out ATST.
+        if self.count_suffix and cmd in self.single_ecu:
+            return cmd + "1"
+        return cmd
+
+    def learn_response_count(self, req):
+        pids = split_pid_request(req.cmd)
+        if len(pids) != 1 or int(pids[0], 16) % 0x20 == 0:
+            return # multi-PID, or a support bitmap where every ECU's answer counts
+        if req.wire != req.cmd:
+            if any("?" in line for line in req.lines):
+                self.count_suffix = False
+                req.retry = True
+            elif any("NO DATA" in line.upper() for line in req.lines):
+                self.single_ecu.discard(req.cmd)
+            return
+        answer = "41" + pids[0]
+        answers = sum(1 for line in req.lines if line.replace(" ", "").upper().startswith(answer))
+        if answers == 1:
+            self.single_ecu.add(req.cmd)
+        elif answers > 1:
+            self.single_ecu.discard(req.cmd)
+
+    def on_prompt(self):
+        with self.lock:
+            req, self.pending = self.pending, None
+        if req and req.future:
+            self.learn_response_count(req)
+        self.prompt_event.set()
+        if req and req.future and not req.retry:
+            self.responses += 1
+            response = o3DIAGResponse(req.cmd, req.lines, time.perf_counter() - req.sent_at)
+            for listener in self.response_listeners:
+                listener(response)
+            req.future.set_result(response)
+
+    def write_loop(self):
+        # Blocks on tx_queue, so a queued command goes out immediately. The next
+        # command is only written once the adapter has answered the previous one.
+        while not self.stop_event.is_set():
+            try:
+                item = self.tx_queue.get(timeout=self.IO_TIMEOUT)
+            except queue.Empty:
+                continue
+            req = item if isinstance(item, o3DIAGRequest) else o3DIAGRequest(item, self.DEFAULT_TIMEOUT)
+            if not req.cmd or (req.future and not req.future.set_running_or_notify_cancel()):
+                continue
+            while self.send_request(req):
+                pass # count suffix rejected, same command again without it
+
+    def send_request(self, req) -> bool:
+        # Write req and wait for its prompt. Returns True if it has to be resent.
+        req.wire = self.wire_command(req.cmd)
+        req.lines = []
+        req.retry = False
+        self.prompt_event.clear()
+        with self.lock:
+            self.pending = req
+        try:
+            req.sent_at = time.perf_counter()
+            self.ser.write((req.wire + "\r").encode())
+        except Exception as e:
+            with self.lock:
+                self.pending = None
+            if req.future:
+                req.future.set_exception(e)
+            self.rx_queue.put(("__ERROR__", f"Write failed: {e}"))
+            return False
+        if self.prompt_event.wait(req.timeout):
+            return req.retry
+        with self.lock:
+            timed_out = self.pending is req
+            if timed_out:
+                # Late lines are still shown, but no longer belong to req
+                self.pending = o3DIAGRequest(req.cmd, req.timeout)
+        if timed_out:
+            self.timeouts += 1
+            if req.future:
+                req.future.set_exception(TimeoutError(f"{req.cmd}: no prompt after {req.timeout:.1f} s"))
+            self.prompt_event.wait(self.PROMPT_GRACE)
+            with self.lock:
+                self.pending = None
+        return False
+
+    def run(self):
+        ok, err = self.open()
+        if not ok:
+            self.closed = True
+            self.fail_queued()
+            self.rx_queue.put(("__ERROR__", err))
+            return
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+        read_buffer = b""
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    raw = self.ser.read(self.ser.in_waiting or 1)
+                except Exception as e:
+                    self.rx_queue.put(("__ERROR__", f"Read failed: {e}"))
+                    self.stop_event.wait(self.IO_TIMEOUT)
+                    continue
+                if not raw:
+                    continue
+                items, read_buffer = split_adapter_bytes(read_buffer + raw)
+                for item in items:
+                    if item is PROMPT:
+                        self.on_prompt()
+                    else:
+                        self.on_line(item)
+        finally:
+            self.stop_event.set()
+            self.prompt_event.set()
+            self.writer.join(timeout=1.0)
+            self.close()
+            self.closed = True
+            with self.lock:
+                req, self.pending = self.pending, None
+            if req and req.future and not req.future.done():
+                req.future.set_exception(ConnectionError("Serial closed"))
+            self.fail_queued()
+            self.rx_queue.put(("__CLOSED__", "Serial closed"))
+            
+def detect_protocol(communicator) -> str:
+    # ATDPN -> "A6" / "6": protocols 6-C are CAN (ISO 15765-4 / SAE J1939)
+    response = communicator.request("ATDPN", 1.5).result()
+    return "".join(response.lines).strip().upper()[-1:]
+
+ATST_STEP = 0.004096 # seconds per ATST unit
+ATST_MIN = 0x08 # ~33 ms, below this slow ECUs are cut off even on a good day
+
+class o3DIAGTimeoutCalibrator:
+    # Replaces the fixed ATSTFF (~1 s) with the smallest timeout the vehicle
+    # needs: measures how fast the ECUs answer the supported PIDs, sets ATST to
+    # that plus a margin, then doubles it whenever a supported PID returns
+    # NO DATA during the session.
+    MARGIN = 1.5
+    SAFETY = 0.020 # seconds on top of the scaled latency
+    SAMPLES = 2
+    MAX_PIDS = 8
+
+    def __init__(self, communicator, log=print):
+        self.communicator = communicator
+        self.log = log
+        self.supported = set()
+        self.value = 0xFF
+        self.enabled = False
+
+    @staticmethod
+    def atst_for(latency: float) -> int:
+        steps = int((latency * o3DIAGTimeoutCalibrator.MARGIN + o3DIAGTimeoutCalibrator.SAFETY) / ATST_STEP) + 1
+        return max(ATST_MIN, min(0xFF, steps))
+
+    def measure(self, pid: str):
+        # The trailing "1" makes the adapter return after the first answer
+        # instead of waiting out the current ATST, so elapsed is the ECU latency.
+        # Without it (firmware answers "?") elapsed would include the old
+        # ATST and calibrate to that, so there is no sample: None.
+        # ConnectionError (adapter gone) is left to calibrate().
+        if not self.communicator.count_suffix:
+            return None
+        try:
+            response = self.communicator.request(f"01{pid}1", 2.0).result()
+        except TimeoutError:
+            return None
+        if any("?" in line for line in response.lines):
+            self.communicator.count_suffix = False # suffix not supported by this firmware
+            return None
+        if "41" in response_tokens(response.lines):
+            return response.elapsed
+        return None
+
+    def calibrate(self):
+        try:
+            response = self.communicator.request("0100", 5.0).result()
+        except Exception as e:
+            self.log(f"[ INFO ] ATST calibration skipped: {e}")
+            return None
+        self.supported = set(decode_supported_pids(response.lines))
+        pids = sorted(self.supported - {"01", "20"})[:self.MAX_PIDS]
+        latencies = []
+        try:
+            for pid in pids:
+                for _ in range(self.SAMPLES):
+                    latency = self.measure(pid)
+                    if latency is not None:
+                        latencies.append(latency)
+        except ConnectionError as e:
+            self.log(f"[ WARN ] ATST calibration stopped, keeping ATSTFF: {e}")
+            return None
+        if not latencies:
+            reason = "no PID answered" if self.communicator.count_suffix else "no response count support"
+            self.log(f"[ INFO ] ATST calibration: {reason}, keeping ATSTFF")
+            return None
+        self.set_timeout(self.atst_for(max(latencies)))
+        self.enabled = True
+        self.log(f"[ OK ] ATST{self.value:02X} ({self.value * ATST_STEP * 1000:.0f} ms), "
+                 f"slowest answer {max(latencies) * 1000:.0f} ms over {len(latencies)} requests")
+        return self.value
+
+    def set_timeout(self, value: int):
+        self.value = value
+        self.communicator.request(f"ATST{value:02X}", 1.0)
+
+    def observe(self, response):
+        # response listener: back off when a PID the ECU supports times out
+        if not self.enabled or self.value >= 0xFF:
+            return
+        pids = split_pid_request(response.cmd)
+        if not pids or not any(pid in self.supported for pid in pids):
+            return
+        if any("NO DATA" in line.upper() for line in response.lines):
+            self.set_timeout(min(0xFF, self.value * 2))
+            self.log(f"[ WARN ] NO DATA from supported PID ({response.cmd}), ATST raised to {self.value:02X}")
+
+# Default live data rates (Hz) for the polling scheduler
+POLL_RATES = {"0C": 10.0, "0D": 5.0, "04": 2.0, "42": 1.0, "05": 0.5}
+
+class o3DIAGSchedule:
+    # Earliest deadline first over {pid: Hz}, shared by o3DIAGPoller and the
+    # asyncio client. due() takes up to limit PIDs whose deadline has passed
+    # (higher rate wins ties), reschedule() puts them back one period on.
+    def __init__(self, rates, limit: int = 1, start: float = None):
+        start = time.monotonic() if start is None else start
+        self.heap = [(start, -hz, pid) for pid, hz in rates.items()]
+        heapq.heapify(self.heap)
+        self.limit = limit
+        self.taken = []
+
+    def __bool__(self):
+        return bool(self.heap or self.taken)
+
+    def wait_time(self, now: float) -> float:
+        # Seconds until the next PID is due, <= 0 if one is
+        return self.heap[0][0] - now
+
+    def due(self, now: float):
+        while self.heap and self.heap[0][0] <= now and len(self.taken) < self.limit:
+            self.taken.append(heapq.heappop(self.heap))
+        return [pid for _, _, pid in self.taken]
+
+    def reschedule(self, stamp: float):
+        # Next deadline one period on; if we fell behind, don't burst to catch up
+        for deadline, neg_hz, pid in self.taken:
+            heapq.heappush(self.heap, (max(deadline - 1.0 / neg_hz, stamp), neg_hz, pid))
+        self.taken = []
+
+class o3DIAGPoller(threading.Thread):
+    # Polls Mode 01 PIDs through an o3DIAGCommunicator, each at its own rate.
+    # The PID with the earliest deadline goes first (higher rate wins ties); on
+    # CAN all PIDs that are due are packed into one multi-PID request.
+    def __init__(self, communicator, rates, on_sample, batch: bool = False):
+        super().__init__(daemon=True)
+        self.communicator = communicator
+        self.rates = {pid.upper(): float(hz) for pid, hz in rates.items() if hz > 0}
+        self.on_sample = on_sample
+        self.batch = batch
+        self.stop_event = threading.Event()
+        self.counts = {pid: 0 for pid in self.rates}
+        self.misses = {pid: 0 for pid in self.rates}
+        self.started_at = None
+        self.stopped_at = None
+
+    def stop(self):
+        self.stop_event.set()
+
+    def achieved_rates(self):
+        # pid -> (target Hz, achieved Hz, missed requests)
+        elapsed = ((self.stopped_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        return {pid: (hz, self.counts[pid] / elapsed if elapsed > 0 else 0.0, self.misses[pid])
+                for pid, hz in self.rates.items()}
+
+    def run(self):
+        self.started_at = time.monotonic()
+        schedule = o3DIAGSchedule(self.rates, MAX_PIDS_PER_REQUEST if self.batch else 1, self.started_at)
+        try:
+            while schedule and not self.stop_event.is_set():
+                now = time.monotonic()
+                wait = schedule.wait_time(now)
+                if wait > 0:
+                    self.stop_event.wait(wait)
+                    continue
+                pids = schedule.due(now)
+                try:
+                    response = self.communicator.request(build_pid_requests(pids)[0]).result()
+                    values = split_multi_pid_response(response.lines)
+                except ConnectionError:
+                    return
+                except Exception:
+                    values = {}
+                stamp = time.monotonic()
+                for pid in pids:
+                    if pid in values:
+                        self.counts[pid] += 1
+                        self.on_sample(pid, values[pid], stamp)
+                    else:
+                        self.misses[pid] += 1
+                schedule.reschedule(stamp)
+        finally:
+            self.stopped_at = time.monotonic()
@@ -0,0 +1,263 @@
+# o3DIAG - memory-mapped DTC index
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# .o3idx file, for catalogues too large to keep as a dict (P/C/B/U plus
+# OEM lists) on small loggers. Nothing is loaded, lookups binary-search the
+# mapped file and several o3DIAG processes share its pages:
+#   header   magic "O3IX", format, key width, count,
+#            source size / mtime_ns / sha256 (0 for merged indexes)
+#   keys     count * key width bytes, ASCII, sorted ("P0300P0301...")
+#   offsets  (count + 1) * uint32, description i = heap[off[i]:off[i+1]]
+#   heap     UTF-8 descriptions
+# Format 2 (dtc_layers) holds several languages over the one key table:
+#   languages  uint16 count, 16 bytes ASCII name each, fallback first
+#   keys       as above
+#   tables     per language count * (start, end) uint32 into the heap,
+#              start == end: no description in that language
+#   heap       every distinct description once
+# -------------------------------------------------
+
+import mmap
+import os
+import struct
+
+from .dtc_map import CACHE_DIR, cache_path, file_sha256, load_dtc_map, parse_o3script
+
+INDEX_EXT = ".o3idx"
+INDEX_MAGIC = b"O3IX"
+INDEX_FORMAT = 1
+LAYERED_FORMAT = 2
+KEY_WIDTH = 5 # "P0300"
+_HEADER = struct.Struct("<4sHHIQQ32s")
+_LANGUAGE = struct.Struct("<16s")
+
+def _index_keys(items):
+    entries = {}
+    for code, desc in items:
+        key = code.upper().encode("ascii")
+        if len(key) != KEY_WIDTH:
+            raise ValueError(f"DTC code must be {KEY_WIDTH} characters: {code!r}")
+        entries[key] = desc.encode("utf-8")
+    return entries
+
+def pack_dtc_index(items, source=(0, 0, b"")) -> bytes:
+    # items: (code, description) pairs, any order, later duplicates win.
+    # source: (size, mtime_ns, sha256 digest) of the .o3script it came from.
+    entries = _index_keys(items)
+    keys = sorted(entries)
+    offsets = [0]
+    for key in keys:
+        offsets.append(offsets[-1] + len(entries[key]))
+    header = _HEADER.pack(INDEX_MAGIC, INDEX_FORMAT, KEY_WIDTH, len(keys), source[0], source[1], source[2])
+    return b"".join([header, b"".join(keys), struct.pack(f"<{len(offsets)}I", *offsets)] +
+                    [entries[key] for key in keys])
+
+def pack_dtc_tables(tables, source=(0, 0, b"")) -> bytes:
+    # Format 2. tables: {language: (code, description) pairs}, the first
+    # language is the fallback of o3DIAGDTCIndex.set_language().
+    tables = {language: _index_keys(items) for language, items in tables.items()}
+    keys = sorted(set().union(*tables.values()))
+    heap = bytearray()
+    placed = {} # description -> start in heap
+    packed = []
+    for entries in tables.values():
+        bounds = []
+        for key in keys:
+            desc = entries.get(key)
+            if not desc:
+                bounds += (0, 0)
+                continue
+            start = placed.get(desc)
+            if start is None:
+                start = placed[desc] = len(heap)
+                heap += desc
+            bounds += (start, start + len(desc))
+        packed.append(struct.pack(f"<{len(bounds)}I", *bounds))
+    header = _HEADER.pack(INDEX_MAGIC, LAYERED_FORMAT, KEY_WIDTH, len(keys), source[0], source[1], source[2])
+    names = struct.pack("<H", len(tables)) + b"".join(_LANGUAGE.pack(language.encode("ascii"))
+                                                     for language in tables)
+    return b"".join([header, names, b"".join(keys)] + packed + [bytes(heap)])
+
+def write_index_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Renamed into place, processes that still map the old file keep reading it
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def write_dtc_index(path: str, items, source=(0, 0, b"")):
+    write_index_file(path, pack_dtc_index(items, source))
+
+class o3DIAGDTCIndex:
+    # Read-only view of an .o3idx file with the dict methods lookups use
+    # (get, in, len, items). Raises ValueError for a file of another format.
+    # data: the packed bytes instead of a file (no writable cache).
+    def __init__(self, path: str = None, data: bytes = None):
+        self.path = path
+        if data is None:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < _HEADER.size:
+                    raise ValueError(f"not an o3DIAG index: {path}")
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mm = data
+        size = len(data)
+        if size < _HEADER.size:
+            raise ValueError(f"not an o3DIAG index: {path}")
+        magic, version, width, count, src_size, src_mtime, src_sha = _HEADER.unpack_from(self.mm, 0)
+        if magic != INDEX_MAGIC or version not in (INDEX_FORMAT, LAYERED_FORMAT) or width != KEY_WIDTH:
+            self.close()
+            raise ValueError(f"not an o3DIAG index (format {INDEX_FORMAT}/{LAYERED_FORMAT}): {path}")
+        self.count = count
+        self.source = (src_size, src_mtime, src_sha)
+        self.layered = version == LAYERED_FORMAT
+        self.names = [None]
+        self.keys_at = _HEADER.size
+        if self.layered and size >= _HEADER.size + 2:
+            (languages,) = struct.unpack_from("<H", self.mm, _HEADER.size)
+            names_at = _HEADER.size + 2
+            self.keys_at = names_at + languages * _LANGUAGE.size
+            self.names = [_LANGUAGE.unpack_from(self.mm, names_at + n * _LANGUAGE.size)[0].rstrip(b"\0")
+                          .decode("ascii") for n in range(languages)] if self.keys_at <= size else []
+        self.stride = 8 if self.layered else 4 # (start, end) pairs / running offsets
+        tables_at = self.keys_at + count * KEY_WIDTH
+        table_size = count * 8 if self.layered else (count + 1) * 4
+        self.tables = {name: tables_at + n * table_size for n, name in enumerate(self.names)}
+        self.heap_at = tables_at + len(self.names) * table_size
+        if not self.layered and self.heap_at <= size:
+            # The last running offset is where the heap ends
+            (heap_size,) = struct.unpack_from("<I", self.mm, self.heap_at - 4)
+            size -= heap_size
+        if not self.names or self.heap_at > size:
+            self.close()
+            raise ValueError(f"o3DIAG index is truncated: {path}")
+        self.sizes = {} # language -> entries, counted on first len()
+        self.language = None
+        self.table_at = None
+        self.set_language(self.names[0])
+
+    def languages(self):
+        return sorted(name for name in self.names if name)
+
+    def set_language(self, language: str):
+        # Unknown languages use the first (fallback) table
+        if language not in self.tables:
+            language = self.names[0]
+        self.language = language
+        self.table_at = self.tables[language]
+
+    def key(self, i: int) -> bytes:
+        at = self.keys_at + i * KEY_WIDTH
+        return self.mm[at:at + KEY_WIDTH]
+
+    def value(self, i: int):
+        # Description of entry i, None if it has none in the active language
+        start, end = struct.unpack_from("<II", self.mm, self.table_at + i * self.stride)
+        if start == end and self.layered:
+            return None
+        return self.mm[self.heap_at + start:self.heap_at + end].decode("utf-8", "replace")
+
+    def find(self, code: str) -> int:
+        # Position of code, -1 if missing: log2(count) probes of 5 bytes
+        try:
+            key = code.upper().encode("ascii")
+        except UnicodeEncodeError:
+            return -1
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.key(lo) == key:
+            return lo
+        return -1
+
+    def get(self, code: str, default=None):
+        i = self.find(code)
+        desc = self.value(i) if i >= 0 else None
+        return default if desc is None else desc
+
+    def __getitem__(self, code: str) -> str:
+        desc = self.get(code)
+        if desc is None:
+            raise KeyError(code)
+        return desc
+
+    def __contains__(self, code) -> bool:
+        return self.get(code) is not None
+
+    def __len__(self):
+        if not self.layered:
+            return self.count
+        language = self.language
+        if language not in self.sizes:
+            self.sizes[language] = sum(1 for _ in self.items())
+        return self.sizes[language]
+
+    def items(self):
+        for i in range(self.count):
+            desc = self.value(i)
+            if desc is not None:
+                yield self.key(i).decode("ascii"), desc
+
+    def close(self):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+
+def load_dtc_index(path: str, cache_dir: str = CACHE_DIR):
+    # .o3idx files are opened as they are. For an .o3script the index in
+    # cache_dir is used while the list is unchanged (size and mtime, or the
+    # same SHA-256), otherwise the list is parsed again; the index is its
+    # only cache, no marshal copy is written next to it. cache_dir=None or
+    # an unwritable cache gives the plain dict. Raises FileNotFoundError /
+    # OSError for the source file like load_dtc_map().
+    if path.lower().endswith(INDEX_EXT):
+        return o3DIAGDTCIndex(path)
+    if not cache_dir:
+        return load_dtc_map(path, None)
+    st = os.stat(path)
+    target = os.path.splitext(cache_path(path, cache_dir))[0] + INDEX_EXT
+    index = None
+    try:
+        index = o3DIAGDTCIndex(target)
+    except (OSError, ValueError):
+        pass
+    if index is not None and index.source[:2] == (st.st_size, st.st_mtime_ns):
+        return index
+    digest = bytes.fromhex(file_sha256(path))
+    if index is not None and index.source[0] == st.st_size and index.source[2] == digest:
+        new_map = dict(index.items()) # touched, not changed: same entries, new stamp
+    else:
+        new_map = parse_o3script(path)
+    if index is not None:
+        index.close() # Windows can't replace a file that is still mapped
+    try:
+        write_dtc_index(target, new_map.items(), (st.st_size, st.st_mtime_ns, digest))
+    except OSError:
+        return new_map # read-only cache: the list in memory, like load_dtc_map()
+    return o3DIAGDTCIndex(target)
+
+def build_dtc_index(sources, output: str) -> int:
+    # One index from several .o3script / .o3idx files, later files win for
+    # codes they share (generic list first, OEM lists after). -> entries
+    merged = {}
+    for source in sources:
+        if source.lower().endswith(INDEX_EXT):
+            index = o3DIAGDTCIndex(source)
+            merged.update(index.items())
+            index.close()
+        else:
+            merged.update(load_dtc_map(source, None))
+    write_dtc_index(output, merged.items())
+    return len(merged)
@@ -0,0 +1,135 @@
+# o3DIAG - layered P-code lists in several languages
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# Layers, lowest first: generic SAE list, OEM lists, local overrides. Every
+# layer can come in several languages, named like the bundled lists:
+#   o3DIAG_Pcodes_list_english.o3script   layer "o3diag_pcodes_list", english
+#   o3DIAG_pcodes_list_german.o3script    same layer, german
+#   o3DIAG_VW_list_english.o3script       OEM layer "o3diag_vw_list"
+# A name without a known language suffix (my_overrides.o3script) is a
+# layer in the fallback language. All lists are compiled into one .o3idx
+# of format 2 (see dtc_index.py) in the cache: one sorted key table for
+# every language and one table per language into a shared heap (the
+# description of the highest layer that has the code, in that language if
+# the layer comes in it, else in the fallback language). Lookups
+# binary-search the mapped file like a single list, set_language() only
+# switches tables. The file is rebuilt when a list changes.
+# -------------------------------------------------
+
+import glob
+import hashlib
+import os
+
+from .dtc_index import INDEX_EXT, LAYERED_FORMAT, load_dtc_index, o3DIAGDTCIndex, pack_dtc_tables, write_index_file
+from .dtc_map import CACHE_DIR
+
+FALLBACK_LANGUAGE = "english"
+LANGUAGES = ("english", "german") # suffixes of the shipped lists
+GENERIC_LAYER = "o3diag_pcodes_list"
+LOCAL_DIR = os.path.join(os.path.expanduser("~"), ".o3DIAG", "o3script") # local overrides
+
+def split_list_name(path: str):
+    # "o3DIAG_Pcodes_list_english.o3script" -> ("o3diag_pcodes_list", "english");
+    # a name without a known language ("my_overrides.o3script") is a layer
+    # in the fallback language: ("my_overrides", "english")
+    name = os.path.splitext(os.path.basename(path))[0].lower()
+    layer, _, language = name.rpartition("_")
+    if layer and language in LANGUAGES:
+        return layer, language
+    return name, FALLBACK_LANGUAGE
+
+def find_o3script_layers(folders):
+    # -> [{language: path}, ...] lowest layer first. Later folders override
+    # earlier ones; in a folder the generic list comes first, then the
+    # others by name.
+    layers = []
+    for folder in folders:
+        found = {}
+        for path in sorted(glob.glob(os.path.join(folder, "*.o3script"))):
+            layer, language = split_list_name(path)
+            found.setdefault(layer, {})[language] = path
+        for layer in sorted(found, key=lambda name: (name != GENERIC_LAYER, name)):
+            layers.append(found[layer])
+    return layers
+
+def layers_index_path(layers, cache_dir: str, fallback: str = FALLBACK_LANGUAGE):
+    # -> (path, digest). The name carries the folders' lists and their size
+    # and mtime, so a changed list gives a new file and a mapped old one is
+    # never replaced.
+    h = hashlib.sha256(f"{LAYERED_FORMAT}|{fallback}".encode("utf-8"))
+    for layer in layers:
+        for language, path in sorted(layer.items()):
+            st = os.stat(path)
+            h.update(f"|{os.path.abspath(path)}|{language}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8"))
+    digest = h.digest()
+    return os.path.join(cache_dir, f"o3DIAG_layers-{digest.hex()[:16]}{INDEX_EXT}"), digest
+
+def compile_layers(layers, cache_dir, fallback: str = FALLBACK_LANGUAGE, digest: bytes = b"") -> bytes:
+    # Per language, layer by layer: the layer's fallback list, then its
+    # list in that language on top, so an English-only override still
+    # beats the generic German text
+    languages = [fallback] + sorted({language for layer in layers for language in layer} - {fallback})
+    merged = {language: {} for language in languages}
+    for layer in layers:
+        maps = {language: load_dtc_index(path, cache_dir) for language, path in layer.items()}
+        for language in languages:
+            merged[language].update(maps.get(fallback, {}).items())
+            if language != fallback:
+                merged[language].update(maps.get(language, {}).items())
+        for index in maps.values():
+            if hasattr(index, "close"):
+                index.close()
+    return pack_dtc_tables({language: merged[language].items() for language in languages}, (0, 0, digest))
+
+class o3DIAGDTCLayers(o3DIAGDTCIndex):
+    # The mapped layered index plus the lists it came from (paths, watched
+    # by o3DIAGDTCCatalog). Without a writable cache it reads the packed
+    # bytes from memory.
+    def __init__(self, layers, language: str = FALLBACK_LANGUAGE, fallback: str = FALLBACK_LANGUAGE,
+                 cache_dir: str = CACHE_DIR):
+        self.fallback = fallback
+        self.paths = [path for layer in layers for path in layer.values()]
+        path, digest = None, b""
+        if cache_dir:
+            path, digest = layers_index_path(layers, cache_dir, fallback)
+            try:
+                super().__init__(path)
+                if self.source[2] == digest:
+                    self.set_language(language)
+                    return
+                self.close()
+            except (OSError, ValueError):
+                pass
+        data = compile_layers(layers, cache_dir, fallback, digest)
+        if path:
+            try:
+                write_index_file(path, data)
+                data = None
+                self.remove_stale(path)
+            except OSError:
+                path = None
+        super().__init__(path, data)
+        self.set_language(language)
+
+    @staticmethod
+    def remove_stale(path: str):
+        # Earlier builds; one still mapped (Windows) goes the next time
+        for old in glob.glob(os.path.join(os.path.dirname(path), f"o3DIAG_layers-*{INDEX_EXT}")):
+            if os.path.abspath(old) != os.path.abspath(path):
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+def load_dtc_layers(folders, cache_dir: str = CACHE_DIR, language: str = FALLBACK_LANGUAGE):
+    # Loader for o3DIAGDTCCatalog: folders as for find_o3script_layers().
+    # Raises FileNotFoundError if there is no .o3script in any of them.
+    layers = find_o3script_layers(folders)
+    if not layers:
+        raise FileNotFoundError(f"no .o3script in {', '.join(folders)}")
+    return o3DIAGDTCLayers(layers, language, cache_dir=cache_dir)
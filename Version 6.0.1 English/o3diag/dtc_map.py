@@ -0,0 +1,241 @@
+# o3DIAG - o3script P-code list
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# Syntax help:
+# https://o3diag.openw3rk.de/help/develop/o3script
+# -------------------------------------------------
+# load_dtc_map() keeps a compiled copy of every list it parsed in
+# ~/.o3DIAG/cache (marshal, one read). The copy is used as long as the
+# .o3script has the same size and mtime, or the same SHA-256 if only the
+# mtime changed (copied / checked out again); otherwise the list is parsed
+# and the copy rewritten.
+# o3DIAGDTCCatalog does the same on a worker thread for the GUI / CLI.
+# -------------------------------------------------
+
+import hashlib
+import marshal
+import os
+import re
+import threading
+
+from .dtc_watch import o3DIAGFileWatcher
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".o3DIAG", "cache")
+CACHE_FORMAT = 1 # bump when parse_o3script changes what it returns
+
+def parse_o3script(path: str) -> dict:
+    # code -> description for every entry between <o3script.START;READ> and
+    # <o3script.END;READ>. Raises FileNotFoundError / OSError like open().
+    new_map = {}
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        reading = False
+        for line in f:
+            s = line.strip()
+            if not s:
+                continue #o3Script syntax, see https://o3diag.openw3rk.de/help/develop/o3script
+            if s.startswith("<") and "START;READ" in s:
+                reading = True
+                continue
+            if s.startswith("<") and "END;READ" in s:
+                reading = False
+                continue
+            if not reading:
+                continue
+            if s.startswith("<") or s.startswith("-"):
+                continue
+            s = s.split("<")[0].strip()
+            if "\t" in s:
+                code, desc = s.split("\t", 1)
+            else:
+                parts = s.split(None, 1)
+                if len(parts) != 2:
+                    continue
+                code, desc = parts
+            code = code.strip().upper()
+            desc = desc.strip()
+            if re.fullmatch(r'[PCBU]\d{4}', code):
+                new_map[code] = desc
+    return new_map
+
+def cache_path(path: str, cache_dir: str = CACHE_DIR) -> str:
+    # One cache file per source path: "o3DIAG_Pcodes_list_english-1a2b3c4d5e6f.o3cache"
+    name = os.path.splitext(os.path.basename(path))[0]
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{name}-{key}.o3cache")
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def read_cache(path: str):
+    # -> (format, size, mtime_ns, sha256, map) or None if missing / unreadable
+    try:
+        with open(path, "rb") as f:
+            entry = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(entry, tuple) or len(entry) != 5 or entry[0] != CACHE_FORMAT:
+        return None
+    return entry
+
+def write_cache(path: str, entry):
+    # Written next to the target and renamed, so a reader never sees half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(marshal.dumps(entry))
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def load_dtc_map(path: str, cache_dir: str = CACHE_DIR) -> dict:
+    # Same result as parse_o3script(path), from the cache when it is current.
+    # cache_dir=None always parses. Raises FileNotFoundError / OSError for
+    # the source file only, a broken or read-only cache is just skipped.
+    st = os.stat(path)
+    if not cache_dir:
+        return parse_o3script(path)
+    target = cache_path(path, cache_dir)
+    entry = read_cache(target)
+    if entry and entry[1] == st.st_size and entry[2] == st.st_mtime_ns:
+        return entry[4]
+    digest = file_sha256(path)
+    if entry and entry[1] == st.st_size and entry[3] == digest:
+        new_map = entry[4] # touched, not changed
+    else:
+        new_map = parse_o3script(path)
+    try:
+        write_cache(target, (CACHE_FORMAT, st.st_size, st.st_mtime_ns, digest, new_map))
+    except OSError:
+        pass
+    return new_map
+
+def diff_dtc_maps(old, new):
+    # -> (added, changed, removed) code lists between two loaded lists
+    old_items = dict(old.items())
+    added, changed = [], []
+    for code, desc in new.items():
+        before = old_items.pop(code, None)
+        if before is None:
+            added.append(code)
+        elif before != desc:
+            changed.append(code)
+    return added, changed, sorted(old_items)
+
+class o3DIAGDTCCatalog:
+    # P-code list loaded on a worker thread: load() returns at once, the GUI
+    # and the adapter come up meanwhile. get() before the first load finished
+    # waits on ready (up to LOOKUP_TIMEOUT) and then resolves instead of
+    # missing. A reload keeps answering from the previous map until the new
+    # one is swapped in (a failed load leaves it empty, like before).
+    # on_loaded(catalog) runs on the worker thread. loader(path, cache_dir)
+    # returns the map, e.g. dtc_index.load_dtc_index for a mapped index or
+    # dtc_layers.load_dtc_layers (path is then a list of folders).
+    # watch() reloads by itself when the file is saved, or for folders when
+    # a list in them is added, removed or saved: only a list that really
+    # differs is swapped in, changes holds (added, changed, removed), and a
+    # missing or unreadable file (mid-rename) keeps the current list.
+    LOOKUP_TIMEOUT = 10.0
+    WATCH_SUFFIX = ".o3script" # files that count in a watched list folder
+
+    def __init__(self, cache_dir: str = CACHE_DIR, on_loaded=None, loader=load_dtc_map):
+        self.cache_dir = cache_dir
+        self.loader = loader
+        self.on_loaded = on_loaded
+        self.map = {}
+        self.path = None
+        self.error = None # exception of the last load, None on success
+        self.changes = None # (added, changed, removed) of the last reload
+        self.ready = threading.Event()
+        self.lock = threading.Lock() # one load at a time (button + watcher)
+        self.thread = None
+        self.watchers = []
+        self.watch_lock = threading.Lock()
+        self.watch_interval = None # set by watch()
+
+    def load(self, path: str):
+        self.path = path
+        self.thread = threading.Thread(target=self.worker, args=(path,), daemon=True)
+        self.thread.start()
+        return self
+
+    def worker(self, path: str, keep_on_error: bool = False):
+        if not keep_on_error:
+            # Before the load: a list saved or added meanwhile still reloads
+            try:
+                self.start_watchers()
+            except Exception:
+                pass # lookups work without a watcher, watch() can start it again
+        with self.lock:
+            try:
+                new_map = self.loader(path, self.cache_dir)
+                self.error = None
+            except Exception as e:
+                if keep_on_error:
+                    return
+                new_map = {}
+                self.error = e
+            if keep_on_error:
+                self.changes = diff_dtc_maps(self.map, new_map)
+                if not any(self.changes):
+                    return # saved without changes
+            else:
+                self.changes = None
+            self.map = new_map # one assignment: lookups see the old or the new list
+            self.ready.set()
+        if self.on_loaded:
+            self.on_loaded(self)
+
+    def watch(self, interval: float = 1.0):
+        # Watches from the current load on (also for later load() calls);
+        # inotify on Linux, otherwise mtime polling.
+        with self.watch_lock:
+            self.watch_interval = interval
+        if self.path is not None:
+            self.start_watchers()
+        return self
+
+    def start_watchers(self):
+        # A layered load (path is a list of folders) watches the folders, so
+        # a list that is added, removed or saved there reloads the layers
+        # (the loader looks for the lists again); otherwise the file itself
+        with self.watch_lock:
+            if self.watch_interval is None or self.path is None:
+                return
+            for watcher in self.watchers:
+                watcher.stop()
+            reload = lambda: self.worker(self.path, keep_on_error=True)
+            if isinstance(self.path, (list, tuple)):
+                self.watchers = [o3DIAGFileWatcher(folder, reload, self.watch_interval, self.WATCH_SUFFIX).start()
+                                 for folder in self.path]
+            else:
+                self.watchers = [o3DIAGFileWatcher(self.path, reload, self.watch_interval).start()]
+
+    def unwatch(self):
+        with self.watch_lock:
+            self.watch_interval = None
+            for watcher in self.watchers:
+                watcher.stop()
+            self.watchers = []
+
+    def wait(self, timeout=None) -> bool:
+        return self.ready.wait(timeout)
+
+    def get(self, code: str, default: str = "", timeout=LOOKUP_TIMEOUT) -> str:
+        self.ready.wait(timeout)
+        return self.map.get(code.upper(), default)
+
+    def __len__(self):
+        return len(self.map)
+
+    def __contains__(self, code):
+        return code.upper() in self.map
@@ -0,0 +1,130 @@
+# o3DIAG - watch P-code lists for changes
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# o3DIAGFileWatcher calls on_change() on its own thread when a file was
+# written. Linux: inotify on the folder (editors that save through a
+# temp file + rename are seen too), elsewhere or without libc: the size and
+# mtime are polled every interval seconds.
+# A folder can be watched too (the list folders of dtc_layers): any file
+# added, removed or saved in it counts as a change, only files ending in
+# suffix if one is given.
+# -------------------------------------------------
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0x00000800
+_EVENT = struct.Struct("iIII") # wd, mask, cookie, name length
+
+def file_signature(path: str, suffix: str = ""):
+    try:
+        if os.path.isdir(path):
+            return tuple(sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                                for entry in os.scandir(path)
+                                if entry.is_file() and entry.name.lower().endswith(suffix)))
+        st = os.stat(path)
+    except OSError:
+        return None # being replaced or deleted
+    return (st.st_size, st.st_mtime_ns)
+
+def _inotify():
+    # libc or None (not Linux, no libc, no inotify instances left)
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class o3DIAGFileWatcher:
+    SETTLE = 0.2 # seconds without events before on_change, one call per save
+
+    def __init__(self, path: str, on_change, interval: float = 1.0, suffix: str = ""):
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.interval = interval
+        self.suffix = suffix.lower()
+        self.stop_event = threading.Event()
+        self.signature = file_signature(self.path, self.suffix)
+        self.mode = None # "inotify" / "poll" once started
+        self.thread = None
+
+    def start(self):
+        fd = self.open_inotify()
+        self.mode = "inotify" if fd is not None else "poll"
+        target = self.run_inotify if fd is not None else self.run_poll
+        self.thread = threading.Thread(target=target, args=(fd,) if fd is not None else (), daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def open_inotify(self):
+        libc = _inotify()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK)
+        if fd < 0:
+            return None
+        folder = (self.path if os.path.isdir(self.path) else os.path.dirname(self.path)).encode()
+        if libc.inotify_add_watch(fd, folder, IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def changed(self) -> bool:
+        # Events also come for touches and for other files of the folder
+        signature = file_signature(self.path, self.suffix)
+        if signature is None or signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+    def run_poll(self):
+        while not self.stop_event.wait(self.interval):
+            if self.changed():
+                self.on_change()
+
+    def run_inotify(self, fd: int):
+        name = None if os.path.isdir(self.path) else os.path.basename(self.path).encode()
+        pending = False
+        try:
+            while not self.stop_event.is_set():
+                ready, _, _ = select.select([fd], [], [], self.SETTLE if pending else self.interval)
+                if not ready:
+                    # Quiet for SETTLE: the save is complete
+                    if pending and self.changed():
+                        self.on_change()
+                    pending = False
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                at = 0
+                while at + _EVENT.size <= len(data):
+                    _, _, _, length = _EVENT.unpack_from(data, at)
+                    event_name = data[at + _EVENT.size:at + _EVENT.size + length].rstrip(b"\0")
+                    at += _EVENT.size + length
+                    if event_name == name or (name is None and event_name.lower().endswith(self.suffix.encode())):
+                        pending = True
+        finally:
+            os.close(fd)
@@ -0,0 +1,46 @@
+# o3DIAG - log export
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# Writes the same file as the COBOL o3DIAG Log Export Manager did (every
+# line, an empty line, the footer), in process: no temp file, no .exe, no
+# 256 character limit per line. Lines are streamed in chunks, so memory
+# does not grow with the size of the log; o3DIAGLogStore.lines() reads
+# the session history file first, then the records in memory.
+# -------------------------------------------------
+
+import os
+from itertools import islice
+
+LOGS_DIR = os.path.join(os.path.expanduser("~"), ".o3DIAG", "logs")
+EXPORT_FOOTER = "Created with o3DIAG Log Export Manager."
+CHUNK_LINES = 4096
+
+def next_log_path(base_name: str = "o3DIAG_OUTPUT_LOG", ext: str = ".TXT", logs_dir: str = LOGS_DIR) -> str:
+    # o3DIAG_OUTPUT_LOG.TXT, o3DIAG_OUTPUT_LOG_02.TXT, ...
+    os.makedirs(logs_dir, exist_ok=True)
+    path = os.path.join(logs_dir, base_name + ext)
+    counter = 1
+    while os.path.exists(path):
+        counter += 1
+        path = os.path.join(logs_dir, f"{base_name}_{counter:02d}{ext}")
+    return path
+
+def write_log_export(lines, path: str) -> int:
+    # lines: any iterable of str (o3DIAGLogStore.lines()). -> lines written
+    count = 0
+    lines = iter(lines)
+    with open(path, "w", encoding="utf-8") as f:
+        while True:
+            chunk = list(islice(lines, CHUNK_LINES))
+            if not chunk:
+                break
+            chunk.append("")
+            f.write("\n".join(chunk))
+            count += len(chunk) - 1
+        f.write(f"\n{EXPORT_FOOTER}\n")
+    return count
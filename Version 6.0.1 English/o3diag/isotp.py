@@ -0,0 +1,124 @@
+# o3DIAG - ISO-TP frame assembly
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# Joins the lines of one request into complete messages per ECU:
+#   ATH0: "00A" / "0: 43 04 01 33 04 20" / "1: 01 71 03 00 00 00 00"
+#         (length line, then numbered frames), single frames as plain lines
+#   ATH1: "7E8 10 0A 43 04 01 33 04 20" / "7E8 21 01 71 03 00 00 00 00"
+#         (11 bit CAN id and PCI byte on every frame)
+#   ATH1 on K-line / J1850: "48 6B 10 43 01 33 04 20 00 00 5E" (priority,
+#         target, source ECU, message, checksum / CRC); header and check
+#         byte are stripped, the ECU is the source address ("10")
+# Every byte is copied once, so long answers cost linear time.
+# -------------------------------------------------
+
+_HEX_DIGITS = frozenset("0123456789ABCDEFabcdef")
+
+def _is_hex(token: str) -> bool:
+    return _HEX_DIGITS.issuperset(token)
+
+def _to_bytes(tokens):
+    try:
+        return bytes.fromhex(" ".join(tokens))
+    except ValueError:
+        return None # status text: NO DATA, SEARCHING..., CAN ERROR
+
+def _j1850_crc(data) -> int:
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1D) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc ^ 0xFF
+
+def strip_header(data: bytes):
+    # ATH1 line of a non-CAN protocol -> (source address, message), None if
+    # the line is not one (the check byte must match, so "41 6B ..." of PID
+    # 6B on CAN stays a message)
+    if len(data) < 5:
+        return None
+    if data[1] == 0x6B and data[0] in (0x41, 0x48, 0x68): # J1850 PWM / VPW, ISO 9141-2
+        head = 3
+    elif data[0] & 0xC0 == 0x80 and data[1] == 0xF1: # ISO 14230 (KWP), length in the format byte or after
+        head = 3 if data[0] & 0x3F else 4
+    else:
+        return None
+    body = data[:-1]
+    if data[-1] != sum(body) & 0xFF and data[-1] != _j1850_crc(body):
+        return None
+    return f"{data[2]:02X}", bytes(data[head:-1])
+
+class o3DIAGFrameAssembler:
+    # Feed the lines of one request as they arrive (str or bytes), then
+    # messages() -> [(ecu, payload bytes), ...] in the order they completed.
+    # ecu is the CAN id / source address with ATH1 ("7E8", "10"), otherwise
+    # "ECU1", "ECU2", ... in the order the answers started.
+    def __init__(self):
+        self.completed = []
+        self.partial = {} # ecu -> [bytearray, expected length]
+        self.current = None # ecu of the running ATH0 multi-frame block
+        self.ecus = 0
+
+    def next_ecu(self) -> str:
+        self.ecus += 1
+        return f"ECU{self.ecus}"
+
+    def feed(self, line):
+        if isinstance(line, (bytes, bytearray)):
+            line = line.decode("ascii", "ignore")
+        tokens = line.split()
+        if not tokens:
+            return
+        first = tokens[0]
+        if len(first) == 3 and _is_hex(first):
+            if len(tokens) == 1:
+                # ATH0 length line: a multi-frame answer of the next ECU starts
+                self.current = self.next_ecu()
+                self.partial[self.current] = [bytearray(), int(first, 16)]
+            else:
+                self.feed_can_frame(first, tokens[1:])
+            return
+        if len(first) == 2 and first[1] == ":" and _is_hex(first[0]):
+            data = _to_bytes(tokens[1:])
+            if data is not None and self.current in self.partial:
+                self.append(self.current, data)
+            return
+        data = _to_bytes(tokens)
+        if data:
+            self.completed.append(strip_header(data) or (self.next_ecu(), bytes(data)))
+
+    def feed_can_frame(self, ecu: str, tokens):
+        data = _to_bytes(tokens)
+        if not data:
+            return
+        kind = data[0] >> 4
+        if kind == 0: # single frame
+            self.completed.append((ecu, bytes(data[1:1 + (data[0] & 0x0F)])))
+        elif kind == 1 and len(data) > 1: # first frame
+            self.partial[ecu] = [bytearray(), ((data[0] & 0x0F) << 8) | data[1]]
+            self.append(ecu, data[2:])
+        elif kind == 2 and ecu in self.partial: # consecutive frame
+            self.append(ecu, data[1:])
+
+    def append(self, ecu: str, data: bytes):
+        buffer, expected = self.partial[ecu]
+        buffer += data
+        if len(buffer) >= expected:
+            # Last frame is padded, cut to the announced length
+            del self.partial[ecu]
+            self.completed.append((ecu, bytes(buffer[:expected])))
+
+    def messages(self):
+        # Completed messages, then whatever arrived of unfinished ones
+        return self.completed + [(ecu, bytes(buffer)) for ecu, (buffer, _) in self.partial.items()]
+
+def assemble_messages(lines):
+    assembler = o3DIAGFrameAssembler()
+    for line in lines:
+        assembler.feed(line)
+    return assembler.messages()
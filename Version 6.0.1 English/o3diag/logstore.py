@@ -0,0 +1,216 @@
+# o3DIAG - session log
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# Append-only record of a session, independent of any widget. The GUI log
+# view, the exporters and recorders read from it; the text lines are only
+# formatted when somebody asks for them. The last MAX_RECORDS records are
+# kept in memory; older ones are appended to a history file in
+# ~/.o3DIAG/history (marshal, like the P-code cache), so all-day sessions
+# stay bounded in RAM and lines() / exports still cover the whole session.
+#   time       time.time(), None for lines without time stamp (banner)
+#   level      "INFO" / "OK" / "WARN" / "ERROR" / "PANIC"
+#   direction  "TX" request, "RX" adapter answer, "" for status lines
+#   raw        adapter bytes of a TX / RX record if they are not simply the
+#              end of text ("Response <<< 41 0C 1A F8"), else None;
+#              raw_bytes(record) gives them in either case
+#   values     decoded o3DIAGValues, else None
+# -------------------------------------------------
+
+import marshal
+import os
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import islice
+
+HISTORY_DIR = os.path.join(os.path.expanduser("~"), ".o3DIAG", "history")
+
+o3DIAGLogRecord = namedtuple("o3DIAGLogRecord", "time level direction text raw values")
+
+LEVELS = ("INFO", "OK", "WARN", "ERROR", "PANIC")
+DIRECTION_TX = "TX"
+DIRECTION_RX = "RX"
+
+def detect_level(text: str) -> str:
+    # From the tags the log lines already carry: "[PANIC] ...", "[ WARN ] ..."
+    if text.startswith("["):
+        tag = text[1:text.find("]")].strip().upper()
+        if tag in LEVELS:
+            return tag
+    return "INFO"
+
+RAW_MARKERS = (">>> ", "<<< ", ": ") # "Request >>> 010C", "Response: OK"
+
+def raw_from_text(text: str):
+    # Adapter bytes at the end of a TX / RX line, None if there is no marker
+    for marker in RAW_MARKERS:
+        head, found, tail = text.partition(marker)
+        if found:
+            try:
+                return tail.encode("ascii")
+            except UnicodeEncodeError:
+                return None
+    return None
+
+def raw_bytes(record):
+    if record.raw is not None or not record.direction:
+        return record.raw
+    return raw_from_text(record.text)
+
+def format_record(record) -> str:
+    # "[2025/01/31 12:00:00] text", the line the log window and exports show
+    if record.time is None:
+        return record.text
+    return time.strftime("[%Y/%m/%d %H:%M:%S] ", time.localtime(record.time)) + record.text
+
+class o3DIAGLogFormatter:
+    # format_record() with the time stamp cached per second. One per reader
+    # (log view, every export): the cache is not shared between threads.
+    def __init__(self):
+        self.second = None
+        self.stamp = ""
+
+    def __call__(self, record) -> str:
+        if record.time is None:
+            return record.text
+        second = int(record.time)
+        if second != self.second:
+            self.stamp = time.strftime("[%Y/%m/%d %H:%M:%S] ", time.localtime(second))
+            self.second = second
+        return self.stamp + record.text
+
+def _plain_record(record):
+    # values go to disk as plain tuples (marshal takes no namedtuples)
+    values = tuple(tuple(value) for value in record.values) if record.values else None
+    return (record.time, record.level, record.direction, record.text, record.raw, values)
+
+class o3DIAGLogStore:
+    # listeners are called with every new record (GUI: on the Tk thread).
+    # Indexes count the whole session: len() = spilled + records in memory.
+    # history_dir=None drops old records instead of spilling them.
+    MAX_RECORDS = 100000
+    TRIM = 10000 # records moved to the history file at once when MAX_RECORDS is exceeded
+
+    def __init__(self, max_records: int = MAX_RECORDS, history_dir: str = HISTORY_DIR):
+        self.max_records = max_records
+        self.history_dir = history_dir
+        self.records = []
+        self.listeners = []
+        self.history = None # open history file, appended to
+        self.history_path = None
+        self.chunks = [] # (first record index, file offset, size) per spilled chunk
+        self.spilled = 0 # records in the history file
+        self.dropped = 0 # records lost: no history_dir or the file could not be written
+        self.sessions = 0
+
+    def add(self, text: str, level: str = None, direction: str = "", raw: bytes = None, values=None,
+            stamp: bool = True):
+        if raw is not None and direction and raw_from_text(text) == raw:
+            raw = None # rebuilt from text by raw_bytes(), not stored twice
+        record = o3DIAGLogRecord(time.time() if stamp else None, level or detect_level(text),
+                                 direction, text, raw, tuple(values) if values else None)
+        self.records.append(record)
+        if len(self.records) > self.max_records + self.TRIM:
+            self.spill(len(self.records) - self.max_records)
+        for listener in self.listeners:
+            listener(record)
+        return record
+
+    def spill(self, count: int):
+        # A new list, not del [:n]: lines() handed to an export thread keeps
+        # reading the old one. spilled only grows once the chunk is on disk.
+        chunk, rest = self.records[:count], self.records[count:]
+        try:
+            if self.history is None:
+                if not self.history_dir:
+                    raise OSError("no history_dir")
+                os.makedirs(self.history_dir, exist_ok=True)
+                self.sessions += 1
+                self.history_path = os.path.join(self.history_dir,
+                                                 f"o3DIAG_session_{os.getpid()}_{self.sessions}.o3log")
+                self.history = open(self.history_path, "wb")
+            data = marshal.dumps([_plain_record(record) for record in chunk]) # one loads() per chunk
+            offset = self.history.tell()
+            self.history.write(data)
+            self.history.flush()
+            self.chunks.append((self.dropped + self.spilled, offset, len(data)))
+            self.spilled += count
+        except OSError:
+            # Read-only home / disk full: give the history up and stay
+            # bounded like the log view, everything before the tail is lost
+            self.close()
+            self.history_dir = None
+            self.dropped += self.spilled + count
+            self.chunks = []
+            self.spilled = 0
+        self.records = rest
+
+    def clear(self):
+        self.close()
+        self.records = []
+        self.chunks = []
+        self.spilled = 0
+        self.dropped = 0
+
+    def close(self):
+        # Removes the history file; an export still reading it (Windows) keeps it
+        if self.history is None:
+            return
+        self.history.close()
+        self.history = None
+        try:
+            os.remove(self.history_path)
+        except OSError:
+            pass
+
+    def iter_from(self, start: int = 0, stop: int = None):
+        # Records start <= index < stop, as there are at the time of the call:
+        # the history file first, then the tail in memory
+        dropped = self.dropped
+        end = dropped + self.spilled
+        stop = end + len(self.records) if stop is None else stop
+        return self._iter_from(max(start, dropped), stop, self.history_path, list(self.chunks), end,
+                               self.records)
+
+    @staticmethod
+    def _iter_from(start, stop, path, chunks, end, records):
+        if start < min(end, stop):
+            n = bisect_right(chunks, (start, float("inf"))) - 1
+            with open(path, "rb") as f:
+                f.seek(chunks[n][1])
+                for first, _, size in chunks[n:]:
+                    if first >= min(end, stop):
+                        break
+                    chunk = marshal.loads(f.read(size))
+                    for record in chunk[max(0, start - first):max(0, stop - first)]:
+                        yield o3DIAGLogRecord._make(record)
+        yield from islice(records, max(0, start - end), max(0, stop - end))
+
+    def lines(self, start: int = 0, stop: int = None):
+        # Formatted text, one entry per record (multi-line texts stay one
+        # entry), of the records there are at the time of the call
+        formatter = o3DIAGLogFormatter()
+        return (formatter(record) for record in self.iter_from(start, stop))
+
+    def __len__(self):
+        return self.dropped + self.spilled + len(self.records)
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def __getitem__(self, index):
+        # Memory for the tail, the history file for older records
+        total = len(self)
+        if index < 0:
+            index += total
+        if not self.dropped <= index < total:
+            raise IndexError("log record index out of range")
+        memory = index - self.dropped - self.spilled
+        if memory >= 0:
+            return self.records[memory]
+        return next(self.iter_from(index, index + 1))
@@ -0,0 +1,372 @@
+# o3DIAG - OBD-II response parsing and decoding
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# No tkinter, no serial: usable from the GUI, the CLI and scripts.
+# -------------------------------------------------
+
+import binascii
+import re
+import sys
+from array import array
+from collections import namedtuple
+
+from .isotp import assemble_messages
+from .pids import PIDS, PIDS_BY_BYTE
+
+def clean_response(raw: str) -> str:
+    if raw is None:
+        return ""
+    s = raw.replace('>', ' ').replace('\r', ' ').replace('\n', ' ')
+    s = re.sub(r'\s+', ' ', s).strip()
+    return s
+PROMPT = None # marks the adapter's '>' prompt in split_adapter_output
+
+def split_adapter_output(buffer: str):
+    # -> ([line, ..., PROMPT, ...], rest): complete lines and prompts in the
+    # order they arrived, rest is an unfinished line to keep for the next read
+    items = []
+    start = 0
+    for m in re.finditer(r'[\r\n>]', buffer):
+        line = buffer[start:m.start()].strip()
+        if line:
+            items.append(line)
+        if m.group() == '>':
+            items.append(PROMPT)
+        start = m.end()
+    return items, buffer[start:]
+
+def _split_lines(segment: bytes, items):
+    if b"\n" in segment:
+        segment = segment.replace(b"\n", b"\r")
+    for line in segment.split(b"\r"):
+        line = line.strip()
+        if line:
+            items.append(line)
+
+def split_adapter_bytes(buffer: bytes):
+    # Same as split_adapter_output, straight on what the port returned:
+    # no decode, no regex. Lines stay bytes.
+    items = []
+    segments = buffer.split(b">")
+    rest = segments.pop()
+    for segment in segments:
+        _split_lines(segment, items)
+        items.append(PROMPT)
+    cut = max(rest.rfind(b"\r"), rest.rfind(b"\n"))
+    if cut >= 0:
+        _split_lines(rest[:cut], items)
+        rest = rest[cut + 1:]
+    return items, rest
+
+def parse_pid_response(resp: str, pid_hex: str):
+    if not resp:
+        return None
+    parts = resp.split(' ')
+    parts = [p for p in parts if re.fullmatch(r'[0-9A-Fa-f]{2}', p)]
+    for i in range(len(parts) - 1):
+        if parts[i].upper() == '41' and parts[i+1].upper() == pid_hex.upper():
+            data = parts[i+2:]
+            return data
+    return None
+def calc_rpm(data):
+    if data and len(data) >= 2:
+        A = int(data[0], 16)
+        B = int(data[1], 16)
+        return ((A * 256) + B) / 4.0
+    return None
+def calc_speed(data):
+    if data and len(data) >= 1:
+        return int(data[0], 16)
+    return None
+
+def calc_temp(data):
+    if data and len(data) >= 1:
+        return int(data[0], 16) - 40
+    return None
+
+def calc_engine_load(data):
+    if data and len(data) >= 1:
+        return (int(data[0], 16) * 100.0) / 255.0
+    return None
+
+def calc_voltage(data):
+    if data and len(data) >= 1:
+        A = int(data[0], 16)
+        B = int(data[1], 16) if len(data) > 1 else 0
+        return (A * 256 + B) / 1000.0
+    return None
+
+def decode_pid(pid: str, data):
+    # -> (name, value, unit) or None if the PID is unknown or data too short
+    entry = PIDS.get(pid.upper())
+    if not entry or not data or len(data) < entry.length:
+        return None
+    try:
+        value = entry.formula([int(x, 16) for x in data[:entry.length]])
+    except ValueError:
+        return None
+    return entry.name, value, entry.unit
+
+def format_pid_value(pid: str, value) -> str:
+    entry = PIDS.get(pid.upper())
+    return entry.fmt.format(value) if entry else str(value)
+
+# Data bytes returned per Mode 01 PID, needed to split multi-PID answers
+PID_DATA_LENGTHS = {pid: entry.length for pid, entry in PIDS.items()}
+MAX_PIDS_PER_REQUEST = 6 # ELM327 limit for one Mode 01 request on CAN
+CAN_PROTOCOLS = "6789ABC" # ATDPN protocol numbers that allow multi-PID requests
+
+def build_pid_requests(pids, batch: bool = True):
+    pids = [p.upper() for p in pids]
+    if not batch:
+        return ["01" + p for p in pids]
+    return ["01" + "".join(pids[i:i + MAX_PIDS_PER_REQUEST])
+            for i in range(0, len(pids), MAX_PIDS_PER_REQUEST)]
+
+def split_pid_request(cmd: str):
+    # "010C0D05" -> ["0C", "0D", "05"]; anything but Mode 01 -> []
+    cmd = cmd.strip().upper()
+    if not cmd.startswith("01") or len(cmd) % 2 or not re.fullmatch(r'[0-9A-F]+', cmd):
+        return []
+    return [cmd[i:i + 2] for i in range(2, len(cmd), 2)]
+
+def response_tokens(lines):
+    # Hex bytes of a (possibly multi-frame) answer. Drops the ISO-TP length
+    # line ("00D") and frame numbers ("0:") that CAN adapters print with ATH0.
+    tokens = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 1 and len(parts[0]) == 3:
+            continue
+        tokens.extend(p.upper() for p in parts if re.fullmatch(r'[0-9A-Fa-f]{2}', p))
+    return tokens
+
+def split_multi_pid_response(lines):
+    # "41 0C 1A F8 0D 32 05 7B" -> {"0C": ["1A", "F8"], "0D": ["32"], "05": ["7B"]}
+    # Every ECU answer (line or ISO-TP message) is split on its own and
+    # starts with its 41 header, so a second ECU's 41 is never read as PID
+    # 0x41. A PID answered by several ECUs keeps the first answer.
+    values = {}
+    for _, message in assemble_messages(_hex_lines(lines)):
+        if not message or message[0] != 0x41:
+            continue
+        i = 1
+        while i < len(message):
+            pid = f"{message[i]:02X}"
+            n = PID_DATA_LENGTHS.get(pid)
+            if n is None or i + 1 + n > len(message):
+                break
+            values.setdefault(pid, [f"{b:02X}" for b in message[i + 1:i + 1 + n]])
+            i += 1 + n
+    return values
+
+def _hex_lines(lines):
+    # Adapter lines without status words ("SEARCHING...", ">")
+    for line in lines:
+        tokens = [t for t in line.split() if _HEX_DIGITS.issuperset(t.rstrip(":"))]
+        if tokens:
+            yield " ".join(tokens)
+
+def decode_supported_pids(lines, base: str = "00"):
+    # "41 00 BE 1F A8 13" -> ["01", "03", ...]; answers of several ECUs are merged
+    tokens = response_tokens(lines)
+    supported = set()
+    for i in range(len(tokens) - 5):
+        if tokens[i] == "41" and tokens[i + 1] == base.upper():
+            mask = int("".join(tokens[i + 2:i + 6]), 16)
+            for bit in range(32):
+                if mask & (1 << (31 - bit)):
+                    supported.add(f"{int(base, 16) + bit + 1:02X}")
+    return sorted(supported)
+
+def decode_vin(lines) -> str:
+    # Mode 09 PID 02. CAN sends "49 02 01" once before the 17 characters,
+    # older protocols repeat "49 02 <seq>" on every line. 0x49 ('I') is never
+    # part of a VIN, so every 49 02 xx triplet can be dropped.
+    tokens = response_tokens(lines)
+    data = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i] == "49" and i + 2 < len(tokens) and tokens[i + 1] == "02":
+            i += 3
+            continue
+        data.append(tokens[i])
+        i += 1
+    vin = "".join(chr(int(t, 16)) for t in data if 0x30 <= int(t, 16) <= 0x5A)
+    return vin[-17:]
+
+DTC_GROUPS = ['P', 'C', 'B', 'U']
+
+def _build_dtc_table():
+    first = [f"{DTC_GROUPS[a >> 6]}{(a >> 4) & 0x03}{a & 0x0F:X}" for a in range(256)]
+    second = [f"{b:02X}" for b in range(256)]
+    return tuple(f + s for f in first for s in second)
+
+# Two byte word (A << 8 | B) -> code, "P0133" for 0x0133. Built once at
+# import (~10 ms), after that decoding a code is a tuple index.
+DTC_TABLE = _build_dtc_table()
+
+def dtc_from_bytes(a: int, b: int) -> str:
+    return DTC_TABLE[(a << 8) | b]
+
+_HEX_DIGITS = frozenset("0123456789ABCDEFabcdef")
+
+def hex_payload(resp: str) -> bytes:
+    # "43 01 33 04 20" / "4301330420" -> bytes; words that aren't hex
+    # ("0:", "SEARCHING...") are skipped
+    try:
+        return bytes.fromhex(resp)
+    except ValueError:
+        return bytes.fromhex(" ".join(t for t in resp.split()
+                                      if not len(t) % 2 and _HEX_DIGITS.issuperset(t)))
+
+def extract_dtcs_from_response(resp: str, can=None):
+    # One complete 43 message; multi-frame answers go through extract_dtcs_by_ecu
+    data = hex_payload(resp)
+    idx = data.find(0x43)
+    if idx < 0:
+        return []
+    return list(dtcs_from_message(data[idx:], can))
+
+def dtcs_from_message(message, can=None):
+    # 43/47/4A message -> codes. On CAN the number of codes follows the
+    # service byte, older protocols pad with 00 00. can: protocol from
+    # ATDPN, None if not known; then the first byte is only taken as the
+    # count if exactly that many codes follow it.
+    body = message[1:]
+    if can or (can is None and len(body) % 2 and 1 + 2 * body[0] == len(body)):
+        return tuple(decode_dtcs(body[1:1 + 2 * body[0]]))
+    return decode_dtc_bytes(message)
+
+def decode_dtcs(buffer, skip_empty: bool = True):
+    # Whole runs of A B pairs at once (archived Mode 03/07/0A payloads without
+    # the service byte): bytes/bytearray -> list of codes; a NumPy uint16
+    # array of words (or uint8 array of bytes) -> NumPy array of codes.
+    # skip_empty drops the 00 00 padding words.
+    if hasattr(buffer, "dtype"):
+        import numpy as np # only needed when we're handed NumPy data
+        words = np.asarray(buffer)
+        if words.dtype.itemsize == 1:
+            words = words[:len(words) & ~1].view(">u2")
+        words = words.astype(np.uint16, copy=False)
+        if skip_empty:
+            words = words[words != 0]
+        return _dtc_array(np)[words]
+    words = array("H", bytes(buffer[:len(buffer) & ~1]))
+    if sys.byteorder == "little":
+        words.byteswap()
+    table = DTC_TABLE
+    if skip_empty:
+        return [table[w] for w in words if w]
+    return [table[w] for w in words]
+
+_DTC_ARRAY = None
+
+def _dtc_array(np):
+    global _DTC_ARRAY
+    if _DTC_ARRAY is None:
+        _DTC_ARRAY = np.array(DTC_TABLE)
+    return _DTC_ARRAY
+
+DTC_SERVICES = {"03": 0x43, "07": 0x47, "0A": 0x4A} # request -> positive answer
+
+def extract_dtcs_by_ecu(lines, service: int = 0x43, can=None) -> dict:
+    # Mode 03/07/0A answer of one request -> {ecu: [codes]}, ISO-TP frames
+    # joined, see isotp.py for the ecu keys. On CAN the answer carries the
+    # number of codes after the service byte (odd body length); older
+    # protocols send 3 codes per message padded with 00 00, one ECU often
+    # several messages, so without headers they are kept together.
+    # can as for dtcs_from_message().
+    result = {}
+    legacy = None
+    for ecu, message in assemble_messages(lines):
+        if not message or message[0] != service:
+            continue
+        if can or (can is None and len(message) % 2 == 0):
+            result.setdefault(ecu, []).extend(dtcs_from_message(message, can))
+        else:
+            if ecu.startswith("ECU"):
+                # No headers: the messages of one ECU can't be told apart
+                legacy = legacy or ecu
+                ecu = legacy
+            result.setdefault(ecu, []).extend(decode_dtcs(message[1:]))
+    return result
+
+def extract_dtcs_from_lines(lines, service: int = 0x43, can=None):
+    # Mode 03 answer of one request, codes of all ECUs
+    return [code for codes in extract_dtcs_by_ecu(lines, service, can).values() for code in codes]
+
+# -- single pass line parser ---------------------------------------------
+
+o3DIAGValue = namedtuple("o3DIAGValue", "pid name value unit")
+# service: first byte (0x41, 0x43, ...) or None for status text / ISO-TP
+# continuation frames; values: o3DIAGValue per PID (0x41); dtcs: codes
+# (0x43/0x47/0x4A); text: status line like "NO DATA"
+o3DIAGMessage = namedtuple("o3DIAGMessage", "service payload values dtcs text")
+
+def tokenize_line(line):
+    # "41 0C 1A F8" -> b"\x41\x0c\x1a\xf8", None for text like "NO DATA".
+    # A leading ISO-TP frame index ("1: ...") is returned separately.
+    # Takes str or the bytes lines of split_adapter_bytes.
+    s = line.strip()
+    frame = None
+    if len(s) > 2 and s[1:2] in (":", b":"):
+        frame = s[0:1]
+        s = s[2:]
+    try:
+        if isinstance(s, str):
+            return frame, bytes.fromhex(s) or None
+        return frame, binascii.unhexlify(s.replace(b" ", b"")) or None
+    except (ValueError, binascii.Error):
+        return frame, None
+
+def decode_pid_bytes(payload, start: int = 1):
+    # PID byte, data bytes, PID byte, ... -> (o3DIAGValue, ...)
+    values = []
+    i = start
+    end = len(payload)
+    while i < end:
+        entry = PIDS_BY_BYTE[payload[i]]
+        if entry is None or i + 1 + entry.length > end:
+            break
+        values.append(o3DIAGValue(entry.pid, entry.name, entry.formula(payload[i + 1:i + 1 + entry.length]), entry.unit))
+        i += 1 + entry.length
+    return tuple(values)
+
+def decode_dtc_bytes(payload, start: int = 1):
+    # A B pairs up to the first 00 00 -> ("P0133", ...)
+    dtcs = []
+    table = DTC_TABLE
+    for i in range(start, len(payload) - 1, 2):
+        word = (payload[i] << 8) | payload[i + 1]
+        if not word:
+            break
+        dtcs.append(table[word])
+    return tuple(dtcs)
+
+def _pid_message(payload):
+    return o3DIAGMessage(0x41, payload, decode_pid_bytes(payload), (), "")
+
+def _dtc_message(payload):
+    return o3DIAGMessage(payload[0], payload, (), dtcs_from_message(payload), "")
+
+# Positive answer byte -> decoder; anything else keeps just the payload
+SERVICE_DECODERS = {0x41: _pid_message, 0x43: _dtc_message, 0x47: _dtc_message, 0x4A: _dtc_message}
+
+def parse_line(line: str) -> o3DIAGMessage:
+    # One pass over the line, one decoder for its service
+    frame, payload = tokenize_line(line)
+    if payload is None:
+        text = line.strip()
+        return o3DIAGMessage(None, b"", (), (), text if isinstance(text, str) else text.decode("ascii", "ignore"))
+    if frame not in (None, "0", b"0"):
+        return o3DIAGMessage(None, payload, (), (), "")
+    decoder = SERVICE_DECODERS.get(payload[0])
+    if decoder:
+        return decoder(payload)
+    return o3DIAGMessage(payload[0], payload, (), (), "")
@@ -0,0 +1,219 @@
+# o3DIAG - Mode 01 PID registry
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# Data length, formula, unit and range of the standard Mode 01 PIDs
+# (SAE J1979). Formulas get the data bytes as ints: v[0] is A, v[1] is B...
+# Bit-encoded PIDs (support bitmaps, monitor status, sensor groups) decode
+# to the raw integer of all data bytes.
+# To add a PID, add a row below; lookups are one dict access per PID.
+# -------------------------------------------------
+
+from collections import namedtuple
+
+o3DIAGPid = namedtuple("o3DIAGPid", "pid name length formula unit minimum maximum fmt description")
+
+def _pct(v):
+    return v[0] * 100.0 / 255.0
+
+def _temp(v):
+    return v[0] - 40
+
+def _trim(v):
+    return v[0] * 100.0 / 128.0 - 100.0
+
+def _word(v):
+    return v[0] * 256 + v[1]
+
+def _signed_word(v):
+    n = v[0] * 256 + v[1]
+    return n - 0x10000 if n & 0x8000 else n
+
+def _torque(v):
+    return v[0] - 125
+
+def _raw(v):
+    return int.from_bytes(bytes(v), "big")
+
+def _scaled_word(scale: float, offset: float = 0.0):
+    return lambda v: (v[0] * 256 + v[1]) * scale + offset
+
+def _lambda_ratio(v):
+    return (v[0] * 256 + v[1]) * 2.0 / 65536.0
+
+def _o2_voltage(v):
+    return v[0] / 200.0
+
+# pid, length, name, formula, unit, minimum, maximum, format, description
+_VALUES = [
+    ("04", 1, "EngineLoad", _pct, "%", 0, 100, "{:.0f}", "Calculated engine load"),
+    ("05", 1, "CoolantTemp", _temp, "°C", -40, 215, "{:.0f}", "Engine coolant temperature"),
+    ("06", 1, "ShortFuelTrim1", _trim, "%", -100, 99.2, "{:.1f}", "Short term fuel trim, bank 1"),
+    ("07", 1, "LongFuelTrim1", _trim, "%", -100, 99.2, "{:.1f}", "Long term fuel trim, bank 1"),
+    ("08", 1, "ShortFuelTrim2", _trim, "%", -100, 99.2, "{:.1f}", "Short term fuel trim, bank 2"),
+    ("09", 1, "LongFuelTrim2", _trim, "%", -100, 99.2, "{:.1f}", "Long term fuel trim, bank 2"),
+    ("0A", 1, "FuelPressure", lambda v: v[0] * 3, "kPa", 0, 765, "{:.0f}", "Fuel pressure (gauge)"),
+    ("0B", 1, "IntakePressure", lambda v: v[0], "kPa", 0, 255, "{:.0f}", "Intake manifold absolute pressure"),
+    ("0C", 2, "RPM", lambda v: _word(v) / 4.0, "rpm", 0, 16383.75, "{:.0f}", "Engine speed"),
+    ("0D", 1, "Speed", lambda v: v[0], "km/h", 0, 255, "{:.0f}", "Vehicle speed"),
+    ("0E", 1, "TimingAdvance", lambda v: v[0] / 2.0 - 64, "°", -64, 63.5, "{:.1f}", "Timing advance before TDC"),
+    ("0F", 1, "IntakeTemp", _temp, "°C", -40, 215, "{:.0f}", "Intake air temperature"),
+    ("10", 2, "MAF", _scaled_word(0.01), "g/s", 0, 655.35, "{:.2f}", "Mass air flow rate"),
+    ("11", 1, "ThrottlePos", _pct, "%", 0, 100, "{:.0f}", "Throttle position"),
+    ("1F", 2, "RunTime", _word, "s", 0, 65535, "{:.0f}", "Run time since engine start"),
+    ("21", 2, "DistanceWithMIL", _word, "km", 0, 65535, "{:.0f}", "Distance traveled with MIL on"),
+    ("22", 2, "FuelRailPressureVac", _scaled_word(0.079), "kPa", 0, 5177.265, "{:.1f}",
+     "Fuel rail pressure, relative to manifold vacuum"),
+    ("23", 2, "FuelRailGauge", _scaled_word(10), "kPa", 0, 655350, "{:.0f}", "Fuel rail gauge pressure"),
+    ("2C", 1, "CommandedEGR", _pct, "%", 0, 100, "{:.0f}", "Commanded EGR"),
+    ("2D", 1, "EGRError", _trim, "%", -100, 99.2, "{:.1f}", "EGR error"),
+    ("2E", 1, "EvapPurge", _pct, "%", 0, 100, "{:.0f}", "Commanded evaporative purge"),
+    ("2F", 1, "FuelLevel", _pct, "%", 0, 100, "{:.0f}", "Fuel tank level input"),
+    ("30", 1, "WarmupsSinceClear", lambda v: v[0], "", 0, 255, "{:.0f}", "Warm-ups since codes cleared"),
+    ("31", 2, "DistanceSinceClear", _word, "km", 0, 65535, "{:.0f}", "Distance traveled since codes cleared"),
+    ("32", 2, "EvapVaporPressure", lambda v: _signed_word(v) / 4.0, "Pa", -8192, 8191.75, "{:.2f}",
+     "Evap. system vapor pressure"),
+    ("33", 1, "BarometricPressure", lambda v: v[0], "kPa", 0, 255, "{:.0f}", "Absolute barometric pressure"),
+    ("3C", 2, "CatalystTemp11", _scaled_word(0.1, -40), "°C", -40, 6513.5, "{:.1f}", "Catalyst temperature, bank 1 sensor 1"),
+    ("3D", 2, "CatalystTemp21", _scaled_word(0.1, -40), "°C", -40, 6513.5, "{:.1f}", "Catalyst temperature, bank 2 sensor 1"),
+    ("3E", 2, "CatalystTemp12", _scaled_word(0.1, -40), "°C", -40, 6513.5, "{:.1f}", "Catalyst temperature, bank 1 sensor 2"),
+    ("3F", 2, "CatalystTemp22", _scaled_word(0.1, -40), "°C", -40, 6513.5, "{:.1f}", "Catalyst temperature, bank 2 sensor 2"),
+    ("42", 2, "BatteryVoltage", _scaled_word(0.001), "V", 0, 65.535, "{:.2f}", "Control module voltage"),
+    ("43", 2, "AbsoluteLoad", _scaled_word(100.0 / 255.0), "%", 0, 25700, "{:.0f}", "Absolute load value"),
+    ("44", 2, "CommandedLambda", _lambda_ratio, "", 0, 2, "{:.3f}", "Commanded air-fuel equivalence ratio"),
+    ("45", 1, "RelativeThrottlePos", _pct, "%", 0, 100, "{:.0f}", "Relative throttle position"),
+    ("46", 1, "AmbientTemp", _temp, "°C", -40, 215, "{:.0f}", "Ambient air temperature"),
+    ("47", 1, "ThrottlePosB", _pct, "%", 0, 100, "{:.0f}", "Absolute throttle position B"),
+    ("48", 1, "ThrottlePosC", _pct, "%", 0, 100, "{:.0f}", "Absolute throttle position C"),
+    ("49", 1, "AcceleratorPosD", _pct, "%", 0, 100, "{:.0f}", "Accelerator pedal position D"),
+    ("4A", 1, "AcceleratorPosE", _pct, "%", 0, 100, "{:.0f}", "Accelerator pedal position E"),
+    ("4B", 1, "AcceleratorPosF", _pct, "%", 0, 100, "{:.0f}", "Accelerator pedal position F"),
+    ("4C", 1, "ThrottleActuator", _pct, "%", 0, 100, "{:.0f}", "Commanded throttle actuator"),
+    ("4D", 2, "TimeWithMIL", _word, "min", 0, 65535, "{:.0f}", "Time run with MIL on"),
+    ("4E", 2, "TimeSinceClear", _word, "min", 0, 65535, "{:.0f}", "Time since trouble codes cleared"),
+    ("50", 4, "MaxMAF", lambda v: v[0] * 10, "g/s", 0, 2550, "{:.0f}", "Maximum value for mass air flow rate"),
+    ("52", 1, "EthanolPercent", _pct, "%", 0, 100, "{:.0f}", "Ethanol fuel %"),
+    ("53", 2, "EvapVaporPressureAbs", _scaled_word(0.005), "kPa", 0, 327.675, "{:.3f}",
+     "Absolute evap. system vapor pressure"),
+    ("54", 2, "EvapVaporPressureAlt", _signed_word, "Pa", -32768, 32767, "{:.0f}", "Evap. system vapor pressure"),
+    ("55", 2, "ShortO2Trim13", _trim, "%", -100, 99.2, "{:.1f}", "Short term secondary O2 trim, bank 1 and 3"),
+    ("56", 2, "LongO2Trim13", _trim, "%", -100, 99.2, "{:.1f}", "Long term secondary O2 trim, bank 1 and 3"),
+    ("57", 2, "ShortO2Trim24", _trim, "%", -100, 99.2, "{:.1f}", "Short term secondary O2 trim, bank 2 and 4"),
+    ("58", 2, "LongO2Trim24", _trim, "%", -100, 99.2, "{:.1f}", "Long term secondary O2 trim, bank 2 and 4"),
+    ("59", 2, "FuelRailPressureAbs", _scaled_word(10), "kPa", 0, 655350, "{:.0f}", "Fuel rail absolute pressure"),
+    ("5A", 1, "RelativeAcceleratorPos", _pct, "%", 0, 100, "{:.0f}", "Relative accelerator pedal position"),
+    ("5B", 1, "HybridBatteryLife", _pct, "%", 0, 100, "{:.0f}", "Hybrid battery pack remaining life"),
+    ("5C", 1, "OilTemp", _temp, "°C", -40, 210, "{:.0f}", "Engine oil temperature"),
+    ("5D", 2, "InjectionTiming", _scaled_word(1.0 / 128.0, -210), "°", -210, 301.992, "{:.2f}", "Fuel injection timing"),
+    ("5E", 2, "FuelRate", _scaled_word(0.05), "L/h", 0, 3276.75, "{:.2f}", "Engine fuel rate"),
+    ("61", 1, "DemandTorque", _torque, "%", -125, 130, "{:.0f}", "Driver's demand engine - percent torque"),
+    ("62", 1, "ActualTorque", _torque, "%", -125, 130, "{:.0f}", "Actual engine - percent torque"),
+    ("63", 2, "ReferenceTorque", _word, "Nm", 0, 65535, "{:.0f}", "Engine reference torque"),
+    ("64", 5, "TorqueIdle", _torque, "%", -125, 130, "{:.0f}", "Engine percent torque data (idle)"),
+    ("66", 5, "MAFSensorA", lambda v: (v[1] * 256 + v[2]) / 32.0, "g/s", 0, 2047.97, "{:.2f}", "Mass air flow sensor A"),
+    ("67", 3, "CoolantTempSensor1", lambda v: v[1] - 40, "°C", -40, 215, "{:.0f}", "Engine coolant temperature sensor 1"),
+    ("68", 3, "IntakeTempSensor1", lambda v: v[1] - 40, "°C", -40, 215, "{:.0f}", "Intake air temperature sensor 1"),
+    ("84", 1, "ManifoldSurfaceTemp", _temp, "°C", -40, 215, "{:.0f}", "Manifold surface temperature"),
+    ("8D", 1, "ThrottlePosG", _pct, "%", 0, 100, "{:.0f}", "Throttle position G"),
+    ("8E", 1, "FrictionTorque", _torque, "%", -125, 130, "{:.0f}", "Engine friction - percent torque"),
+    ("9E", 2, "ExhaustFlowRate", _scaled_word(0.2), "kg/h", 0, 13107, "{:.1f}", "Engine exhaust flow rate"),
+    ("A2", 2, "CylinderFuelRate", _scaled_word(1.0 / 32.0), "mg/stroke", 0, 2047.97, "{:.2f}", "Cylinder fuel rate"),
+    ("A4", 4, "TransmissionGearRatio", lambda v: (v[2] * 256 + v[3]) / 1000.0, "", 0, 65.535, "{:.3f}",
+     "Transmission actual gear ratio"),
+    ("A5", 4, "DEFDosing", lambda v: v[1] / 2.0, "%", 0, 127.5, "{:.1f}", "Commanded diesel exhaust fluid dosing"),
+    ("A6", 4, "Odometer", lambda v: _raw(v) / 10.0, "km", 0, 429496729.5, "{:.1f}", "Odometer"),
+]
+
+# O2 sensors 1-8: voltage in the first byte, wide band ones as equivalence ratio
+_VALUES += [(f"{0x14 + n:02X}", 2, f"O2Sensor{n + 1}Voltage", _o2_voltage, "V", 0, 1.275, "{:.3f}",
+             f"Oxygen sensor {n + 1} voltage") for n in range(8)]
+_VALUES += [(f"{0x24 + n:02X}", 4, f"O2Sensor{n + 1}Lambda", _lambda_ratio, "", 0, 2, "{:.3f}",
+             f"Oxygen sensor {n + 1} air-fuel equivalence ratio (voltage)") for n in range(8)]
+_VALUES += [(f"{0x34 + n:02X}", 4, f"O2Sensor{n + 1}LambdaCurrent", _lambda_ratio, "", 0, 2, "{:.3f}",
+             f"Oxygen sensor {n + 1} air-fuel equivalence ratio (current)") for n in range(8)]
+
+# pid, length, name, description - decoded to the raw integer, shown as hex
+_BIT_ENCODED = [
+    ("01", 4, "MonitorStatus", "Monitor status since DTCs cleared"),
+    ("02", 2, "FreezeDTC", "DTC that caused freeze frame"),
+    ("03", 2, "FuelSystemStatus", "Fuel system status"),
+    ("12", 1, "SecondaryAirStatus", "Commanded secondary air status"),
+    ("13", 1, "O2SensorsPresent2", "Oxygen sensors present (2 banks)"),
+    ("1C", 1, "OBDStandard", "OBD standards this vehicle conforms to"),
+    ("1D", 1, "O2SensorsPresent4", "Oxygen sensors present (4 banks)"),
+    ("1E", 1, "AuxInputStatus", "Auxiliary input status"),
+    ("41", 4, "MonitorStatusCycle", "Monitor status this drive cycle"),
+    ("4F", 4, "MaxValues", "Maximum equivalence ratio, O2 voltage, O2 current and intake pressure"),
+    ("51", 1, "FuelType", "Fuel type"),
+    ("5F", 1, "EmissionRequirements", "Emission requirements to which vehicle is designed"),
+    ("65", 2, "AuxInputOutput", "Auxiliary input / output supported"),
+    ("69", 7, "EGRData", "Commanded EGR and EGR error"),
+    ("6A", 5, "DieselIntakeAirFlow", "Commanded diesel intake air flow control"),
+    ("6B", 5, "EGRTemp", "Exhaust gas recirculation temperature"),
+    ("6C", 5, "ThrottleActuatorControl", "Commanded throttle actuator control and position"),
+    ("6D", 11, "FuelPressureControl", "Fuel pressure control system"),
+    ("6E", 9, "InjectionPressureControl", "Injection pressure control system"),
+    ("6F", 3, "TurboInletPressure", "Turbocharger compressor inlet pressure"),
+    ("70", 10, "BoostPressureControl", "Boost pressure control"),
+    ("71", 6, "VGTControl", "Variable geometry turbo control"),
+    ("72", 5, "WastegateControl", "Wastegate control"),
+    ("73", 5, "ExhaustPressure", "Exhaust pressure"),
+    ("74", 5, "TurboRPM", "Turbocharger RPM"),
+    ("75", 7, "TurboTempA", "Turbocharger temperature"),
+    ("76", 7, "TurboTempB", "Turbocharger temperature"),
+    ("77", 5, "ChargeAirCoolerTemp", "Charge air cooler temperature"),
+    ("78", 9, "EGTBank1", "Exhaust gas temperature, bank 1"),
+    ("79", 9, "EGTBank2", "Exhaust gas temperature, bank 2"),
+    ("7A", 7, "DPFPressure1", "Diesel particulate filter differential pressure"),
+    ("7B", 7, "DPFPressure2", "Diesel particulate filter"),
+    ("7C", 9, "DPFTemp", "Diesel particulate filter temperature"),
+    ("7D", 1, "NOxNTEStatus", "NOx NTE control area status"),
+    ("7E", 1, "PMNTEStatus", "PM NTE control area status"),
+    ("7F", 13, "EngineRunTime", "Engine run time"),
+    ("81", 21, "AECDRunTime1", "Engine run time for AECD #1-#5"),
+    ("82", 21, "AECDRunTime2", "Engine run time for AECD #6-#10"),
+    ("83", 5, "NOxSensor", "NOx sensor"),
+    ("85", 10, "NOxReagent", "NOx reagent system"),
+    ("86", 5, "PMSensor", "Particulate matter sensor"),
+    ("87", 5, "IntakePressureSensors", "Intake manifold absolute pressure"),
+    ("88", 13, "SCRInducement", "SCR induce system"),
+    ("89", 41, "AECDRunTime3", "Run time for AECD #11-#15"),
+    ("8A", 41, "AECDRunTime4", "Run time for AECD #16-#20"),
+    ("8B", 7, "DieselAftertreatment", "Diesel aftertreatment"),
+    ("8C", 17, "O2SensorWide", "O2 sensor (wide range)"),
+    ("8F", 7, "PMSensorBanks", "PM sensor, bank 1 and 2"),
+    ("90", 3, "WWHOBDInfo", "WWH-OBD vehicle OBD system information"),
+    ("91", 5, "WWHOBDInfo2", "WWH-OBD vehicle OBD system information"),
+    ("92", 2, "FuelSystemControl", "Fuel system control"),
+    ("93", 3, "WWHOBDCounters", "WWH-OBD vehicle OBD counters support"),
+    ("94", 12, "NOxWarning", "NOx warning and inducement system"),
+    ("98", 9, "EGTSensor1", "Exhaust gas temperature sensor"),
+    ("99", 9, "EGTSensor2", "Exhaust gas temperature sensor"),
+    ("9A", 6, "HybridBattery", "Hybrid/EV vehicle system data, battery, voltage"),
+    ("9B", 4, "DEFSensor", "Diesel exhaust fluid sensor data"),
+    ("9C", 17, "O2SensorData", "O2 sensor data"),
+    ("9D", 4, "EngineFuelRate", "Engine fuel rate"),
+    ("9F", 9, "FuelSystemUse", "Fuel system percentage use"),
+    ("A1", 9, "NOxSensorCorrected", "NOx sensor corrected data"),
+    ("A3", 9, "EvapVaporPressureData", "Evap. system vapor pressure"),
+    ("A7", 4, "NOxConcentration34", "NOx sensor concentration sensors 3 and 4"),
+    ("A8", 4, "NOxCorrected34", "NOx sensor corrected concentration sensors 3 and 4"),
+    ("A9", 4, "ABSSwitch", "ABS disable switch state"),
+]
+_BIT_ENCODED += [(f"{base:02X}", 4, f"PIDsSupported{base + 1:02X}", f"PIDs supported [{base + 1:02X} - {base + 0x20:02X}]")
+                 for base in range(0x00, 0xE0, 0x20)]
+
+PIDS = {}
+for pid, length, name, formula, unit, minimum, maximum, fmt, description in _VALUES:
+    PIDS[pid] = o3DIAGPid(pid, name, length, formula, unit, minimum, maximum, fmt, description)
+for pid, length, name, description in _BIT_ENCODED:
+    PIDS[pid] = o3DIAGPid(pid, name, length, _raw, "", None, None, f"{{:0{length * 2}X}}", description)
+
+# Same entries indexed by the PID byte, for decoding straight from bytes
+PIDS_BY_BYTE = [None] * 256
+for entry in PIDS.values():
+    PIDS_BY_BYTE[int(entry.pid, 16)] = entry
@@ -0,0 +1,229 @@
+# o3DIAG - several adapters in one process
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# One o3DIAGSession per ELM327 (own communicator, queues, protocol state,
+# DTCs and live values), tagged with port and VIN. o3DIAGSessionManager
+# runs a whole workshop bay and gives a combined view plus throughput.
+# -------------------------------------------------
+
+import queue
+import threading
+import time
+
+from .communicator import (
+    INIT_ADVANCED_COMMANDS,
+    INIT_BASE_COMMANDS,
+    INIT_TEST_COMMANDS,
+    detect_protocol,
+    o3DIAGCommunicator,
+    o3DIAGPoller,
+    o3DIAGTimeoutCalibrator,
+)
+from .obd import (
+    CAN_PROTOCOLS,
+    build_pid_requests,
+    decode_vin,
+    extract_dtcs_from_lines,
+    split_multi_pid_response,
+)
+
+class o3DIAGSession:
+    def __init__(self, port: str, baudrate: int = 115200, log=print):
+        self.port = port
+        self.baudrate = baudrate
+        self.log = log
+        self.rx_queue = queue.Queue()
+        self.tx_queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.comm = o3DIAGCommunicator(port, baudrate, self.rx_queue, self.tx_queue, self.stop_event)
+        self.poller = None
+        self.can_protocol = None # None until ATDPN answered
+        self.vin = ""
+        self.dtcs = []
+        self.values = {} # pid -> (timestamp, data bytes), written by the poller
+        self.status = "new"
+        self.last_error = ""
+        self.started_at = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.status = "connected"
+        self.comm.start()
+
+    def stop(self):
+        self.stop_polling()
+        self.stop_event.set()
+        self.comm.join(timeout=2.0)
+        self.status = "closed"
+
+    def initialize(self, calibrate: bool = True):
+        for cmd in INIT_BASE_COMMANDS + INIT_ADVANCED_COMMANDS + INIT_TEST_COMMANDS:
+            try:
+                self.comm.request(cmd, 2.0).result()
+                self.log(f"[ OK ] {cmd}")
+            except TimeoutError:
+                self.log(f"[ WARN ] {cmd} failed or no response")
+        protocol = detect_protocol(self.comm)
+        self.can_protocol = protocol in CAN_PROTOCOLS if protocol else None
+        self.log(f"[ OK ] Protocol {protocol or '?'}{' (CAN)' if self.can_protocol else ''}")
+        if calibrate:
+            calibrator = o3DIAGTimeoutCalibrator(self.comm, self.log)
+            if calibrator.calibrate() is not None:
+                self.comm.response_listeners.append(calibrator.observe)
+        self.status = "ready"
+
+    def read_vin(self) -> str:
+        try:
+            self.vin = decode_vin(self.comm.request("0902", 5.0).result().lines)
+        except TimeoutError:
+            self.vin = ""
+        return self.vin
+
+    def read_dtcs(self):
+        self.dtcs = extract_dtcs_from_lines(self.comm.request("03", 5.0).result().lines, can=self.can_protocol)
+        return self.dtcs
+
+    def snapshot(self, pids):
+        values = {}
+        for cmd in build_pid_requests(pids, batch=self.can_protocol):
+            try:
+                values.update(split_multi_pid_response(self.comm.request(cmd).result().lines))
+            except TimeoutError:
+                pass
+        stamp = time.time()
+        for pid, data in values.items():
+            self.values[pid] = (stamp, data)
+        return values
+
+    def start_polling(self, rates, on_sample=None):
+        def sample(pid, data, ts):
+            self.values[pid] = (time.time(), data)
+            if on_sample:
+                on_sample(self, pid, data, ts)
+        self.poller = o3DIAGPoller(self.comm, rates, sample, batch=self.can_protocol)
+        self.poller.start()
+
+    def stop_polling(self):
+        if self.poller:
+            self.poller.stop()
+            self.poller.join(timeout=2.0)
+
+    def update(self):
+        # Drain rx_queue: unsolicited lines are dropped, errors and close kept
+        while True:
+            try:
+                kind, payload = self.rx_queue.get_nowait()
+            except queue.Empty:
+                return
+            if kind == "__ERROR__":
+                self.last_error = payload
+                self.status = "error"
+            elif kind == "__CLOSED__":
+                self.status = "closed"
+
+    def throughput(self) -> float:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return self.comm.responses / elapsed if elapsed > 0 else 0.0
+
+class o3DIAGSessionManager:
+    def __init__(self, log=print):
+        self.log = log
+        self.sessions = {} # port -> o3DIAGSession
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_all()
+        return False
+
+    def add(self, port: str, baudrate: int = 115200) -> o3DIAGSession:
+        session = o3DIAGSession(port, baudrate, lambda text, port=port: self.log(f"[{port}] {text}"))
+        self.sessions[port] = session
+        return session
+
+    def start_all(self, calibrate: bool = True):
+        # Adapters are independent, so bring them up side by side
+        def bring_up(session):
+            try:
+                session.start()
+                session.initialize(calibrate)
+                session.read_vin()
+            except Exception as e:
+                session.status = "error"
+                session.last_error = str(e)
+        workers = [threading.Thread(target=bring_up, args=(s,), daemon=True) for s in self.sessions.values()]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+    def for_each(self, func):
+        # Run func(session) on every ready session in parallel -> {port: result or exception}
+        results = {}
+        def run(session):
+            try:
+                results[session.port] = func(session)
+            except Exception as e:
+                results[session.port] = e
+        workers = [threading.Thread(target=run, args=(s,), daemon=True)
+                   for s in self.sessions.values() if s.status == "ready"]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return results
+
+    def read_dtcs_all(self):
+        return self.for_each(lambda s: s.read_dtcs())
+
+    def start_polling_all(self, rates, on_sample=None):
+        for session in self.sessions.values():
+            if session.status == "ready":
+                session.start_polling(rates, on_sample)
+
+    def stop_all(self):
+        for session in self.sessions.values():
+            session.stop()
+
+    def view(self):
+        # Combined view, one row per adapter
+        rows = []
+        for session in self.sessions.values():
+            session.update()
+            rows.append({
+                "port": session.port,
+                "vin": session.vin,
+                "status": session.status,
+                "dtcs": list(session.dtcs),
+                "values": dict(session.values),
+                "responses": session.comm.responses,
+                "timeouts": session.comm.timeouts,
+                "rate": session.throughput(),
+                "error": session.last_error,
+            })
+        return rows
+
+    def totals(self):
+        # Aggregate throughput counters over all sessions
+        rows = self.view()
+        return {
+            "sessions": len(rows),
+            "ready": sum(1 for r in rows if r["status"] == "ready"),
+            "responses": sum(r["responses"] for r in rows),
+            "timeouts": sum(r["timeouts"] for r in rows),
+            "rate": sum(r["rate"] for r in rows),
+        }
@@ -0,0 +1,468 @@
+# o3DIAG - ELM327 simulator
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+# Stands in for an ELM327 and a vehicle, so o3DIAG can be tested and
+# benchmarked without a car. Speaks the AT commands o3DIAG uses plus
+# Modes 01/03/04/07/09, with configurable latency, SEARCHING... delay,
+# several ECUs and injected errors.
+#
+#   sim = o3DIAGSimulator(latency=0.005)
+#   port = sim.start_pty()                  # Linux: "/dev/pts/N"
+#   url = sim.start_tcp()                   # "socket://127.0.0.1:NNNNN"
+#   comm = o3DIAGCommunicator(port or url, 115200, rx, tx, stop)
+#
+# or from the shell: python -m o3diag simulate --tcp 35000
+# -------------------------------------------------
+
+import math
+import os
+import random
+import socket
+import threading
+import time
+
+try:
+    import tty # pty transport, not on Windows
+except ImportError:
+    tty = None
+
+from .obd import CAN_PROTOCOLS
+
+PROTOCOL_NAMES = {
+    "1": "SAE J1850 PWM", "2": "SAE J1850 VPW", "3": "ISO 9141-2", "4": "ISO 14230-4 (KWP 5BAUD)",
+    "5": "ISO 14230-4 (KWP FAST)", "6": "ISO 15765-4 (CAN 11/500)", "7": "ISO 15765-4 (CAN 29/500)",
+    "8": "ISO 15765-4 (CAN 11/250)", "9": "ISO 15765-4 (CAN 29/250)",
+}
+
+def _u16(value: float):
+    value = max(0, min(0xFFFF, int(value)))
+    return [value >> 8, value & 0xFF]
+
+def default_engine_pids():
+    # Mode 01 data of a warm petrol engine idling/cruising, as functions of time
+    return {
+        "01": lambda t: [0x00, 0x07, 0xE5, 0x00],
+        "03": lambda t: [0x02, 0x00],
+        "04": lambda t: [int(64 + 40 * math.sin(t / 3))],
+        "05": lambda t: [min(0xFF, 40 + 60 + int(t / 10) % 30)],
+        "06": lambda t: [0x80],
+        "07": lambda t: [0x7E],
+        "0B": lambda t: [int(35 + 20 * math.sin(t / 3))],
+        "0C": lambda t: _u16((1800 + 1000 * math.sin(t)) * 4),
+        "0D": lambda t: [int(50 + 30 * math.sin(t / 5))],
+        "0E": lambda t: [0x8A],
+        "0F": lambda t: [40 + 25],
+        "10": lambda t: _u16((8 + 4 * math.sin(t)) * 100),
+        "11": lambda t: [int(40 + 30 * math.sin(t))],
+        "1C": lambda t: [0x01],
+        "1F": lambda t: _u16(t),
+        "21": lambda t: [0x00, 0x00],
+        "2F": lambda t: [0xA0],
+        "33": lambda t: [101],
+        "42": lambda t: _u16(13800 + 300 * math.sin(t / 7)),
+        "46": lambda t: [40 + 18],
+        "5C": lambda t: [40 + 95],
+    }
+
+def default_transmission_pids():
+    # Second ECU: only answers speed, so 010D gets two answers
+    return {"0D": lambda t: [int(50 + 30 * math.sin(t / 5))]}
+
+def encode_dtc(code: str):
+    group = "PCBU".index(code[0].upper())
+    a = (group << 6) | (int(code[1], 16) << 4) | int(code[2], 16)
+    return [a, int(code[3:5], 16)]
+
+class o3DIAGSimulatedECU:
+    def __init__(self, header: str, pids, dtcs=(), pending_dtcs=(), vin: str = "", name: str = ""):
+        self.header = header # CAN id with ATH1, e.g. "7E8"
+        self.pids = dict(pids)
+        self.dtcs = list(dtcs)
+        self.pending_dtcs = list(pending_dtcs)
+        self.vin = vin
+        self.name = name
+
+    def support_bitmap(self, base: int):
+        mask = 0
+        for pid in self.pids:
+            n = int(pid, 16)
+            if base < n <= base + 0x20:
+                mask |= 1 << (base + 0x20 - n)
+        if any(int(pid, 16) > base + 0x20 for pid in self.pids):
+            mask |= 1 # next range available
+        return [(mask >> s) & 0xFF for s in (24, 16, 8, 0)]
+
+    def answer(self, mode: int, pids, t: float, can: bool):
+        # -> payload bytes (without headers), or None if this ECU stays silent
+        if mode == 0x01:
+            out = [0x41]
+            for pid in pids:
+                n = int(pid, 16)
+                if n % 0x20 == 0:
+                    bitmap = self.support_bitmap(n)
+                    if n and not any(bitmap) and pid not in self.pids:
+                        continue
+                    out += [n] + bitmap
+                elif pid in self.pids:
+                    out += [n] + self.pids[pid](t)
+            return out if len(out) > 1 else None
+        if mode in (0x03, 0x07):
+            codes = self.dtcs if mode == 0x03 else self.pending_dtcs
+            if not codes and self.header != "7E8":
+                return None
+            out = [0x40 + mode]
+            if can:
+                out.append(len(codes))
+            for code in codes:
+                out += encode_dtc(code)
+            return out
+        if mode == 0x04:
+            self.dtcs = []
+            self.pending_dtcs = []
+            return [0x44]
+        if mode == 0x09 and pids:
+            if pids[0] == "00":
+                return [0x49, 0x00, 0x54, 0x40, 0x00, 0x00] if self.vin else None
+            if pids[0] == "02" and self.vin:
+                return [0x49, 0x02, 0x01] + [ord(c) for c in self.vin[:17]]
+            if pids[0] == "0A" and self.name:
+                return [0x49, 0x0A, 0x01] + [ord(c) for c in self.name[:20].ljust(20, "\0")]
+        return None
+
+class o3DIAGSimulator:
+    VERSION = "ELM327 v1.5"
+
+    def __init__(self, latency: float = 0.005, search_delay: float = 0.0, ecus=None,
+                 protocol: str = "6", errors=None, adaptive_wait: float = 0.020,
+                 monitor_rate: float = 1000.0, seed=None):
+        # latency: seconds per ECU answer; search_delay: SEARCHING... after
+        # ATZ/ATSP0; errors: {"NO DATA": 0.02, "CAN ERROR": 0.01,
+        # "NO PROMPT": 0.01, ...} probabilities per OBD request;
+        # adaptive_wait: how long ATAT1 listens for more ECUs (ATAT0: ATST)
+        self.latency = latency
+        self.search_delay = search_delay
+        self.protocol = protocol
+        self.errors = dict(errors or {})
+        self.adaptive_wait = adaptive_wait
+        self.monitor_rate = monitor_rate
+        self.random = random.Random(seed)
+        if ecus is None:
+            ecus = [
+                o3DIAGSimulatedECU("7E8", default_engine_pids(), dtcs=["P0133", "P0420"],
+                                   pending_dtcs=["P0171"], vin="1G1JC5444R7252367", name="ECM-EngineControl"),
+                o3DIAGSimulatedECU("7E9", default_transmission_pids()),
+            ]
+        self.ecus = ecus
+        self.started = time.monotonic()
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.server = None
+        self.fds = ()
+        self.requests = 0
+        self.reset()
+
+    # -- adapter state -------------------------------------------------
+
+    def reset(self):
+        self.echo = True
+        self.linefeeds = False
+        self.headers = False
+        self.spaces = True
+        self.adaptive = 1
+        self.st = 0x32 # ~200 ms like a fresh ELM327
+        self.searching = True
+        self.last = ""
+
+    @property
+    def can(self) -> bool:
+        return self.protocol in CAN_PROTOCOLS
+
+    def eol(self) -> str:
+        return "\r\n" if self.linefeeds else "\r"
+
+    def hexline(self, values) -> str:
+        return (" " if self.spaces else "").join(f"{v:02X}" for v in values)
+
+    def frame_lines(self, ecu, payload):
+        # Format one ECU answer the way the adapter prints it
+        if not self.can:
+            messages = [payload]
+            if payload[0] in (0x43, 0x47):
+                # K-line / J1850: 3 codes per message, the last one padded with 00 00
+                codes = payload[1:]
+                messages = [[payload[0]] + (codes[i:i + 6] + [0] * 6)[:6] for i in range(0, max(len(codes), 1), 6)]
+            if self.headers:
+                bodies = [[0x48, 0x6B, 0x10] + message for message in messages]
+                return [self.hexline(body + [sum(body) & 0xFF]) for body in bodies]
+            return [self.hexline(message) for message in messages]
+        if len(payload) <= 7:
+            return [(ecu.header + " " + self.hexline([len(payload)] + payload)) if self.headers
+                    else self.hexline(payload)]
+        # ISO-TP: first frame with 6 bytes, then consecutive frames with 7
+        chunks = [payload[:6]] + [payload[i:i + 7] for i in range(6, len(payload), 7)]
+        if self.headers:
+            lines = [ecu.header + " " + self.hexline([0x10 | (len(payload) >> 8), len(payload) & 0xFF] + chunks[0])]
+            for n, chunk in enumerate(chunks[1:], start=1):
+                lines.append(ecu.header + " " + self.hexline([0x20 | (n & 0x0F)] + chunk))
+            return lines
+        lines = [f"{len(payload):03X}"]
+        for n, chunk in enumerate(chunks):
+            lines.append(f"{n & 0x0F:X}: " + self.hexline(chunk))
+        return lines
+
+    # -- command handling ----------------------------------------------
+
+    def handle(self, raw: str, write, interrupted=lambda: False) -> bool:
+        # Process one command line and write the answer, prompt included.
+        # Returns True if it was ATMA, which ran until interrupted().
+        cmd = raw.strip().replace(" ", "").upper()
+        if self.echo:
+            write(raw.strip() + self.eol())
+        if not cmd:
+            cmd = self.last # bare CR repeats the last command
+            if not cmd:
+                write(self.eol() + ">")
+                return False
+        self.last = cmd
+        if cmd == "ATMA":
+            self.monitor(write, interrupted)
+            return True
+        if cmd.startswith("AT"):
+            write(self.at_command(cmd[2:]) + self.eol() + self.eol() + ">")
+        else:
+            self.obd_request(cmd, write)
+        return False
+
+    def at_command(self, at: str) -> str:
+        if at in ("Z", "WS"):
+            self.reset()
+            time.sleep(0.001)
+            return self.eol() + self.VERSION
+        if at == "D":
+            self.reset()
+            return "OK"
+        if at == "I":
+            return self.VERSION
+        if at == "@1":
+            return "o3DIAG ELM327 simulator"
+        if at == "RV":
+            return "13.8V"
+        if at == "DP":
+            return "AUTO, " + PROTOCOL_NAMES.get(self.protocol, self.protocol)
+        if at == "DPN":
+            return "A" + self.protocol
+        if at in ("E0", "E1"):
+            self.echo = at == "E1"
+        elif at in ("L0", "L1"):
+            self.linefeeds = at == "L1"
+        elif at in ("H0", "H1"):
+            self.headers = at == "H1"
+        elif at in ("S0", "S1"):
+            self.spaces = at == "S1"
+        elif at in ("AT0", "AT1", "AT2"):
+            self.adaptive = int(at[2])
+        elif at.startswith("ST") and len(at) == 4:
+            try:
+                self.st = int(at[2:], 16) or 0x32
+            except ValueError:
+                return "?"
+        elif at.startswith("SP") or at.startswith("TP"):
+            self.searching = True
+        elif at in ("AL", "NL", "CAF0", "CAF1", "M0", "M1"):
+            pass
+        else:
+            return "?"
+        return "OK"
+
+    def obd_request(self, cmd: str, write):
+        if len(cmd) < 2 or any(c not in "0123456789ABCDEF" for c in cmd):
+            write("?" + self.eol() + self.eol() + ">")
+            return
+        self.requests += 1
+        # Optional trailing response count ("010C1"): odd length after the mode
+        expected = None
+        if len(cmd) % 2 == 1:
+            expected = int(cmd[-1], 16)
+            cmd = cmd[:-1]
+        mode = int(cmd[:2], 16)
+        pids = [cmd[i:i + 2] for i in range(2, len(cmd), 2)]
+        if mode == 0x01 and (not pids or len(pids) > 6):
+            write("?" + self.eol() + self.eol() + ">")
+            return
+        if mode == 0x01 and not self.can:
+            pids = pids[:1] # multi-PID requests are a CAN feature
+        lines = []
+        if self.searching:
+            lines.append("SEARCHING...")
+            if self.search_delay:
+                time.sleep(self.search_delay)
+            self.searching = False
+        error = self.injected_error()
+        if error == "NO PROMPT":
+            return # adapter hangs, the host has to time out
+        answers = 0
+        t = time.monotonic() - self.started
+        if error is None:
+            for ecu in self.ecus:
+                payload = ecu.answer(mode, pids, t, self.can)
+                if payload is None:
+                    continue
+                if self.latency:
+                    time.sleep(self.latency)
+                lines += self.frame_lines(ecu, payload)
+                answers += 1
+                if expected and answers >= expected:
+                    break
+        if expected is None or answers < expected:
+            # Listen for more ECUs: ATST, or the adaptive estimate with ATAT1/2
+            wait = self.st * 0.004096
+            if self.adaptive:
+                wait = min(wait, self.adaptive_wait)
+            time.sleep(wait)
+        if error:
+            lines.append(error)
+        elif not answers:
+            lines.append("NO DATA")
+        write(self.eol().join(lines) + self.eol() + self.eol() + ">")
+
+    def injected_error(self):
+        for text, probability in self.errors.items():
+            if self.random.random() < probability:
+                return text
+        return None
+
+    def monitor(self, write, interrupted):
+        # ATMA: stream CAN frames until the host sends anything. Frames that
+        # are due go out in one write, like the adapter's UART buffer.
+        t0 = time.monotonic()
+        sent = 0
+        ecu = self.ecus[0]
+        pids = [pid for pid in ecu.pids if int(pid, 16) % 0x20]
+        while not interrupted() and not self.stop_event.is_set():
+            now = time.monotonic()
+            due = min(int((now - t0) * self.monitor_rate) - sent, 1000)
+            if due <= 0:
+                time.sleep(min(0.001, 1.0 / self.monitor_rate))
+                continue
+            lines = []
+            for n in range(sent, sent + due):
+                pid = pids[n % len(pids)]
+                payload = [0x41, int(pid, 16)] + ecu.pids[pid](now - self.started)
+                lines.append(self.frame_lines(ecu, payload)[0])
+            write(self.eol().join(lines) + self.eol())
+            sent += due
+        write("STOPPED" + self.eol() + self.eol() + ">")
+
+    # -- transports ----------------------------------------------------
+
+    def serve(self, read, write):
+        # read() -> bytes, None for "nothing yet", b"" once the host is gone
+        pending = bytearray()
+        received = threading.Event()
+        closed = threading.Event()
+
+        def reader():
+            while not self.stop_event.is_set():
+                data = read()
+                if data is None:
+                    continue
+                if not data:
+                    break
+                pending.extend(data)
+                received.set()
+            closed.set()
+            received.set()
+
+        threading.Thread(target=reader, daemon=True).start()
+        out = lambda text: write(text.encode())
+        while not self.stop_event.is_set() and not closed.is_set():
+            if not received.wait(0.05):
+                continue
+            received.clear()
+            while b"\r" in pending:
+                idx = pending.index(b"\r")
+                line = bytes(pending[:idx]).decode(errors="ignore")
+                del pending[:idx + 1]
+                try:
+                    if self.handle(line, out, received.is_set):
+                        # whatever stopped ATMA is consumed, like on the real chip
+                        pending.clear()
+                        received.clear()
+                except OSError:
+                    return
+
+    def start_pty(self) -> str:
+        # Linux/macOS: returns the slave device to open like a real adapter
+        master, slave = os.openpty()
+        tty.setraw(slave) # no echo of our answers before the host opens the port
+        self.fds = (master, slave)
+
+        def read():
+            try:
+                return os.read(master, 1024)
+            except OSError:
+                return b""
+
+        def write(data):
+            os.write(master, data)
+
+        self.spawn(read, write)
+        return os.ttyname(slave)
+
+    def start_tcp(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        # Like a WiFi ELM327: returns a pyserial "socket://host:port" URL
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(1)
+        server.settimeout(0.2)
+        self.server = server
+
+        def accept_loop():
+            # One host at a time; after it disconnects the next one may connect
+            while not self.stop_event.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    return
+                conn.settimeout(0.2)
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+                def read(conn=conn):
+                    try:
+                        return conn.recv(1024)
+                    except socket.timeout:
+                        return None
+                    except OSError:
+                        return b""
+
+                self.reset()
+                self.serve(read, conn.sendall)
+                conn.close()
+
+        thread = threading.Thread(target=accept_loop, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        return f"socket://{host}:{server.getsockname()[1]}"
+
+    def spawn(self, read, write):
+        thread = threading.Thread(target=self.serve, args=(read, write), daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.close()
+        for fd in self.fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
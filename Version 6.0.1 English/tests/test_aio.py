@@ -0,0 +1,65 @@
+# o3DIAG - tests for o3diag.aio against the simulator
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+import asyncio
+
+import pytest
+
+from o3diag.aio import o3DIAGAsyncClient
+from o3diag.simulator import o3DIAGSimulator
+
+@pytest.fixture
+def simulator():
+    sim = o3DIAGSimulator(latency=0.0, adaptive_wait=0.005)
+    yield sim
+    sim.stop()
+
+def test_queries_get_their_own_answer(simulator):
+    async def run():
+        async with o3DIAGAsyncClient(simulator.start_tcp()) as client:
+            await client.initialize()
+            assert client.can_protocol is True
+            ati, speed = await asyncio.gather(client.query("ATI"), client.query("010D"))
+            assert ati.cmd == "ATI" and ati.lines == ["ELM327 v1.5"]
+            assert speed.cmd == "010D" and speed.lines[-1].startswith("41 0D")
+            assert await client.read_dtcs() == ["P0133", "P0420"]
+            values = await client.read_pids(["0C", "0D", "05"])
+            assert sorted(values) == ["05", "0C", "0D"]
+    asyncio.run(run())
+
+def test_query_without_prompt_times_out(simulator):
+    async def run():
+        async with o3DIAGAsyncClient(simulator.start_tcp()) as client:
+            await client.query("ATE0")
+            simulator.errors["NO PROMPT"] = 1.0
+            with pytest.raises(TimeoutError):
+                await client.query("010C", timeout=0.2)
+            simulator.errors.clear()
+            assert (await client.query("ATI")).lines == ["ELM327 v1.5"]
+    asyncio.run(run())
+
+def test_stream_and_legacy_dtcs():
+    simulator = o3DIAGSimulator(latency=0.0, adaptive_wait=0.005, protocol="3")
+    simulator.ecus[0].dtcs = ["P0133", "P0420", "P0171", "P0300"] # two 3-code messages
+
+    async def run():
+        async with o3DIAGAsyncClient(simulator.start_tcp()) as client:
+            await client.initialize()
+            assert client.can_protocol is False
+            assert await client.read_dtcs() == ["P0133", "P0420", "P0171", "P0300"]
+            samples = []
+            async for sample in client.stream({"0C": 20, "0D": 20}):
+                samples.append(sample)
+                if len(samples) == 6:
+                    break
+            assert {sample.pid for sample in samples} == {"0C", "0D"}
+    try:
+        asyncio.run(run())
+    finally:
+        simulator.stop()
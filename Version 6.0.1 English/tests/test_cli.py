@@ -0,0 +1,64 @@
+# o3DIAG - tests for o3diag.cli against the simulator
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+import pytest
+
+from o3diag import cli
+from o3diag.dtc_index import write_dtc_index
+from o3diag.simulator import o3DIAGSimulator
+
+DESCRIPTIONS = {"P0133": "O2 sensor slow response", "P0420": "Catalyst efficiency below threshold"}
+
+@pytest.fixture
+def codes(tmp_path):
+    path = str(tmp_path / "codes.o3idx")
+    write_dtc_index(path, DESCRIPTIONS.items())
+    return path
+
+def serve(protocol):
+    simulator = o3DIAGSimulator(latency=0.0, adaptive_wait=0.005, protocol=protocol)
+    return simulator, simulator.start_tcp()
+
+@pytest.mark.parametrize("protocol", ["6", "3"]) # CAN 11/500, ISO 9141-2
+def test_read_dtc(protocol, codes, capsys):
+    simulator, url = serve(protocol)
+    try:
+        assert cli.main(["read-dtc", "--port", url, "--o3script", codes]) == 0
+    finally:
+        simulator.stop()
+    assert capsys.readouterr().out.splitlines() == [f"{code} – {desc}" for code, desc in DESCRIPTIONS.items()]
+
+def test_poll_writes_csv(tmp_path):
+    simulator, url = serve("6")
+    output = tmp_path / "live.csv"
+    try:
+        assert cli.main(["poll", "--port", url, "--pid", "0C=20", "--duration", "0.5", "--output", str(output)]) == 0
+    finally:
+        simulator.stop()
+    rows = output.read_text(encoding="utf-8").splitlines()
+    assert rows[0] == "timestamp,pid,name,value,unit"
+    assert len(rows) > 2 and all(",0C," in row for row in rows[1:])
+
+def test_missing_port_is_one_panic_line(tmp_path, capsys):
+    assert cli.main(["read-dtc", "--port", str(tmp_path / "ttyUSB9"), "--o3script", str(tmp_path / "none.o3idx")]) == 1
+    err = capsys.readouterr().err
+    assert "[PANIC]" in err and "Traceback" not in err
+
+def test_index_command(tmp_path, codes, capsys):
+    source = tmp_path / "oem.o3script"
+    source.write_text("<o3script.START;READ>\nP1234\tOEM only\n<o3script.END;READ>\n", encoding="utf-8")
+    output = str(tmp_path / "all.o3idx")
+    assert cli.main(["index", codes, str(source), "--output", output]) == 0
+    simulator, url = serve("6")
+    simulator.ecus[0].dtcs = ["P1234", "P0420"]
+    try:
+        assert cli.main(["read-dtc", "--port", url, "--o3script", output]) == 0
+    finally:
+        simulator.stop()
+    assert capsys.readouterr().out.splitlines() == ["P1234 – OEM only", f"P0420 – {DESCRIPTIONS['P0420']}"]
@@ -0,0 +1,186 @@
+# o3DIAG - tests for o3diag.communicator
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+import queue
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from o3diag.communicator import (
+    o3DIAGCommunicator,
+    o3DIAGPoller,
+    o3DIAGRequest,
+    o3DIAGResponse,
+    o3DIAGSchedule,
+    o3DIAGTimeoutCalibrator,
+)
+from o3diag.simulator import o3DIAGSimulator
+
+@pytest.fixture
+def simulator():
+    sim = o3DIAGSimulator(latency=0.0, adaptive_wait=0.005)
+    yield sim
+    sim.stop()
+
+@pytest.fixture
+def communicator(simulator):
+    stop = threading.Event()
+    comm = o3DIAGCommunicator(simulator.start_tcp(), 115200, queue.Queue(), queue.Queue(), stop)
+    comm.start()
+    yield comm
+    stop.set()
+    comm.join(timeout=2.0)
+
+def test_each_future_gets_the_lines_before_its_prompt(communicator):
+    communicator.request("ATE0").result(timeout=2.0)
+    futures = [communicator.request(cmd) for cmd in ("ATI", "0100", "ATDPN", "010D")]
+    ati, bitmap, protocol, speed = [future.result(timeout=2.0) for future in futures]
+    assert ati.cmd == "ATI" and ati.lines[0] == "ELM327 v1.5"
+    assert bitmap.cmd == "0100" and all(line.startswith("41 00") for line in bitmap.lines[1:])
+    assert protocol.lines == ["A6"]
+    assert speed.cmd == "010D" and speed.lines[-1].startswith("41 0D")
+
+def test_request_without_prompt_times_out_alone(simulator, communicator):
+    communicator.request("ATE0").result(timeout=2.0)
+    simulator.errors["NO PROMPT"] = 1.0
+    hanging = communicator.request("010C", timeout=0.2)
+    with pytest.raises(TimeoutError):
+        hanging.result(timeout=2.0)
+    simulator.errors.clear()
+    response = communicator.request("ATI").result(timeout=2.0)
+    assert response.lines == ["ELM327 v1.5"] # nothing left over from 010C
+    assert communicator.timeouts == 1
+
+class UnpluggedAdapter:
+    # Answers 0100, then the serial port is gone
+    count_suffix = True
+
+    def __init__(self):
+        self.sent = []
+
+    def request(self, cmd, timeout):
+        self.sent.append(cmd)
+        future = Future()
+        if cmd == "0100":
+            future.set_result(o3DIAGResponse(cmd, ["41 00 BE 1F A8 13"], 0.05))
+        else:
+            future.set_exception(ConnectionError("Serial closed"))
+        return future
+
+def test_calibration_stops_when_the_adapter_is_gone():
+    adapter = UnpluggedAdapter()
+    calibrator = o3DIAGTimeoutCalibrator(adapter, log=lambda text: None)
+    assert calibrator.calibrate() is None
+    assert calibrator.value == 0xFF and not calibrator.enabled
+    assert adapter.sent == ["0100", "01031"] # no further PIDs, no ATST
+
+class OldFirmware:
+    # No response count suffix: "01031" is answered with "?"
+    def __init__(self):
+        self.count_suffix = True
+        self.sent = []
+
+    def request(self, cmd, timeout):
+        self.sent.append(cmd)
+        future = Future()
+        if cmd == "0100":
+            future.set_result(o3DIAGResponse(cmd, ["41 00 BE 1F A8 13"], 0.05))
+        elif cmd.startswith("01") and cmd.endswith("1"):
+            future.set_result(o3DIAGResponse(cmd, ["?"], 0.01))
+        else:
+            future.set_result(o3DIAGResponse(cmd, ["41 04 80"], 1.05)) # waited out ATSTFF
+        return future
+
+def test_calibration_does_not_measure_without_count_suffix():
+    adapter = OldFirmware()
+    calibrator = o3DIAGTimeoutCalibrator(adapter, log=lambda text: None)
+    assert calibrator.calibrate() is None
+    assert calibrator.value == 0xFF and not adapter.count_suffix
+    assert adapter.sent == ["0100", "01031"]
+
+def answered(comm, cmd, lines):
+    # Run one finished request through the prompt handling, no adapter needed
+    req = o3DIAGRequest(cmd, 1.0, Future())
+    req.wire = comm.wire_command(cmd)
+    req.lines = lines
+    req.future.set_running_or_notify_cancel()
+    comm.pending = req
+    comm.on_prompt()
+    return req
+
+def test_response_count_only_for_single_ecu_pids():
+    comm = o3DIAGCommunicator("loop://", 115200, queue.Queue(), queue.Queue(), threading.Event())
+    assert comm.wire_command("010C") == "010C"
+    answered(comm, "010C", ["41 0C 1A F8"])
+    answered(comm, "0105", ["41 05 7B", "41 05 7C"]) # engine and transmission
+    answered(comm, "0100", ["41 00 BE 1F A8 13"]) # support bitmaps always wait for every ECU
+    answered(comm, "010C0D", ["41 0C 1A F8 0D 32"])
+    assert comm.single_ecu == {"010C"}
+    assert comm.wire_command("010C") == "010C1"
+    assert comm.wire_command("0105") == "0105"
+
+def test_no_data_with_count_forgets_the_pid():
+    comm = o3DIAGCommunicator("loop://", 115200, queue.Queue(), queue.Queue(), threading.Event())
+    answered(comm, "010C", ["41 0C 1A F8"])
+    req = answered(comm, "010C", ["NO DATA"])
+    assert req.wire == "010C1" and not req.retry
+    assert comm.wire_command("010C") == "010C"
+
+def test_rejected_count_suffix_is_resent_without_it():
+    comm = o3DIAGCommunicator("loop://", 115200, queue.Queue(), queue.Queue(), threading.Event())
+    answered(comm, "010C", ["41 0C 1A F8"])
+    req = answered(comm, "010C", ["?"])
+    assert req.retry and not req.future.done()
+    assert not comm.count_suffix and comm.wire_command("010C") == "010C"
+
+def test_simulator_sees_the_count_suffix(simulator, communicator):
+    communicator.request("ATE0").result(timeout=2.0)
+    communicator.request("010C").result(timeout=2.0)
+    response = communicator.request("010C").result(timeout=2.0)
+    assert simulator.last == "010C1"
+    assert response.cmd == "010C" and response.lines[-1].startswith("41 0C")
+
+def test_schedule_earliest_deadline_first():
+    schedule = o3DIAGSchedule({"0C": 10.0, "05": 0.5, "0D": 5.0}, limit=2, start=100.0)
+    assert schedule.due(100.0) == ["0C", "0D"] # same deadline: higher rate first
+    schedule.reschedule(100.0)
+    assert schedule.due(100.0) == ["05"]
+    schedule.reschedule(100.0)
+    assert schedule.wait_time(100.0) == pytest.approx(0.1)
+    assert schedule.due(100.05) == []
+
+def test_schedule_does_not_burst_after_a_stall():
+    schedule = o3DIAGSchedule({"0C": 10.0}, limit=6, start=100.0)
+    polls = []
+    for now in (100.0, 105.0, 105.0, 105.05, 105.1):
+        polls += schedule.due(now)
+        schedule.reschedule(now)
+    # 50 periods missed: polled again right away once, then every 0.1 s
+    assert len(polls) == 4 and schedule.wait_time(105.1) == pytest.approx(0.1)
+
+def test_poller_reaches_its_rates(communicator):
+    communicator.request("ATE0").result(timeout=2.0)
+    samples = []
+    poller = o3DIAGPoller(communicator, {"0C": 20, "05": 2, "0D": 0}, lambda pid, data, ts: samples.append(pid),
+                          batch=True)
+    poller.start()
+    threading.Event().wait(1.0)
+    poller.stop()
+    poller.join(timeout=2.0)
+    rates = poller.achieved_rates()
+    assert sorted(rates) == ["05", "0C"] # 0 Hz is not polled
+    assert rates["0C"][1] > 10 and samples.count("0C") > samples.count("05") >= 2
+    assert rates["0C"][2] == 0
+
+def test_round_trip_does_not_wait_for_a_poll_interval(communicator):
+    # The old loop slept 50-100 ms between reads; now a read returns with the bytes
+    communicator.request("ATE0").result(timeout=2.0)
+    elapsed = sorted(communicator.request("ATI").result(timeout=2.0).elapsed for _ in range(21))
+    assert elapsed[10] < communicator.IO_TIMEOUT * 0.8
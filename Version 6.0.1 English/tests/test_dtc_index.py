@@ -0,0 +1,77 @@
+# o3DIAG - tests for o3diag.dtc_index
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+import os
+
+import pytest
+
+from o3diag.dtc_index import build_dtc_index, load_dtc_index, o3DIAGDTCIndex, write_dtc_index
+
+ENTRIES = {"P0420": "Katalysator Wirkungsgrad zu gering", "P0100": "Mass air flow", "U0001": "CAN bus"}
+
+def write_list(path, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<o3script.START;READ>\n")
+        for code, desc in entries.items():
+            f.write(f"{code}\t{desc}\n")
+        f.write("<o3script.END;READ>\n")
+
+def test_index_round_trip(tmp_path):
+    path = str(tmp_path / "codes.o3idx")
+    write_dtc_index(path, ENTRIES.items(), (12, 34, b"\x01" * 32))
+    index = o3DIAGDTCIndex(path)
+    try:
+        assert len(index) == 3 and index.source == (12, 34, b"\x01" * 32)
+        assert dict(index.items()) == ENTRIES
+        assert [code for code, _ in index.items()] == ["P0100", "P0420", "U0001"]
+        assert index["p0420"] == ENTRIES["P0420"] and "U0001" in index
+        assert index.get("P9999") is None and index.get("Pä") is None and "C0000" not in index
+        with pytest.raises(KeyError):
+            index["P9999"]
+    finally:
+        index.close()
+
+def test_foreign_and_truncated_files_are_rejected(tmp_path):
+    path = tmp_path / "codes.o3idx"
+    path.write_bytes(b"not an index at all, but long enough for a header" * 2)
+    with pytest.raises(ValueError):
+        o3DIAGDTCIndex(str(path))
+    write_dtc_index(str(path), ENTRIES.items())
+    path.write_bytes(path.read_bytes()[:-40])
+    with pytest.raises(ValueError):
+        o3DIAGDTCIndex(str(path))
+    with pytest.raises(ValueError):
+        write_dtc_index(str(path), [("P01", "too short")])
+
+def test_list_is_indexed_once(tmp_path):
+    source, cache = tmp_path / "list.o3script", tmp_path / "cache"
+    write_list(source, ENTRIES)
+    index = load_dtc_index(str(source), str(cache))
+    assert isinstance(index, o3DIAGDTCIndex) and dict(index.items()) == ENTRIES
+    index.close()
+    built = os.stat(next(cache.glob("*.o3idx"))).st_mtime_ns
+    index = load_dtc_index(str(source), str(cache))
+    assert dict(index.items()) == ENTRIES
+    index.close()
+    assert os.stat(next(cache.glob("*.o3idx"))).st_mtime_ns == built
+    assert [p.suffix for p in cache.iterdir()] == [".o3idx"] # no marshal copy
+    write_list(source, {"P0100": "changed"})
+    index = load_dtc_index(str(source), str(cache))
+    assert dict(index.items()) == {"P0100": "changed"}
+    index.close()
+
+def test_build_merges_lists_in_order(tmp_path):
+    generic, oem = tmp_path / "generic.o3script", tmp_path / "oem.o3script"
+    write_list(generic, ENTRIES)
+    write_list(oem, {"P0100": "OEM text", "P1234": "OEM only"})
+    output = str(tmp_path / "all.o3idx")
+    assert build_dtc_index([str(generic), str(oem)], output) == 4
+    index = load_dtc_index(output)
+    assert index["P0100"] == "OEM text" and index["P1234"] == "OEM only" and index["P0420"] == ENTRIES["P0420"]
+    index.close()
@@ -0,0 +1,50 @@
+# o3DIAG - tests for o3diag.dtc_layers
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+from o3diag.dtc_layers import load_dtc_layers, split_list_name
+
+
+def write_list(path, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<o3script.START;READ>\n")
+        for code, desc in entries.items():
+            f.write(f"{code}\t{desc}\n")
+        f.write("<o3script.END;READ>\n")
+
+
+def test_only_known_suffixes_are_languages():
+    assert split_list_name("o3DIAG_Pcodes_list_english.o3script") == ("o3diag_pcodes_list", "english")
+    assert split_list_name("o3DIAG_pcodes_list_german.o3script") == ("o3diag_pcodes_list", "german")
+    assert split_list_name("my_overrides.o3script") == ("my_overrides", "english")
+    assert split_list_name("o3DIAG_VW_list.o3script") == ("o3diag_vw_list", "english")
+
+
+def test_override_without_language_wins(tmp_path):
+    write_list(tmp_path / "o3DIAG_Pcodes_list_english.o3script", {"P0100": "generic", "P0101": "generic"})
+    write_list(tmp_path / "o3DIAG_Pcodes_list_german.o3script", {"P0100": "generisch"})
+    write_list(tmp_path / "my_overrides.o3script", {"P0100": "override"})
+    layers = load_dtc_layers([str(tmp_path)], str(tmp_path / "cache"), "german")
+    assert layers.languages() == ["english", "german"]
+    assert layers.get("P0100") == "override"
+    assert layers.get("P0101") == "generic"
+    layers.set_language("english")
+    assert layers.get("P0100") == "override"
+
+
+def test_layers_are_one_mapped_index(tmp_path):
+    write_list(tmp_path / "o3DIAG_Pcodes_list_english.o3script", {"P0100": "generic", "P0101": "generic"})
+    write_list(tmp_path / "o3DIAG_Pcodes_list_german.o3script", {"P0100": "generisch", "P0102": "nur deutsch"})
+    layers = load_dtc_layers([str(tmp_path)], str(tmp_path / "cache"), "german")
+    assert layers.layered and layers.path.endswith(".o3idx")
+    assert dict(layers.items()) == {"P0100": "generisch", "P0101": "generic", "P0102": "nur deutsch"}
+    again = load_dtc_layers([str(tmp_path)], str(tmp_path / "cache"), "english")
+    assert again.path == layers.path
+    assert "P0102" not in again and len(again) == 2
+    in_memory = load_dtc_layers([str(tmp_path)], None, "german")
+    assert in_memory.path is None and in_memory.get("P0102") == "nur deutsch"
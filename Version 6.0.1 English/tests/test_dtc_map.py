@@ -0,0 +1,152 @@
+# o3DIAG - tests for o3diag.dtc_map
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+import os
+import threading
+import time
+
+from o3diag import dtc_map
+from o3diag.dtc_layers import load_dtc_layers
+from o3diag.dtc_map import cache_path, diff_dtc_maps, load_dtc_map, o3DIAGDTCCatalog, read_cache
+from o3diag.dtc_watch import o3DIAGFileWatcher
+
+
+def write_list(path, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<o3script.START;READ>\n")
+        for code, desc in entries.items():
+            f.write(f"{code}\t{desc}\n")
+        f.write("<o3script.END;READ>\n")
+
+
+def counting_parser(monkeypatch):
+    calls = []
+    parse = dtc_map.parse_o3script
+    monkeypatch.setattr(dtc_map, "parse_o3script", lambda path: calls.append(path) or parse(path))
+    return calls
+
+
+def test_cache_hit_skips_the_parser(tmp_path, monkeypatch):
+    source, cache = tmp_path / "list.o3script", str(tmp_path / "cache")
+    write_list(source, {"P0100": "Mass air flow", "P0133": "O2 sensor slow"})
+    calls = counting_parser(monkeypatch)
+    first = load_dtc_map(str(source), cache)
+    assert load_dtc_map(str(source), cache) == first == {"P0100": "Mass air flow", "P0133": "O2 sensor slow"}
+    assert len(calls) == 1
+    assert read_cache(cache_path(str(source), cache))[4] == first
+    assert load_dtc_map(str(source), None) == first and len(calls) == 2
+
+
+def test_stale_cache_is_rebuilt(tmp_path, monkeypatch):
+    source, cache = tmp_path / "list.o3script", str(tmp_path / "cache")
+    write_list(source, {"P0100": "old"})
+    calls = counting_parser(monkeypatch)
+    load_dtc_map(str(source), cache)
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9)) # touched, same content
+    assert load_dtc_map(str(source), cache) == {"P0100": "old"} and len(calls) == 1
+    write_list(source, {"P0100": "new", "P0200": "added"})
+    assert load_dtc_map(str(source), cache) == {"P0100": "new", "P0200": "added"}
+    assert len(calls) == 2
+
+
+def test_corrupt_cache_is_replaced(tmp_path, monkeypatch):
+    source, cache = tmp_path / "list.o3script", str(tmp_path / "cache")
+    write_list(source, {"P0100": "Mass air flow"})
+    load_dtc_map(str(source), cache)
+    target = cache_path(str(source), cache)
+    with open(target, "wb") as f:
+        f.write(b"\xe3 not marshal")
+    assert read_cache(target) is None
+    calls = counting_parser(monkeypatch)
+    assert load_dtc_map(str(source), cache) == {"P0100": "Mass air flow"} and len(calls) == 1
+    assert read_cache(target) is not None
+
+
+def test_list_added_to_a_watched_folder_is_loaded(tmp_path):
+    generic, local = tmp_path / "bundled", tmp_path / "local"
+    generic.mkdir()
+    local.mkdir()
+    write_list(generic / "o3DIAG_Pcodes_list_english.o3script", {"P0100": "generic"})
+    reloaded = threading.Event()
+    catalog = o3DIAGDTCCatalog(str(tmp_path / "cache"), loader=load_dtc_layers,
+                               on_loaded=lambda catalog: catalog.changes and reloaded.set())
+    catalog.load([str(generic), str(local)]).watch(0.1)
+    assert catalog.wait(5) and catalog.get("P0100") == "generic"
+    (local / "notes.txt").write_text("not a list")
+    write_list(local / "my_overrides.o3script", {"P0100": "override", "P0200": "new"})
+    assert reloaded.wait(5)
+    catalog.unwatch()
+    assert catalog.changes == (["P0200"], ["P0100"], [])
+    assert catalog.get("P0100") == "override"
+
+
+def test_diff_of_two_lists():
+    old = {"P0100": "Mass air flow", "P0133": "O2 sensor", "P0300": "Misfire"}
+    new = {"P0100": "Mass air flow", "P0133": "O2 sensor slow", "P0420": "Catalyst"}
+    assert diff_dtc_maps(old, new) == (["P0420"], ["P0133"], ["P0300"])
+    assert diff_dtc_maps(new, new) == ([], [], [])
+    assert diff_dtc_maps({}, old) == (["P0100", "P0133", "P0300"], [], [])
+
+
+def test_saved_list_is_reloaded(tmp_path):
+    source = tmp_path / "list.o3script"
+    write_list(source, {"P0100": "Mass air flow", "P0300": "Misfire"})
+    loads = []
+    catalog = o3DIAGDTCCatalog(str(tmp_path / "cache"), on_loaded=loads.append)
+    catalog.load(str(source)).watch(0.1)
+    assert catalog.wait(5) and catalog.get("P0300") == "Misfire"
+    write_list(source, {"P0100": "Mass air flow, bank 1", "P0420": "Catalyst"})
+    deadline = time.monotonic() + 5
+    while len(loads) < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert catalog.changes == (["P0420"], ["P0100"], ["P0300"])
+    # Saved again unchanged, then removed: the list stays as it is
+    os.utime(source)
+    time.sleep(0.6)
+    source.unlink()
+    time.sleep(0.6)
+    catalog.unwatch()
+    assert len(loads) == 2 and catalog.get("P0420") == "Catalyst"
+
+
+def test_watcher_falls_back_to_polling(tmp_path, monkeypatch):
+    source = tmp_path / "list.o3script"
+    write_list(source, {"P0100": "Mass air flow"})
+    monkeypatch.setattr(o3DIAGFileWatcher, "open_inotify", lambda self: None)
+    changed = threading.Event()
+    watcher = o3DIAGFileWatcher(str(source), changed.set, 0.05).start()
+    try:
+        assert watcher.mode == "poll"
+        write_list(source, {"P0100": "Mass air flow", "P0200": "Injector"})
+        assert changed.wait(5)
+    finally:
+        watcher.stop()
+
+
+def test_lookup_waits_for_the_worker():
+    release = threading.Event()
+
+    def slow_loader(path, cache_dir):
+        release.wait(5)
+        return {"P0100": "Mass air flow"}
+
+    catalog = o3DIAGDTCCatalog(None, loader=slow_loader).load("list.o3script")
+    assert not catalog.wait(0.05) and catalog.get("P0100", "missing", timeout=0.05) == "missing"
+    threading.Timer(0.1, release.set).start()
+    assert catalog.get("p0100") == "Mass air flow" and "P0100" in catalog and len(catalog) == 1
+
+
+def test_failed_load_is_empty_with_the_error(tmp_path):
+    loaded = []
+    catalog = o3DIAGDTCCatalog(str(tmp_path / "cache"), on_loaded=loaded.append)
+    catalog.load(str(tmp_path / "missing.o3script"))
+    assert catalog.wait(5) and catalog.get("P0100", "-") == "-"
+    catalog.thread.join(5)
+    assert isinstance(catalog.error, FileNotFoundError) and loaded == [catalog]
@@ -0,0 +1,53 @@
+# o3DIAG - tests for o3diag.export
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+import pytest
+
+from o3diag import export
+from o3diag.export import EXPORT_FOOTER, next_log_path, write_log_export
+from o3diag.logstore import o3DIAGLogStore
+
+def test_lines_then_empty_line_then_footer(tmp_path):
+    path = tmp_path / "log.txt"
+    assert write_log_export(["Request >>> 010C", "Response <<< 41 0C 1A F8"], str(path)) == 2
+    assert path.read_text(encoding="utf-8") == f"Request >>> 010C\nResponse <<< 41 0C 1A F8\n\n{EXPORT_FOOTER}\n"
+    assert write_log_export([], str(path)) == 0
+    assert path.read_text(encoding="utf-8") == f"\n{EXPORT_FOOTER}\n"
+
+def test_lines_are_written_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_LINES", 10)
+    path = tmp_path / "log.txt"
+    assert write_log_export((f"line {i}" for i in range(25)), str(path)) == 25
+    assert path.read_text(encoding="utf-8").split("\n")[:-3] == [f"line {i}" for i in range(25)]
+
+    def failing():
+        yield from (f"line {i}" for i in range(15))
+        raise RuntimeError("adapter gone")
+
+    with pytest.raises(RuntimeError):
+        write_log_export(failing(), str(path))
+    # Only the current chunk was held in memory, the first one is on disk
+    assert path.read_text(encoding="utf-8").split("\n")[:10] == [f"line {i}" for i in range(10)]
+
+def test_export_covers_the_spilled_history(tmp_path):
+    store = o3DIAGLogStore(max_records=50, history_dir=str(tmp_path / "history"))
+    store.TRIM = 20
+    for i in range(200):
+        store.add(f"line {i}", stamp=False)
+    assert store.spilled
+    path = tmp_path / "log.txt"
+    assert write_log_export(store.lines(), str(path)) == 200
+    assert path.read_text(encoding="utf-8").split("\n")[:200] == [f"line {i}" for i in range(200)]
+    store.close()
+
+def test_next_log_path_numbers_existing_logs(tmp_path):
+    first = next_log_path(logs_dir=str(tmp_path))
+    assert first.endswith("o3DIAG_OUTPUT_LOG.TXT")
+    open(first, "w").close()
+    assert next_log_path(logs_dir=str(tmp_path)).endswith("o3DIAG_OUTPUT_LOG_02.TXT")
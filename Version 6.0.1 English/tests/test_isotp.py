@@ -0,0 +1,51 @@
+# o3DIAG - tests for o3diag.isotp
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+from o3diag.isotp import assemble_messages, o3DIAGFrameAssembler
+from o3diag.obd import extract_dtcs_by_ecu
+
+MODE03 = bytes.fromhex("43 04 01 33 04 20 01 71 03 00")
+
+def test_multi_frame_without_headers():
+    lines = ["SEARCHING...", "00A", "0: 43 04 01 33 04 20", "1: 01 71 03 00 00 00 00", "43 01 07 00"]
+    assert assemble_messages(lines) == [("ECU1", MODE03), ("ECU2", bytes.fromhex("43 01 07 00"))]
+
+def test_multi_frame_with_headers_of_two_ecus():
+    lines = [
+        "7E8 10 0A 43 04 01 33 04 20",
+        "7E9 04 43 01 07 00",
+        "7E8 21 01 71 03 00 00 00 00",
+    ]
+    assert assemble_messages(lines) == [("7E9", bytes.fromhex("43 01 07 00")), ("7E8", MODE03)]
+
+def test_lines_as_bytes_and_unfinished_messages():
+    assembler = o3DIAGFrameAssembler()
+    for line in (b"7E8 10 0A 43 04 01 33 04 20", b"NO DATA", b""):
+        assembler.feed(line)
+    assert assembler.messages() == [("7E8", bytes.fromhex("43 04 01 33 04 20"))]
+
+def test_kline_header_and_checksum_are_stripped():
+    assert assemble_messages(["48 6B 10 43 01 33 04 20 00 00 5E"]) == [("10", bytes.fromhex("43 01 33 04 20 00 00"))]
+    # J1850 VPW with CRC
+    assert assemble_messages(["68 6B 10 43 01 71 00 00 00 00 FA"]) == [("10", bytes.fromhex("43 01 71 00 00 00 00"))]
+    # Wrong check byte: not a header, kept as it is
+    assert assemble_messages(["48 6B 10 43 01 33 04 20 00 00 5F"])[0][0] == "ECU1"
+
+def test_dtcs_by_ecu_on_can():
+    lines = ["00A", "0: 43 04 01 33 04 20", "1: 01 71 03 00 00 00 00", "43 01 07 00"]
+    assert extract_dtcs_by_ecu(lines, can=True) == {"ECU1": ["P0133", "P0420", "P0171", "P0300"], "ECU2": ["P0700"]}
+    lines = ["7E8 10 0A 43 04 01 33 04 20", "7E9 04 43 01 07 00", "7E8 21 01 71 03 00 00 00 00"]
+    assert extract_dtcs_by_ecu(lines) == {"7E9": ["P0700"], "7E8": ["P0133", "P0420", "P0171", "P0300"]}
+
+def test_dtcs_by_ecu_on_legacy_protocols():
+    # Without headers the 3-code messages of one answer stay together
+    lines = ["43 01 33 04 20 01 71", "43 03 00 00 00 00 00"]
+    assert extract_dtcs_by_ecu(lines, can=False) == {"ECU1": ["P0133", "P0420", "P0171", "P0300"]}
+    lines = ["48 6B 10 43 01 33 04 20 00 00 5E", "48 6B 18 43 07 00 00 00 00 00 15"]
+    assert extract_dtcs_by_ecu(lines, can=False) == {"10": ["P0133", "P0420"], "18": ["P0700"]}
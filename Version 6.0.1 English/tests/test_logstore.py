@@ -0,0 +1,50 @@
+# o3DIAG - tests for o3diag.logstore
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+from o3diag import (DIRECTION_RX, DIRECTION_TX, format_record, o3DIAGLogFormatter, o3DIAGLogStore,
+                    raw_bytes)
+
+def test_raw_only_stored_when_it_differs_from_the_text():
+    store = o3DIAGLogStore()
+    request = store.add("Request >>> 010C", direction=DIRECTION_TX, raw=b"010C")
+    answer = store.add("Response <<< 41 0C", direction=DIRECTION_RX, raw=b"41 0C 1A F8")
+    assert request.raw is None and raw_bytes(request) == b"010C"
+    assert raw_bytes(answer) == b"41 0C 1A F8"
+
+def test_formatters_keep_their_own_stamp():
+    store = o3DIAGLogStore()
+    first = store.add("one")
+    next_day = first._replace(time=first.time + 86400)
+    a, b = o3DIAGLogFormatter(), o3DIAGLogFormatter()
+    assert a(first) == b(first)
+    assert a(next_day) == format_record(next_day)
+    assert b(first) == format_record(first)
+
+def test_old_records_spill_to_the_history_file(tmp_path):
+    store = o3DIAGLogStore(max_records=5, history_dir=str(tmp_path))
+    store.TRIM = 2
+    for i in range(20):
+        store.add(f"line {i}", direction=DIRECTION_RX, raw=b"41 0C" if i == 3 else None)
+    assert len(store.records) <= 7 and store.spilled + len(store.records) == 20
+    assert len(store) == 20 and store[3].raw == b"41 0C" and store[-1].text == "line 19"
+    export = store.lines(0, len(store))
+    for i in range(20, 30):
+        store.add(f"line {i}") # spills while the export runs
+    assert [line[22:] for line in export] == [f"line {i}" for i in range(20)]
+    assert [record.text for record in store.iter_from(8, 12)] == ["line 8", "line 9", "line 10", "line 11"]
+    store.clear()
+    assert len(store) == 0 and not list(tmp_path.iterdir())
+
+def test_store_without_history_drops_old_records():
+    store = o3DIAGLogStore(max_records=5, history_dir=None)
+    store.TRIM = 2
+    for i in range(20):
+        store.add(f"line {i}", stamp=False)
+    assert len(store) == 20 and store.dropped + len(store.records) == 20
+    assert list(store.lines()) == [f"line {i}" for i in range(store.dropped, 20)]
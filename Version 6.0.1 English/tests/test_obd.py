@@ -0,0 +1,115 @@
+# o3DIAG - tests for o3diag.obd
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+import pytest
+
+from o3diag.obd import (
+    DTC_TABLE,
+    build_pid_requests,
+    decode_dtcs,
+    dtc_from_bytes,
+    extract_dtcs_by_ecu,
+    PROMPT,
+    extract_dtcs_from_response,
+    parse_line,
+    split_adapter_bytes,
+    split_adapter_output,
+    split_multi_pid_response,
+    split_pid_request,
+)
+
+
+def test_batch_answer_of_two_ecus():
+    # The second ECU's 41 header must not be read as PID 0x41
+    values = split_multi_pid_response(["41 0C 1A F8 0D 32", "41 0C 1A F8 0D 32"])
+    assert values == {"0C": ["1A", "F8"], "0D": ["32"]}
+
+
+def test_batch_answer_of_two_ecus_with_headers():
+    values = split_multi_pid_response(["7E8 06 41 0C 1A F8 0D 32", "7E9 04 41 0C 1B 00"])
+    assert values == {"0C": ["1A", "F8"], "0D": ["32"]}
+
+
+def test_pid_41_is_still_a_pid_after_the_header():
+    assert split_multi_pid_response(["41 41 00 07 E5 00"]) == {"41": ["00", "07", "E5", "00"]}
+
+def test_batch_requests_hold_six_pids():
+    requests = build_pid_requests(["0c", "0D", "05", "04", "42", "0F", "10"])
+    assert requests == ["010C0D0504420F", "0110"]
+    assert split_pid_request(requests[0]) == ["0C", "0D", "05", "04", "42", "0F"]
+    assert build_pid_requests(["0C", "0D"], batch=False) == ["010C", "010D"]
+    assert split_pid_request("03") == [] and split_pid_request("010C1") == []
+
+def test_multi_frame_batch_answer_without_headers():
+    lines = ["SEARCHING...", "00A", "0: 41 0C 1A F8 0D 32", "1: 05 7B 04 80 00 00 00"]
+    assert split_multi_pid_response(lines) == {"0C": ["1A", "F8"], "0D": ["32"], "05": ["7B"], "04": ["80"]}
+
+def test_multi_frame_batch_answer_interleaved_with_a_second_ecu():
+    lines = ["7E8 10 0A 41 0C 1A F8 0D 32", "7E9 03 41 05 7C", "7E8 21 05 7B 04 80 00 00 00"]
+    values = split_multi_pid_response(lines)
+    assert values["0C"] == ["1A", "F8"] and values["0D"] == ["32"] and values["04"] == ["80"]
+    assert values["05"] == ["7C"] # the ECU that finished first
+
+def test_batch_answer_with_no_data_from_one_ecu():
+    assert split_multi_pid_response(["41 0C 1A F8 0D 32", "NO DATA"]) == {"0C": ["1A", "F8"], "0D": ["32"]}
+
+def test_dtc_count_byte_only_on_can():
+    # Non-CAN answer trimmed to one code: 01 is not a count
+    assert extract_dtcs_from_response("43 01 33 04", can=False) == ["P0133"]
+    assert extract_dtcs_from_response("43 01 01 33", can=True) == ["P0133"]
+    # Protocol not known: a count that does not fit the message is a code
+    assert extract_dtcs_from_response("43 05 01 33") == ["P0501"]
+    assert extract_dtcs_from_response("43 02 01 33 04 20") == ["P0133", "P0420"]
+    by_ecu = extract_dtcs_by_ecu(["43 01 33 04 20 00 00"], can=False)
+    assert list(by_ecu.values()) == [["P0133", "P0420"]]
+
+def test_non_can_header_lines_are_stripped():
+    lines = ["48 6B 10 43 01 33 04 20 03 00 61", "48 6B 10 43 03 01 40 35 00 00 7F"]
+    assert extract_dtcs_by_ecu(lines) == {"10": ["P0133", "P0420", "P0300", "P0301", "C0035"]}
+    # PID 6B answer on CAN without headers: no valid check byte, stays a message
+    assert split_multi_pid_response(["41 6B 10 20 30 40 50"]) == {"6B": ["10", "20", "30", "40", "50"]}
+
+def test_dtc_table_covers_every_word():
+    assert len(DTC_TABLE) == 0x10000
+    assert dtc_from_bytes(0x01, 0x33) == "P0133"
+    assert dtc_from_bytes(0xFF, 0xFF) == "U3FFF"
+
+def test_decode_dtcs_batch():
+    # Odd trailing byte ignored, 00 00 padding skipped unless asked for
+    buffer = b"\x01\x33\x00\x00\x41\x23\x81\x00\xC0\x01\x05"
+    assert decode_dtcs(buffer) == ["P0133", "C0123", "B0100", "U0001"]
+    assert decode_dtcs(bytearray(b"\x01\x33\x00\x00"), skip_empty=False) == ["P0133", "P0000"]
+    assert decode_dtcs(b"") == []
+
+def test_decode_dtcs_numpy():
+    np = pytest.importorskip("numpy")
+    words = np.array([0x0133, 0x0000, 0x0420], dtype=np.uint16)
+    assert list(decode_dtcs(words)) == ["P0133", "P0420"]
+    assert list(decode_dtcs(np.frombuffer(b"\x01\x33\x04\x20", dtype=np.uint8))) == ["P0133", "P0420"]
+
+def test_parse_line_decodes_by_service():
+    message = parse_line("41 0C 1A F8 0D 32")
+    assert message.service == 0x41 and message.payload == bytes.fromhex("410C1AF80D32")
+    assert [(v.pid, v.value, v.unit) for v in message.values] == [("0C", 1726.0, "rpm"), ("0D", 50, "km/h")]
+    assert parse_line(b"43 02 01 33 04 20").dtcs == ("P0133", "P0420")
+    assert parse_line("NO DATA") == (None, b"", (), (), "NO DATA")
+    continuation = parse_line("1: 01 71 00")
+    assert continuation.service is None and continuation.payload == bytes.fromhex("017100")
+    assert parse_line("7F 01 12").service == 0x7F
+
+def test_adapter_bytes_split_into_lines_and_prompts():
+    items, rest = split_adapter_bytes(b"010C\r41 0C 1A F8\r\r>41 0D")
+    assert items == [b"010C", b"41 0C 1A F8", PROMPT] and rest == b"41 0D"
+    items, rest = split_adapter_bytes(rest + b" 32\r\n\r\n>")
+    assert items == [b"41 0D 32", PROMPT] and rest == b""
+    assert split_adapter_bytes(b"SEARCHING...\r41 0C") == ([b"SEARCHING..."], b"41 0C")
+    # Same result as the str splitter it replaced
+    raw = "ATZ\r\rELM327 v1.5\r\r>0100\r41 00 BE 1F A8 13\r\r>01"
+    items, rest = split_adapter_bytes(raw.encode())
+    assert ([item.decode() if item else item for item in items], rest.decode()) == split_adapter_output(raw)
@@ -0,0 +1,37 @@
+# o3DIAG - tests for o3diag.sessions against the simulator
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+import threading
+
+from o3diag.sessions import o3DIAGSessionManager
+from o3diag.simulator import o3DIAGSimulatedECU, o3DIAGSimulator, default_engine_pids
+
+def test_bay_of_two_vehicles_and_a_missing_adapter(tmp_path):
+    car = o3DIAGSimulator(latency=0.0, adaptive_wait=0.005)
+    van = o3DIAGSimulator(latency=0.0, adaptive_wait=0.005, protocol="3", ecus=[
+        o3DIAGSimulatedECU("7E8", default_engine_pids(), dtcs=["P0300"], vin="WDB9066331S123456")])
+    missing = str(tmp_path / "ttyUSB9")
+    try:
+        with o3DIAGSessionManager(log=lambda text: None) as manager:
+            for port in (car.start_tcp(), van.start_tcp(), missing):
+                manager.add(port)
+            manager.start_all()
+            dtcs = manager.read_dtcs_all()
+            samples = threading.Semaphore(0)
+            manager.start_polling_all({"0C": 20}, lambda session, pid, data, ts: samples.release())
+            assert samples.acquire(timeout=2.0)
+            rows = {row["port"]: row for row in manager.view()}
+            totals = manager.totals()
+    finally:
+        car.stop()
+        van.stop()
+    assert sorted(dtcs.values()) == [["P0133", "P0420"], ["P0300"]]
+    assert sorted(row["vin"] for row in rows.values()) == ["", "1G1JC5444R7252367", "WDB9066331S123456"]
+    assert rows[missing]["status"] == "error" and rows[missing]["error"]
+    assert totals["sessions"] == 3 and totals["ready"] == 2 and totals["responses"] > 0
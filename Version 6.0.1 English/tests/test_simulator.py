@@ -0,0 +1,52 @@
+# o3DIAG - tests for o3diag.simulator
+# *************************************************
+# Copyright (c) openw3rk INVENT
+# Licensed under MIT-LICENSE
+# *************************************************
+# https://o3diag.openw3rk.de
+# https://openw3rk.de
+# -------------------------------------------------
+
+from o3diag.isotp import assemble_messages
+from o3diag.obd import extract_dtcs_by_ecu
+from o3diag.simulator import o3DIAGSimulator
+
+CODES = ["P0133", "P0420", "P0171", "P0300", "P0700"]
+
+def answer(simulator, cmd):
+    out = []
+    simulator.handle(cmd, out.append)
+    return [line for line in "".join(out).split("\r") if line and line != ">"]
+
+def simulator(protocol, headers):
+    sim = o3DIAGSimulator(latency=0.0, adaptive_wait=0.0, protocol=protocol)
+    sim.ecus[0].dtcs = CODES
+    for cmd in ("ATE0", "ATH1" if headers else "ATH0"):
+        answer(sim, cmd)
+    return sim
+
+def test_can_answer_is_iso_tp():
+    lines = answer(simulator("6", False), "03")
+    assert lines[:3] == ["SEARCHING...", "00C", "0: 43 05 01 33 04 20"]
+    assert extract_dtcs_by_ecu(lines, can=True) == {"ECU1": CODES}
+    lines = answer(simulator("6", True), "03")
+    assert lines[1].startswith("7E8 10 0C 43 05")
+    assert extract_dtcs_by_ecu(lines, can=True) == {"7E8": CODES}
+
+def test_kline_answer_is_three_codes_per_message():
+    lines = answer(simulator("3", False), "03")
+    assert lines[1:] == ["43 01 33 04 20 01 71", "43 03 00 07 00 00 00"]
+    assert extract_dtcs_by_ecu(lines, can=False) == {"ECU1": CODES}
+    lines = answer(simulator("3", True), "03")
+    assert all(line.startswith("48 6B 10 43") for line in lines[1:])
+    assert [ecu for ecu, _ in assemble_messages(lines)] == ["10", "10"]
+    assert extract_dtcs_by_ecu(lines, can=False) == {"10": CODES}
+
+def test_count_suffix_and_errors():
+    sim = simulator("6", False)
+    assert answer(sim, "0100")[0] == "SEARCHING..."
+    rpm = answer(sim, "010C1")
+    assert len(rpm) == 1 and rpm[0].startswith("41 0C") and sim.last == "010C1"
+    assert answer(sim, "01") == ["?"] and answer(sim, "ATI") == ["ELM327 v1.5"]
+    sim.errors["NO DATA"] = 1.0
+    assert answer(sim, "010D") == ["NO DATA"]